@@ -1,236 +1,100 @@
-from flask import Flask, request, jsonify
-import mysql.connector
-import pickle
-import os
-import numpy as np
-import pandas as pd
-import shap
-import tensorflow as tf
-import dill
-import sys
-import math
-
-# Add script path
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "scripts")))
-from scripts.federated import FederatedRecommender
-from scripts.shap_wrapper import SurpriseWrapper, ContentWrapper, GraphWrapper, FederatedWrapper
+from flask import Flask, Response, g, request, jsonify, stream_with_context
+import json
+import time
+
+from services import (
+    MAX_BATCH_USERS, MAX_EXPLANATION_WAIT, WARM_MODELS, explanations, models, recommender, response_cache
+)
+from scripts.metrics import REGISTRY, TRACE_HEADER, end_trace, observe_request, server_timing, span, start_trace
 
 app = Flask(__name__)
 
-def get_db_connection():
-    return mysql.connector.connect(
-        host="localhost", user="root", password="", database="ecommerce_recommendation"
-    )
-
-def load_models():
-    models = {}
-    model_dir = os.path.join(os.path.dirname(__file__), "models")
-
-    try:
-        with open(os.path.join(model_dir, "collaborative_model.pkl"), "rb") as f:
-            models["collaborative"] = SurpriseWrapper(pickle.load(f))
-    except Exception as e:
-        print(f"❌ Collaborative Model Not Found: {e}")
-
-    try:
-        with open(os.path.join(model_dir, "content_model.pkl"), "rb") as f:
-            models["content_raw"] = pickle.load(f)
-    except Exception as e:
-        print(f"❌ Content Model Not Found: {e}")
-
-    try:
-        from gensim.models import KeyedVectors
-        models["graph_raw"] = KeyedVectors.load(os.path.join(model_dir, "graph_model.kv"))
-    except Exception as e:
-        print(f"❌ Graph Model Not Found: {e}")
-
-    try:
-        models["federated_raw"] = tf.keras.models.load_model(os.path.join(model_dir, "session_model.h5"))
-    except Exception as e:
-        print(f"❌ Federated Model Not Found: {e}")
-
-    for model_type in ["collaborative", "content", "graph", "federated"]:
-        path = os.path.join(model_dir, f"shap_explainer_{model_type}.pkl")
-        if os.path.exists(path):
-            with open(path, "rb") as f:
-                models[f"shap_{model_type}"] = dill.load(f)
-        else:
-            print(f"❌ SHAP explainer for {model_type} not found.")
-
-    return models
-
-models = load_models()
-
-def get_products():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT product_id, name, image_url FROM products")
-    products = {
-        int(pid): {
-            "name": name,
-            "image": image,
-            "engagement_score": 0,
-            "browsing_action": 0
-        }
-        for pid, name, image in cursor.fetchall()
-    }
-    cursor.close()
-    conn.close()
-
-    csv_path = os.path.join(os.path.dirname(__file__), "models", "social_browsing_data.csv")
-    if os.path.exists(csv_path):
-        df = pd.read_csv(csv_path)
-        agg = df.groupby("product_id").agg(
-            engagement_score=("engagement_score", "mean"),
-            browsing_action=("action", "sum")
-        ).reset_index()
-
-        for _, row in agg.iterrows():
-            pid = int(row["product_id"])
-            if pid in products:
-                products[pid]["engagement_score"] = row["engagement_score"]
-                products[pid]["browsing_action"] = row["browsing_action"]
-
-    return products
-
-def get_reviews():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT product_id, rating, comment FROM reviews")
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
-
-    review_dict = {}
-    for pid, rating, comment in rows:
-        if pid not in review_dict:
-            review_dict[pid] = []
-        review_dict[pid].append({
-            "rating": rating,
-            "comment": comment
-        })
-    return review_dict
+# ✅ Every request feeds the /metrics histograms; requests sent with an X-Trace
+# header also get their per-stage breakdown back in a Server-Timing header
+@app.before_request
+def start_request():
+    g.request_start = time.perf_counter()
+    g.trace_token = start_trace() if request.headers.get(TRACE_HEADER, "0") != "0" else None
+
+@app.after_request
+def finish_request(response):
+    token = g.pop("trace_token", None)
+    if token is not None:
+        response.headers["Server-Timing"] = server_timing(end_trace(token))
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    observe_request(endpoint, request.method, response.status_code, time.perf_counter() - g.request_start)
+    return response
+
+@app.teardown_request
+def end_request(exc):
+    token = g.pop("trace_token", None)  # after_request is skipped on unhandled errors
+    if token is not None:
+        end_trace(token)
+
+def _json(payload):
+    with span("serialize"):
+        return jsonify(payload)
 
 @app.route("/api/recommendations", methods=["POST"])
 def recommend():
     data = request.get_json()
     user_id = int(data.get("user_id"))
-    products = get_products()
-    reviews = get_reviews()
-    recommendations = []
-    seen = set()
-    shap_explanations = {}
-    shap_breakdowns = {}
-
-    # ✅ Collaborative
-    if "collaborative" in models:
-        try:
-            predictions = [(pid, models["collaborative"].predict(np.array([[user_id, pid]]))[0])
-                           for pid in products]
-            top = sorted(predictions, key=lambda x: x[1], reverse=True)[:5]
-            for pid, score in top:
-                if pid not in seen:
-                    recommendations.append((pid, score, "collaborative"))
-                    seen.add(pid)
-                    if "shap_collaborative" in models:
-                        shap_vals = models["shap_collaborative"].shap_values(np.array([[user_id, pid]]))
-                        shap_flat = np.array(shap_vals).flatten()
-                        shap_explanations[pid] = float(shap_flat[0]) if len(shap_flat) else 0
-                        shap_breakdowns[pid] = {
-                            f"feature_{i}": float(v) for i, v in enumerate(shap_flat)
-                        }
-        except Exception as e:
-            print(f"❌ Collaborative Error: {e}")
-
-    # ✅ Content-Based
-    if "content_raw" in models:
-        try:
-            sim = models["content_raw"]
-            if isinstance(sim, dict):
-                user_scores = sim.get(user_id, {})
-                top = sorted(user_scores.items(), key=lambda x: x[1], reverse=True)[:5]
-            else:
-                user_idx = user_id % sim.shape[0]
-                top = sorted([(i, sim[user_idx][i]) for i in range(sim.shape[1]) if i in products],
-                             key=lambda x: x[1], reverse=True)[:5]
-
-            for pid, score in top:
-                if pid not in seen:
-                    recommendations.append((pid, score, "content"))
-                    seen.add(pid)
-                    if "shap_content" in models:
-                        shap_vals = models["shap_content"].shap_values(np.array([pid]))
-                        shap_flat = np.array(shap_vals).flatten()
-                        shap_explanations[pid] = float(shap_flat[0]) if len(shap_flat) else 0
-                        shap_breakdowns[pid] = {
-                            f"feature_{i}": float(v) for i, v in enumerate(shap_flat)
-                        }
-        except Exception as e:
-            print(f"❌ Content Error: {e}")
-
-    # ✅ Graph-Based
-    if "graph_raw" in models:
-        try:
-            user_node = f"user_{user_id}"
-            graph_model = GraphWrapper(models["graph_raw"], user_node)
-            product_ids = list(products.keys())
-            scores = graph_model.predict(product_ids)
-            top_indices = np.argsort(scores)[::-1][:5]
-            for i in top_indices:
-                pid = product_ids[i]
-                if pid not in seen:
-                    recommendations.append((pid, scores[i], "graph"))
-                    seen.add(pid)
-                    if "shap_graph" in models:
-                        shap_vals = models["shap_graph"].shap_values(np.array([pid]))
-                        shap_flat = np.array(shap_vals).flatten()
-                        shap_explanations[pid] = float(shap_flat[0]) if len(shap_flat) else 0
-                        shap_breakdowns[pid] = {
-                            f"feature_{i}": float(v) for i, v in enumerate(shap_flat)
-                        }
-        except Exception as e:
-            print(f"❌ Graph Error: {e}")
-
-    # ✅ Federated
-    if "federated" not in models:
-        try:
-            models["federated"] = FederatedRecommender(os.path.join(os.path.dirname(__file__), "models", "session_model.h5"))
-        except Exception as e:
-            print(f"❌ Failed to load Federated Model: {e}")
-
-    if "federated" in models:
-        try:
-            fed_recs = models["federated"].predict(user_id)
-            for pid in fed_recs:
-                if pid not in seen:
-                    recommendations.append((pid, 0.9, "federated"))
-                    seen.add(pid)
-                    if "shap_federated" in models:
-                        shap_vals = models["shap_federated"].shap_values(np.array([pid]))
-                        shap_flat = np.array(shap_vals).flatten()
-                        shap_explanations[pid] = float(shap_flat[0]) if len(shap_flat) else 0
-                        shap_breakdowns[pid] = {
-                            f"feature_{i}": float(v) for i, v in enumerate(shap_flat)
-                        }
-        except Exception as e:
-            print(f"❌ Federated Error: {e}")
-
-    final = [
-        {
-            "product_id": pid,
-            "name": products[pid]["name"],
-            "image": products[pid]["image"],
-            "engagement_score": float(products[pid]["engagement_score"]) if not math.isnan(products[pid]["engagement_score"]) else 0.0,
-            "browsing_action": str(products[pid]["browsing_action"]) if products[pid]["browsing_action"] else "unknown",
-            "shap_value": shap_explanations.get(pid, 0),
-            "shap_breakdown": shap_breakdowns.get(pid, {}),
-            "reviews": reviews.get(pid, [])
-        }
-        for pid, _, _ in recommendations[:5]
-        if pid in products
-    ]
-
-    return jsonify({"recommendations": final})
+    return _json(recommender.recommend(user_id))
+
+@app.route("/api/recommendations/batch", methods=["POST"])
+def recommend_batch():
+    data = request.get_json() or {}
+    user_ids = [int(u) for u in data.get("user_ids", [])]
+    if not user_ids:
+        return jsonify({"error": "user_ids is required"}), 400
+    if len(user_ids) > MAX_BATCH_USERS:
+        return jsonify({"error": f"at most {MAX_BATCH_USERS} user_ids per batch"}), 400
+
+    # ✅ One JSON object per line, streamed as each chunk of users is scored; SHAP only on {"explain": true}
+    def generate():
+        chunk_size = max(1, min(int(data.get("chunk_size", 256)), 1024))
+        for response in recommender.stream(user_ids, chunk_size=chunk_size, explain=bool(data.get("explain"))):
+            yield json.dumps(response) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+@app.route("/api/explanations", methods=["GET", "POST"])
+def get_explanations():
+    if request.method == "POST":
+        data = request.get_json() or {}
+        tokens = data.get("tokens", [])
+        wait = min(float(data.get("wait", 0)), MAX_EXPLANATION_WAIT)
+    else:
+        tokens = request.args.getlist("token")
+        wait = min(float(request.args.get("wait", 0)), MAX_EXPLANATION_WAIT)
+
+    if not tokens:
+        return jsonify({"error": "token is required"}), 400
+    if len(tokens) == 1:
+        return _json(explanations.status(tokens[0], wait=wait))
+    return _json({"explanations": explanations.status_many(tokens, wait=wait)})
+
+@app.route("/api/events", methods=["POST"])
+def user_events():
+    # ✅ New transaction / review / browsing events: drop those users' cached recommendations
+    data = request.get_json() or {}
+    user_ids = [int(u) for u in data.get("user_ids", [])]
+    if data.get("user_id") is not None:
+        user_ids.append(int(data["user_id"]))
+    if not user_ids:
+        return jsonify({"error": "user_id or user_ids is required"}), 400
+    invalidated = response_cache.invalidate(user_ids) if response_cache is not None else 0
+    return jsonify({"invalidated": invalidated})
+
+@app.route("/api/ready")
+def ready():
+    status = models.status()
+    is_ready = models.ready(WARM_MODELS)
+    return jsonify({"ready": is_ready, "models": status}), (200 if is_ready else 503)
+
+@app.route("/metrics")
+def metrics():
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
 
 @app.route("/")
 def index():
@@ -0,0 +1,156 @@
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import FastAPI, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+
+from services import (
+    MAX_BATCH_USERS, MAX_EXPLANATION_WAIT, WARM_MODELS, explanations, models, recommender, response_cache
+)
+from scripts.metrics import REGISTRY, TRACE_HEADER, bind, end_trace, observe_request, server_timing, span, start_trace
+
+# ✅ Same /api contract as app.py, served by uvicorn:
+#   cd backend && python asgi.py   (or: uvicorn asgi:app --workers 4)
+# The event loop only parses requests and writes responses. Model scoring and its
+# pooled MySQL lookups run on SCORING_WORKERS threads, and at most MAX_IN_FLIGHT
+# requests per worker are queued for them; the rest wait here without holding a thread.
+SCORING_WORKERS = int(os.environ.get("SCORING_WORKERS", str(min(32, (os.cpu_count() or 1) + 4))))
+MAX_IN_FLIGHT = int(os.environ.get("MAX_IN_FLIGHT", "256"))
+
+app = FastAPI(title="E-commerce Recommendation API")
+
+scoring = ThreadPoolExecutor(max_workers=SCORING_WORKERS, thread_name_prefix="scoring")
+in_flight = None
+
+
+def _error(message, status_code=400):
+    return JSONResponse({"error": message}, status_code=status_code)
+
+
+def _json(payload):
+    with span("serialize"):
+        return JSONResponse(payload)
+
+
+async def _score(fn, *args):
+    global in_flight
+    if in_flight is None:
+        in_flight = asyncio.Semaphore(MAX_IN_FLIGHT)
+    async with in_flight:
+        return await asyncio.get_running_loop().run_in_executor(scoring, bind(fn), *args)
+
+
+# ✅ Every request feeds the /metrics histograms; requests sent with an X-Trace
+# header also get their per-stage breakdown back in a Server-Timing header
+@app.middleware("http")
+async def instrument(request: Request, call_next):
+    start = time.perf_counter()
+    token = start_trace() if request.headers.get(TRACE_HEADER, "0") != "0" else None
+    try:
+        response = await call_next(request)
+    finally:
+        stages = end_trace(token) if token is not None else None
+    if stages is not None:
+        response.headers["Server-Timing"] = server_timing(stages)
+    route = request.scope.get("route")
+    observe_request(route.path if route else "unmatched", request.method, response.status_code,
+                    time.perf_counter() - start)
+    return response
+
+
+@app.on_event("shutdown")
+def shutdown():
+    scoring.shutdown(wait=False, cancel_futures=True)
+    explanations.shutdown()
+
+
+@app.post("/api/recommendations")
+async def recommend(request: Request):
+    data = await request.json()
+    user_id = int(data.get("user_id"))
+    return _json(await _score(recommender.recommend, user_id))
+
+
+@app.post("/api/recommendations/batch")
+async def recommend_batch(request: Request):
+    data = await request.json() or {}
+    user_ids = [int(u) for u in data.get("user_ids", [])]
+    if not user_ids:
+        return _error("user_ids is required")
+    if len(user_ids) > MAX_BATCH_USERS:
+        return _error(f"at most {MAX_BATCH_USERS} user_ids per batch")
+    chunk_size = max(1, min(int(data.get("chunk_size", 256)), 1024))
+    explain = bool(data.get("explain"))
+
+    # ✅ One JSON object per line; each chunk is scored off the event loop; SHAP only on {"explain": true}
+    async def generate():
+        snapshot = recommender.catalog.current()
+        for start in range(0, len(user_ids), chunk_size):
+            chunk = user_ids[start:start + chunk_size]
+            for response in await _score(recommender.score_batch, chunk, snapshot, False, explain):
+                yield json.dumps(response) + "\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
+@app.api_route("/api/explanations", methods=["GET", "POST"])
+async def get_explanations(request: Request, token: list[str] = Query(default=[]), wait: float = 0):
+    if request.method == "POST":
+        data = await request.json() or {}
+        tokens = data.get("tokens", [])
+        wait = float(data.get("wait", 0))
+    else:
+        tokens = token
+    wait = min(wait, MAX_EXPLANATION_WAIT)
+
+    if not tokens:
+        return _error("token is required")
+    # Long-polls block a thread, so they use the default pool rather than the scoring executor
+    if len(tokens) == 1:
+        return _json(await run_in_threadpool(explanations.status, tokens[0], wait))
+    return _json({"explanations": await run_in_threadpool(explanations.status_many, tokens, wait)})
+
+
+@app.post("/api/events")
+async def user_events(request: Request):
+    # ✅ New transaction / review / browsing events: drop those users' cached recommendations
+    data = await request.json() or {}
+    user_ids = [int(u) for u in data.get("user_ids", [])]
+    if data.get("user_id") is not None:
+        user_ids.append(int(data["user_id"]))
+    if not user_ids:
+        return _error("user_id or user_ids is required")
+    if response_cache is None:
+        return {"invalidated": 0}
+    return {"invalidated": await run_in_threadpool(response_cache.invalidate, user_ids)}
+
+
+@app.get("/api/ready")
+async def ready():
+    status = models.status()
+    is_ready = models.ready(WARM_MODELS)
+    return JSONResponse({"ready": is_ready, "models": status}, status_code=200 if is_ready else 503)
+
+
+@app.get("/metrics")
+async def metrics():
+    return Response(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/", response_class=PlainTextResponse)
+async def index():
+    return "✅ E-commerce Recommendation API is running!"
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(
+        "asgi:app",
+        host=os.environ.get("HOST", "127.0.0.1"),
+        port=int(os.environ.get("PORT", "8000")),
+        workers=int(os.environ.get("UVICORN_WORKERS", "1"))
+    )
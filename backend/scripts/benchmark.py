@@ -0,0 +1,199 @@
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+try:
+    import resource  # Unix only
+except ImportError:
+    resource = None
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from scripts.catalog import CatalogStore, build_snapshot
+from scripts.db import sqlite_database, set_database
+from scripts.engagement_features import update_features
+from scripts.explanations import ExplanationService
+from scripts.model_registry import build_model_registry
+from scripts.recommendation import (Recommender, SOURCES, collaborative_candidates, content_candidates,
+                                    explain, federated_candidates, graph_candidates, model_version,
+                                    user_histories)
+from scripts.synthetic_data import generate
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+BENCH_DIR = os.environ.get("BENCH_DIR", os.path.join(BACKEND_DIR, "benchmarks"))
+BENCH_SCALE = os.environ.get("BENCH_SCALE", "small")
+BENCH_REPEATS = int(os.environ.get("BENCH_REPEATS", "50"))
+BENCH_MODEL_DIR = os.environ.get("BENCH_MODEL_DIR", os.path.join(BACKEND_DIR, "models"))
+TOP_N = 5
+HISTORY_LIMIT = 20
+
+
+def percentiles(samples_ms):
+    samples = np.asarray(samples_ms, dtype=np.float64)
+    return {
+        "runs": int(len(samples)),
+        "mean_ms": float(samples.mean()),
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p95_ms": float(np.percentile(samples, 95)),
+        "p99_ms": float(np.percentile(samples, 99)),
+    }
+
+
+def time_stage(fn, repeats):
+    """Wall times in ms of `repeats` calls of fn(i), after one warm-up call."""
+    fn(0)
+    samples = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        fn(i)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def peak_memory_mb(fn):
+    """Peak Python + NumPy allocations (tracemalloc) of one call, in MB."""
+    tracemalloc.start()
+    try:
+        fn(0)
+        return tracemalloc.get_traced_memory()[1] / 1e6
+    finally:
+        tracemalloc.stop()
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None where it cannot be measured."""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1e6 if sys.platform == "darwin" else peak / 1024  # bytes on macOS, KB on Linux
+    try:
+        import psutil  # optional; on Windows peak_wset is the peak working set
+    except ImportError:
+        return None
+    info = psutil.Process().memory_info()
+    return getattr(info, "peak_wset", info.rss) / 1e6
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _shap_stage(models, source, pairs):
+    return lambda i: explain(models, source, *pairs[i % len(pairs)])
+
+
+def build_stages(db, models, catalog, recommender, features_path, user_ids):
+    """{stage name: fn(i)}; model stages are left out when their artifact does not load here."""
+    snapshot = catalog.current()
+    histories = user_histories(db, user_ids, HISTORY_LIMIT)
+
+    def user(i):
+        return user_ids[i % len(user_ids)]
+
+    stages = {
+        "catalog_load": lambda i: build_snapshot(db, features_path),
+        "review_load": lambda i: db.query("reviews"),
+        "history_load": lambda i: user_histories(db, [user(i)], HISTORY_LIMIT),
+    }
+
+    factors = models.get("collaborative")
+    neighbors = models.get("content")
+    index = models.get("graph")
+    federated = models.get("federated")
+    if factors is not None:
+        stages["recommender_collaborative"] = lambda i: collaborative_candidates(factors, [user(i)], snapshot, TOP_N)
+    if neighbors is not None:
+        stages["recommender_content"] = lambda i: content_candidates(
+            neighbors, {user(i): histories[user(i)]}, snapshot, TOP_N)
+    if index is not None:
+        stages["recommender_graph"] = lambda i: graph_candidates(index, [user(i)], snapshot, TOP_N)
+    if federated is not None:
+        stages["recommender_federated"] = lambda i: federated_candidates(
+            federated, {user(i): histories[user(i)]}, TOP_N)
+
+    # SHAP is timed per (user, product) pair for every model with an explainer
+    pids = np.random.default_rng(0).choice(snapshot.product_ids, size=len(user_ids)).tolist()
+    pairs = list(zip(user_ids, pids))
+    for source in SOURCES:
+        name = "collaborative" if source == "collaborative" else f"shap_{source}"
+        if models.get(name) is not None:
+            stages[f"shap_{source}"] = _shap_stage(models, source, pairs)
+
+    stages["recommend"] = lambda i: recommender.recommend(user(i))
+    return stages
+
+
+def run(db_path, scale=BENCH_SCALE, repeats=BENCH_REPEATS, model_dir=BENCH_MODEL_DIR, regenerate=False, seed=0):
+    """Time every recommend() stage against a synthetic SQLite database; returns the report dict."""
+    if regenerate or not os.path.exists(db_path):
+        print(f"🔵 Generating {scale} synthetic database at {db_path}...")
+        start = time.perf_counter()
+        generate(db_path, scale, seed=seed)
+        print(f"✅ Generated in {time.perf_counter() - start:.1f}s")
+    db = sqlite_database(db_path)
+    set_database(db)  # models that query on their own (e.g. federated) see the same stand-in
+
+    features_path = os.path.splitext(db_path)[0] + "_engagement_features.npz"
+    if os.path.exists(features_path):
+        os.remove(features_path)
+    update_features(db, features_path)
+
+    models = build_model_registry(model_dir)
+    catalog = CatalogStore(db, features_path)
+    explanations = ExplanationService(lambda *args: explain(models, *args),
+                                      lambda model_type: model_version(models, model_type))
+    recommender = Recommender(models, catalog, db, explanations, top_n=TOP_N, history_limit=HISTORY_LIMIT)
+
+    rng = np.random.default_rng(seed)
+    all_users = [int(r[0]) for r in db.fetch_all("SELECT user_id FROM users", name="bench_users")]
+    user_ids = rng.choice(all_users, size=min(len(all_users), max(repeats, 1)), replace=False).tolist()
+
+    report = {"commit": git_commit(), "scale": scale, "db_path": db_path, "repeats": repeats,
+              "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "stages": {}}
+    try:
+        for name, fn in build_stages(db, models, catalog, recommender, features_path, user_ids).items():
+            stats = percentiles(time_stage(fn, repeats))
+            stats["peak_alloc_mb"] = peak_memory_mb(fn)
+            report["stages"][name] = stats
+            print(f"⏱️ {name:<26} p50 {stats['p50_ms']:8.2f} ms  p95 {stats['p95_ms']:8.2f} ms  "
+                  f"p99 {stats['p99_ms']:8.2f} ms  peak {stats['peak_alloc_mb']:7.2f} MB")
+    finally:
+        explanations.shutdown()
+        recommender.executor.shutdown(wait=False)
+    report["max_rss_mb"] = peak_rss_mb()
+    return report
+
+
+def compare(report, baseline):
+    """Print the p95 change of every stage present in both reports."""
+    print(f"📊 Compared with {baseline.get('commit', 'baseline')} ({baseline.get('scale')}):")
+    for name, stats in report["stages"].items():
+        base = baseline.get("stages", {}).get(name)
+        if base is None or not base["p95_ms"]:
+            continue
+        change = (stats["p95_ms"] - base["p95_ms"]) / base["p95_ms"] * 100
+        flag = "⚠️" if change > 10 else "✅"
+        print(f"{flag} {name:<26} p95 {base['p95_ms']:8.2f} → {stats['p95_ms']:8.2f} ms ({change:+.1f}%)")
+
+
+if __name__ == "__main__":
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    db_path = os.environ.get("BENCH_DB", os.path.join(BENCH_DIR, f"synthetic_{BENCH_SCALE}.db"))
+    report = run(db_path, regenerate=os.environ.get("BENCH_REGENERATE", "0") == "1")
+
+    output = os.environ.get("BENCH_OUTPUT", os.path.join(BENCH_DIR, f"{report['commit']}_{BENCH_SCALE}.json"))
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    rss = f"{report['max_rss_mb']:.0f} MB" if report["max_rss_mb"] is not None else "unavailable, install psutil"
+    print(f"✅ Benchmark saved to {output} (max RSS {rss})")
+
+    baseline_path = os.environ.get("BENCH_BASELINE")
+    if baseline_path:
+        with open(baseline_path) as f:
+            compare(report, json.load(f))
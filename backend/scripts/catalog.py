@@ -0,0 +1,205 @@
+import csv
+import os
+import threading
+import time
+import numpy as np
+
+from scripts.engagement_features import EngagementFeatures
+from scripts.metrics import span
+
+# Shipped sample of engagement/browsing events, used until engagement_features.npz is built
+FALLBACK_CSV_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "models",
+                                                 "social_browsing_data.csv"))
+
+
+class CatalogSnapshot:
+    """
+    Immutable view of the catalog: products, engagement aggregates and reviews,
+    stored as arrays aligned to a sorted product_id array.
+    """
+
+    def __init__(self, product_ids, names, images, engagement_score, browsing_action,
+                 review_offsets, review_ratings, review_comments, fingerprint):
+        self.product_ids = product_ids
+        self.names = names
+        self.images = images
+        self.engagement_score = engagement_score
+        self.browsing_action = browsing_action
+        self.review_offsets = review_offsets
+        self.review_ratings = review_ratings
+        self.review_comments = review_comments
+        self.fingerprint = fingerprint
+        for arr in (product_ids, engagement_score, review_offsets, review_ratings):
+            arr.setflags(write=False)
+
+    def __len__(self):
+        return len(self.product_ids)
+
+    def __iter__(self):
+        return iter(self.product_ids.tolist())
+
+    def __contains__(self, pid):
+        return self.index_of(pid) >= 0
+
+    def index_of(self, pid):
+        idx = int(np.searchsorted(self.product_ids, pid))
+        if idx < len(self.product_ids) and self.product_ids[idx] == pid:
+            return idx
+        return -1
+
+    def indices_of(self, pids):
+        """Vectorised index_of; missing product_ids map to -1."""
+        pids = np.asarray(pids, dtype=np.int64)
+        idx = np.searchsorted(self.product_ids, pids)
+        idx = np.minimum(idx, max(len(self.product_ids) - 1, 0))
+        if len(self.product_ids) == 0:
+            return np.full(len(pids), -1, dtype=np.int64)
+        return np.where(self.product_ids[idx] == pids, idx, -1)
+
+    def product(self, pid):
+        idx = self.index_of(pid)
+        if idx < 0:
+            return None
+        return {
+            "name": self.names[idx],
+            "image": self.images[idx],
+            "engagement_score": self.engagement_score[idx],
+            "browsing_action": self.browsing_action[idx]
+        }
+
+    def reviews(self, pid):
+        idx = self.index_of(pid)
+        if idx < 0:
+            return []
+        start, end = self.review_offsets[idx], self.review_offsets[idx + 1]
+        return [
+            {"rating": rating, "comment": comment}
+            for rating, comment in zip(self.review_ratings[start:end].tolist(),
+                                       self.review_comments[start:end])
+        ]
+
+
+def _file_signature(path):
+    try:
+        stat = os.stat(path)
+        return (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        return None
+
+
+def catalog_fingerprint(db, features_path):
+    """Cheap change detector: row counts and newest timestamps plus the features file mtime."""
+    products = tuple(db.query("products_fingerprint")[0])
+    reviews = tuple(db.query("reviews_fingerprint")[0])
+    return (products, reviews, _file_signature(features_path))
+
+
+def _load_features(features_path, fallback_csv_path=FALLBACK_CSV_PATH):
+    """(product_ids, engagement_score, dominant_action) from the features file, else from the CSV sample."""
+    if os.path.exists(features_path):
+        with np.load(features_path) as features:
+            return features["product_ids"], features["engagement_score"], features["dominant_action"]
+    if not os.path.exists(fallback_csv_path):
+        return None
+    print(f"⚠️ {features_path} not found, using engagement from {fallback_csv_path}")
+    with open(fallback_csv_path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    features = EngagementFeatures.empty()
+    scored = [r for r in rows if r.get("engagement_score")]
+    features.add_engagement([int(r["product_id"]) for r in scored], [float(r["engagement_score"]) for r in scored])
+    features.add_actions([int(r["product_id"]) for r in rows], [r["action"] for r in rows])
+    return features.product_ids, features.engagement_score, features.dominant_action
+
+
+def build_snapshot(db, features_path, fingerprint=None):
+    with span("catalog_build"):
+        return _build_snapshot(db, features_path, fingerprint)
+
+
+def _build_snapshot(db, features_path, fingerprint):
+    rows = list(db.query("products"))
+    rows.sort(key=lambda r: int(r[0]))
+    product_ids = np.array([int(r[0]) for r in rows], dtype=np.int64)
+    names = [r[1] for r in rows]
+    images = [r[2] for r in rows]
+    n = len(product_ids)
+
+    # Engagement columns come precomputed from scripts/engagement_features.py
+    engagement_score = np.zeros(n, dtype=np.float64)
+    browsing_action = np.full(n, "", dtype=object)
+    features = _load_features(features_path)
+    if features is not None:
+        pids, scores, actions = features
+        idx = np.searchsorted(product_ids, pids)
+        idx = np.minimum(idx, max(n - 1, 0))
+        hit = (product_ids[idx] == pids) if n else np.zeros(len(pids), dtype=bool)
+        engagement_score[idx[hit]] = scores[hit]
+        browsing_action[idx[hit]] = actions[hit].astype(object)
+
+    # Reviews are grouped per product via a stable sort and an offsets array
+    review_rows = db.query("reviews")
+    review_pids = np.array([int(r[0]) for r in review_rows], dtype=np.int64)
+    review_idx = np.searchsorted(product_ids, review_pids) if n else np.zeros(0, dtype=np.int64)
+    review_idx = np.minimum(review_idx, max(n - 1, 0))
+    known = product_ids[review_idx] == review_pids if n else np.zeros(0, dtype=bool)
+    order = np.argsort(review_idx[known], kind="stable")
+    kept = np.flatnonzero(known)[order]
+    review_ratings = np.array([review_rows[i][1] for i in kept], dtype=np.float64)
+    review_comments = [review_rows[i][2] for i in kept]
+    counts = np.bincount(review_idx[kept], minlength=n) if n else np.zeros(0, dtype=np.int64)
+    review_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+    return CatalogSnapshot(product_ids, names, images, engagement_score, browsing_action,
+                           review_offsets, review_ratings, review_comments, fingerprint)
+
+
+class CatalogStore:
+    """
+    Holds the current CatalogSnapshot and rebuilds it in a background thread
+    when the fingerprint changes. Readers only ever see a complete snapshot.
+    """
+
+    def __init__(self, db, features_path, refresh_interval=30):
+        self.db = db
+        self.features_path = features_path
+        self.refresh_interval = refresh_interval
+        self._snapshot = None
+        self._build_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def current(self):
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._build_lock:
+                if self._snapshot is None:
+                    fingerprint = catalog_fingerprint(self.db, self.features_path)
+                    self._snapshot = build_snapshot(self.db, self.features_path, fingerprint)
+                snapshot = self._snapshot
+        return snapshot
+
+    def refresh(self):
+        fingerprint = catalog_fingerprint(self.db, self.features_path)
+        if self._snapshot is not None and fingerprint == self._snapshot.fingerprint:
+            return False
+        with self._build_lock:
+            snapshot = build_snapshot(self.db, self.features_path, fingerprint)
+            self._snapshot = snapshot  # single reference swap
+        print(f"🔄 Catalog snapshot rebuilt: {len(snapshot)} products.")
+        return True
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="catalog-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"⚠️ Catalog refresh failed, keeping previous snapshot: {e}")
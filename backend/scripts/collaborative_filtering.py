@@ -1,28 +1,68 @@
-import mysql.connector
-import pandas as pd
 from surprise import SVD, Dataset, Reader
+import json
 import pickle
 import os
+import sys
+import time
 
-try:
-    print("🔵 Connecting to MySQL...")
-    conn = mysql.connector.connect(host="localhost", user="root", password="", database="ecommerce_recommendation")
-    cursor = conn.cursor()
-    print("✅ Connected!")
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from scripts.db import get_database, DatabaseError
+from scripts.extract import extract_table, load_table
+from scripts.model_registry import record_training
+from scripts.svd_factors import SVDFactors
 
-    # 🟡 Fetch user ratings data
-    query = "SELECT user_id, product_id, rating FROM reviews"
-    cursor.execute(query)
-    results = cursor.fetchall()
+MODEL_DIR = os.path.join(os.path.dirname(__file__), "..", "models")
+MODEL_PATH = os.path.join(MODEL_DIR, "collaborative_model.pkl")
+FACTORS_PATH = os.path.join(MODEL_DIR, "collaborative_factors.npz")
+STATE_PATH = os.path.join(MODEL_DIR, "collaborative_state.json")
 
-    if not results:
+# A full retrain is due after this many hours, or once the ratings folded in since
+# the last one exceed this fraction of the ratings it was trained on
+FULL_RETRAIN_HOURS = float(os.environ.get("COLLAB_FULL_RETRAIN_HOURS", "24"))
+FULL_RETRAIN_DELTA = float(os.environ.get("COLLAB_FULL_RETRAIN_DELTA", "0.2"))
+FOLD_IN_EPOCHS = int(os.environ.get("COLLAB_FOLD_IN_EPOCHS", "20"))
+
+
+def load_state():
+    if not os.path.exists(STATE_PATH):
+        return None
+    with open(STATE_PATH) as f:
+        return json.load(f)
+
+
+def save_state(state):
+    tmp_path = STATE_PATH + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, STATE_PATH)
+
+
+def save_factors(factors):
+    # Written under a temp name and renamed, so the API never loads a partial file
+    tmp_path = FACTORS_PATH[:-len(".npz")] + ".tmp.npz"
+    factors.save(tmp_path)
+    os.replace(tmp_path, FACTORS_PATH)
+
+
+def full_retrain_due(state):
+    if state is None or not os.path.exists(FACTORS_PATH):
+        return True
+    if time.time() - state["trained_at"] > FULL_RETRAIN_HOURS * 3600:
+        return True
+    return state["folded_rows"] > FULL_RETRAIN_DELTA * max(state["trained_rows"], 1)
+
+
+def train_full():
+    # 🟡 Refresh the reviews extract, so a full retrain (and its watermark) covers every review
+    print("🔵 Extracting reviews...")
+    extract_table(get_database(), "reviews")
+    df = load_table("reviews", columns=["review_id", "user_id", "product_id", "rating", "timestamp"])
+
+    if df.empty:
         print("❌ ERROR: No data found in 'reviews' table!")
         exit()
 
-    print("✅ Sample Data Loaded:", results[:5])  # Print first 5 rows
-
-    # 🟡 Convert data to DataFrame
-    df = pd.DataFrame(results, columns=["user_id", "product_id", "rating"])
+    print("✅ Sample Data Loaded:", df[["user_id", "product_id", "rating"]].head().values.tolist())  # Print first 5 rows
 
     # 🟡 Train SVD model
     print("🟡 Training Collaborative Filtering Model...")
@@ -33,19 +73,69 @@ try:
     model.fit(trainset)
 
     # ✅ Ensure models directory exists and save the model
-    model_dir = os.path.join(os.path.dirname(__file__), "..", "models")
-    os.makedirs(model_dir, exist_ok=True)
-    model_path = os.path.join(model_dir, "collaborative_model.pkl")
-
-    with open(model_path, "wb") as f:
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    with open(MODEL_PATH, "wb") as f:
         pickle.dump(model, f)
-    print("✅ Collaborative Filtering Model trained and saved at:", model_path)
-
-except mysql.connector.Error as err:
-    print(f"❌ MySQL Error: {err}")
-except Exception as e:
-    print(f"❌ Python Error: {e}")
-finally:
-    cursor.close()
-    conn.close()
-    print("🔴 MySQL Connection Closed.")
+    print("✅ Collaborative Filtering Model trained and saved at:", MODEL_PATH)
+
+    # 🟢 Export dense factors for vectorized full-catalog scoring
+    save_factors(SVDFactors.from_surprise(model))
+    print("✅ SVD factors exported to:", FACTORS_PATH)
+
+    previous = load_state() or {}
+    save_state({
+        "watermark": int(df["review_id"].max()),
+        "trained_at": time.time(),
+        "trained_rows": len(df),
+        "folded_rows": 0,
+        "version": previous.get("version", 0) + 1
+    })
+    record_training(MODEL_DIR, "collaborative", df["timestamp"].max())
+
+
+def train_incremental():
+    """Fold reviews newer than the watermark into the current factors."""
+    state = load_state()
+    if full_retrain_due(state):
+        print("🔄 Full retrain due, retraining from scratch...")
+        train_full()
+        return
+
+    rows = get_database().query("reviews_since", (state["watermark"],))
+    if not rows:
+        print(f"✅ No reviews after watermark {state['watermark']}, factors are up to date.")
+        return
+
+    review_ids, user_ids, product_ids, ratings = zip(*rows)
+    factors = SVDFactors.load(FACTORS_PATH)
+    print(f"🟡 Folding {len(rows)} new reviews into {len(factors.user_raw_ids)} users "
+          f"x {len(factors.item_raw_ids)} items...")
+    start = time.perf_counter()
+    folded = factors.fold_in(user_ids, product_ids, [float(r) for r in ratings], epochs=FOLD_IN_EPOCHS)
+    save_factors(folded)
+    print(f"✅ Folded in {len(folded.user_raw_ids) - len(factors.user_raw_ids)} new users and "
+          f"{len(folded.item_raw_ids) - len(factors.item_raw_ids)} new items "
+          f"in {time.perf_counter() - start:.2f}s")
+
+    save_state(dict(
+        state,
+        watermark=int(max(review_ids)),
+        folded_rows=state["folded_rows"] + len(rows),
+        version=state["version"] + 1
+    ))
+    newest = get_database().fetch_one("SELECT MAX(timestamp) FROM reviews WHERE review_id <= %s",
+                                      (int(max(review_ids)),), name="reviews_newest")
+    record_training(MODEL_DIR, "collaborative", newest[0])
+
+
+if __name__ == "__main__":
+    try:
+        if "--incremental" in sys.argv:
+            train_incremental()
+        else:
+            train_full()
+
+    except DatabaseError as err:
+        print(f"❌ Database Error: {err}")
+    except Exception as e:
+        print(f"❌ Python Error: {e}")
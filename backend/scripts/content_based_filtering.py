@@ -1,70 +1,64 @@
 import os
-import mysql.connector
-import pandas as pd
+import sys
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 import pickle
 
-try:
-    print("🔵 Connecting to MySQL...")
-    conn = mysql.connector.connect(
-        host="localhost",
-        user="root",
-        password="",
-        database="ecommerce_recommendation"
-    )
-    cursor = conn.cursor()
-    print("✅ Connected!")
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from scripts.db import DatabaseError
+from scripts.extract import load_table
+from scripts.content_neighbors import build_topk_neighbors, save_neighbors
 
-    # 🟡 Fetch product descriptions
-    query = "SELECT product_id, name, description FROM products"
-    cursor.execute(query)
-    results = cursor.fetchall()
+TOP_K_NEIGHBORS = int(os.environ.get("CONTENT_TOP_K", "50"))
 
-    if not results:
-        raise Exception("No data found in 'products' table!")
+if __name__ == "__main__":
+    try:
+        # 🟡 Load product descriptions from the extract snapshot
+        print("🔵 Loading products extract...")
+        df = load_table("products", columns=["product_id", "name", "description"])
 
-    print(f"✅ {len(results)} products loaded. Sample:", results[:2])
+        if df.empty:
+            raise Exception("No data found in 'products' table!")
 
-    # 🟡 Load into DataFrame
-    df = pd.DataFrame(results, columns=["product_id", "name", "description"])
+        print(f"✅ {len(df)} products loaded. Sample:", df.head(2).values.tolist())
 
-    # ⚠️ Clean null/empty descriptions
-    df['description'] = df['description'].fillna("").astype(str)
-    df = df[df['description'].str.strip() != ""]
+        # ⚠️ Clean null/empty descriptions
+        df['description'] = df['description'].fillna("").astype(str)
+        df = df[df['description'].str.strip() != ""]
 
-    if df.empty:
-        raise Exception("All product descriptions are empty after cleaning.")
+        if df.empty:
+            raise Exception("All product descriptions are empty after cleaning.")
 
-    # 🟡 TF-IDF Vectorization
-    print("🟡 Generating TF-IDF Vectors...")
-    tfidf = TfidfVectorizer(stop_words="english")
-    tfidf_matrix = tfidf.fit_transform(df['description'])
+        # 🟡 TF-IDF Vectorization
+        print("🟡 Generating TF-IDF Vectors...")
+        tfidf = TfidfVectorizer(stop_words="english")
+        tfidf_matrix = tfidf.fit_transform(df['description'])
 
-    print("✅ TF-IDF Matrix Shape:", tfidf_matrix.shape)
+        print("✅ TF-IDF Matrix Shape:", tfidf_matrix.shape)
 
-    # 🟢 Compute similarity matrix
-    cosine_sim = cosine_similarity(tfidf_matrix, tfidf_matrix)
+        # 🟢 Compute top-K neighbour lists (chunked, multi-process, sparse)
+        print(f"🟡 Building top-{TOP_K_NEIGHBORS} content neighbours...")
+        indptr, indices, data = build_topk_neighbors(tfidf_matrix, k=TOP_K_NEIGHBORS)
+        print(f"✅ Kept {len(data)} neighbour links for {tfidf_matrix.shape[0]} products.")
 
-    # ✅ Save model & data
-    model_dir = os.path.join(os.path.dirname(__file__), "..", "models")
-    os.makedirs(model_dir, exist_ok=True)
-    model_path = os.path.join(model_dir, "content_model.pkl")
+        # ✅ Save model & data
+        model_dir = os.path.join(os.path.dirname(__file__), "..", "models")
+        os.makedirs(model_dir, exist_ok=True)
+        model_path = os.path.join(model_dir, "content_model.pkl")
 
-    with open(model_path, "wb") as f:
-        pickle.dump({
-            "cosine_sim": cosine_sim,
-            "products": df,
-            "tfidf": tfidf
-        }, f)
+        with open(model_path, "wb") as f:
+            pickle.dump({
+                "products": df,
+                "tfidf": tfidf
+            }, f)
 
-    print(f"✅ Content-Based Model trained and saved at {model_path}!")
+        # ✅ Memory-mappable CSR neighbour store queried by the API
+        neighbors_path = os.path.join(model_dir, "content_neighbors")
+        save_neighbors(neighbors_path, df['product_id'].to_numpy(), indptr, indices, data)
+        print(f"✅ Content neighbours saved at {neighbors_path}")
 
-except mysql.connector.Error as err:
-    print(f"❌ MySQL Error: {err}")
-except Exception as e:
-    print(f"❌ Python Error: {e}")
-finally:
-    if 'cursor' in locals(): cursor.close()
-    if 'conn' in locals(): conn.close()
-    print("🔴 MySQL Connection Closed.")
+        print(f"✅ Content-Based Model trained and saved at {model_path}!")
+
+    except DatabaseError as err:
+        print(f"❌ Database Error: {err}")
+    except Exception as e:
+        print(f"❌ Python Error: {e}")
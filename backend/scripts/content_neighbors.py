@@ -0,0 +1,160 @@
+import os
+import pickle
+import shutil
+import tempfile
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+from scripts.topk import top_k
+
+_worker_matrix = None
+
+
+def _init_worker(matrix):
+    global _worker_matrix
+    _worker_matrix = matrix
+
+
+def _chunk_topk(start, end, k, matrix=None):
+    """Top-k cosine neighbours (excluding self) for rows [start, end)."""
+    X = matrix if matrix is not None else _worker_matrix
+    sims = (X[start:end] @ X.T).toarray().astype(np.float32)
+    rows = np.arange(end - start)
+    sims[rows, rows + start] = -np.inf
+    k = min(k, sims.shape[1] - 1)
+    if k <= 0:
+        return start, np.zeros((end - start, 0), dtype=np.int32), np.zeros((end - start, 0), dtype=np.float32)
+    part = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+    part_scores = np.take_along_axis(sims, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind="stable")
+    return start, np.take_along_axis(part, order, axis=1).astype(np.int32), \
+        np.take_along_axis(part_scores, order, axis=1)
+
+
+def build_topk_neighbors(tfidf_matrix, k=50, chunk_size=1024, workers=None, max_chunk_cells=50_000_000):
+    """
+    Item-item cosine top-k over L2-normalised TF-IDF rows, computed in row
+    chunks across worker processes. Returns CSR arrays (indptr, indices, data);
+    non-positive similarities are dropped.
+    """
+    X = tfidf_matrix.tocsr().astype(np.float32)
+    n = X.shape[0]
+    # Bound the dense chunk (rows x n) so peak memory stays flat as n grows
+    chunk_size = max(1, min(chunk_size, max_chunk_cells // max(n, 1)))
+    bounds = [(s, min(s + chunk_size, n)) for s in range(0, n, chunk_size)]
+    workers = workers or os.cpu_count() or 1
+
+    if workers > 1 and len(bounds) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(X,)) as pool:
+            results = list(pool.map(_chunk_topk, *zip(*[(s, e, k) for s, e in bounds])))
+    else:
+        results = [_chunk_topk(s, e, k, matrix=X) for s, e in bounds]
+
+    indices = np.concatenate([r[1] for r in sorted(results, key=lambda r: r[0])]) if results else \
+        np.zeros((0, 0), dtype=np.int32)
+    data = np.concatenate([r[2] for r in sorted(results, key=lambda r: r[0])]) if results else \
+        np.zeros((0, 0), dtype=np.float32)
+    keep = data > 0
+    indptr = np.concatenate([[0], np.cumsum(keep.sum(axis=1))]).astype(np.int64)
+    return indptr, indices[keep].astype(np.int32), data[keep].astype(np.float32)
+
+
+def save_neighbors(path, product_ids, indptr, indices, data):
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, "product_ids.npy"), np.asarray(product_ids, dtype=np.int64))
+    np.save(os.path.join(path, "indptr.npy"), indptr)
+    np.save(os.path.join(path, "indices.npy"), indices)
+    np.save(os.path.join(path, "data.npy"), data)
+
+
+def ensure_neighbors(path, model_path, k=int(os.environ.get("CONTENT_TOP_K", "50"))):
+    """
+    Build the neighbour store at path from content_model.pkl (products +
+    fitted TF-IDF) if it has not been built yet, e.g. on a fresh checkout.
+    """
+    if os.path.exists(os.path.join(path, "product_ids.npy")):
+        return path
+    print(f"🔄 No content neighbours at {path}, building them from {model_path}...")
+    with open(model_path, "rb") as f:
+        model = pickle.load(f)
+    products = model["products"]
+    tfidf_matrix = model["tfidf"].transform(products["description"].fillna("").astype(str))
+    # Single process: this can run inside the API, where forking a pool is unsafe
+    indptr, indices, data = build_topk_neighbors(tfidf_matrix, k=k, workers=1)
+    # Private temp dir: several processes (e.g. evaluation workers) may build at once
+    tmp_path = tempfile.mkdtemp(prefix=".content_neighbors.", dir=os.path.dirname(os.path.abspath(path)))
+    save_neighbors(tmp_path, products["product_id"].to_numpy(), indptr, indices, data)
+    try:
+        if os.path.isdir(path) and not os.listdir(path):
+            os.rmdir(path)
+        os.replace(tmp_path, path)  # loaders never see a half-written store
+        print(f"✅ Content neighbours built for {len(products)} products")
+    except OSError:
+        if not os.path.exists(os.path.join(path, "product_ids.npy")):
+            raise
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)  # another process finished first
+    return path
+
+
+class ContentNeighbors:
+    """
+    Memory-mapped top-k item-item neighbour lists, one CSR row per entry
+    of product_ids.
+    """
+
+    def __init__(self, product_ids, indptr, indices, data):
+        order = np.argsort(product_ids, kind="stable")
+        self.product_ids = np.asarray(product_ids)
+        self._sorted_ids = self.product_ids[order]
+        self._sorted_rows = order
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        def arr(name):
+            return np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode)
+        return cls(np.asarray(arr("product_ids")), arr("indptr"), arr("indices"), arr("data"))
+
+    def rows_of(self, pids):
+        pids = np.asarray(pids, dtype=np.int64)
+        if len(self._sorted_ids) == 0:
+            return np.full(len(pids), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self._sorted_ids, pids), len(self._sorted_ids) - 1)
+        return np.where(self._sorted_ids[pos] == pids, self._sorted_rows[pos], -1)
+
+    def neighbors(self, pid):
+        """(neighbour product_ids, similarities) for one product, best first."""
+        row = self.rows_of([pid])[0]
+        if row < 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        start, end = self.indptr[row], self.indptr[row + 1]
+        return self.product_ids[self.indices[start:end]], np.asarray(self.data[start:end])
+
+    def similarity(self, pid, other_pids):
+        """Similarity of pid to each of other_pids (0 outside its top-k list)."""
+        neighbour_ids, scores = self.neighbors(pid)
+        lookup = dict(zip(neighbour_ids.tolist(), scores.tolist()))
+        return np.array([lookup.get(int(p), 0.0) for p in other_pids], dtype=np.float32)
+
+    def recommend(self, history_pids, k=5):
+        """
+        Score products by summed similarity to the user's history items and
+        return the top-k (product_id, score), excluding the history itself.
+        """
+        rows = self.rows_of(history_pids)
+        rows = np.unique(rows[rows >= 0])
+        if len(rows) == 0:
+            return []
+        starts, ends = self.indptr[rows], self.indptr[rows + 1]
+        cols = np.concatenate([self.indices[s:e] for s, e in zip(starts, ends)])
+        sims = np.concatenate([self.data[s:e] for s, e in zip(starts, ends)])
+        if len(cols) == 0:
+            return []
+        candidates, inverse = np.unique(cols, return_inverse=True)
+        totals = np.bincount(inverse, weights=sims).astype(np.float32)
+        totals[np.isin(candidates, rows)] = -np.inf
+        best = [i for i in top_k(totals, k) if np.isfinite(totals[i])]
+        return [(int(self.product_ids[candidates[i]]), float(totals[i])) for i in best]
@@ -0,0 +1,253 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from scripts.metrics import record
+
+try:
+    import mysql.connector
+    DatabaseError = (mysql.connector.Error, sqlite3.Error)
+except ImportError:  # SQLite-only environments (tests, benchmarks)
+    mysql = None
+    DatabaseError = (sqlite3.Error,)
+
+DB_CONFIG = {
+    "host": os.environ.get("DB_HOST", "localhost"),
+    "user": os.environ.get("DB_USER", "root"),
+    "password": os.environ.get("DB_PASSWORD", ""),
+    "database": os.environ.get("DB_NAME", "ecommerce_recommendation"),
+}
+
+# ✅ Hot queries, written once with %s placeholders; on MySQL, parameterised ones run as
+# server-side prepared statements (binary protocol), prepared again on every call
+QUERIES = {
+    "products": "SELECT product_id, name, image_url FROM products",
+    "reviews": "SELECT product_id, rating, comment FROM reviews",
+    "products_fingerprint": "SELECT COUNT(*), MAX(created_at) FROM products",
+    "reviews_fingerprint": "SELECT COUNT(*), MAX(timestamp) FROM reviews",
+    "reviews_since": "SELECT review_id, user_id, product_id, rating FROM reviews "
+                     "WHERE review_id > %s ORDER BY review_id",
+    "user_history": "SELECT product_id FROM transactions WHERE user_id = %s "
+                    "ORDER BY purchase_date DESC LIMIT %s",
+    "interactions": "SELECT user_id, product_id, rating FROM interactions",
+}
+
+
+class ConnectionPool:
+    """
+    Bounded pool: at most `size` connections, created on demand and reused.
+    With a `ping` function, connections idle for over ping_after seconds are
+    checked before reuse and discarded if the check fails (e.g. the server
+    closed them after wait_timeout or restarted).
+    """
+
+    def __init__(self, connect, size=8, timeout=10.0, ping=None, ping_after=1.0):
+        self._connect = connect
+        self.size = size
+        self.timeout = timeout
+        self._ping = ping
+        self.ping_after = ping_after
+        self._idle = []  # LIFO stack of (connection, monotonic time it was returned)
+        self._created = 0
+        # Notified whenever a connection is returned or capacity is freed, so waiters re-check both
+        self._available = threading.Condition()
+
+    def _alive(self, conn, idle_since):
+        if self._ping is None or time.monotonic() - idle_since < self.ping_after:
+            return True
+        try:
+            self._ping(conn)
+            return True
+        except Exception as e:
+            print(f"⚠️ Dropping dead pooled connection: {e}")
+            return False
+
+    def _acquire(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._available:
+                while not self._idle and self._created >= self.size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(f"No database connection available within {self.timeout}s")
+                    self._available.wait(remaining)
+                if self._idle:
+                    conn, idle_since = self._idle.pop()
+                else:
+                    conn = None
+                    self._created += 1
+            if conn is None:
+                try:
+                    return self._connect()
+                except Exception:
+                    self._release_slot()
+                    raise
+            if self._alive(conn, idle_since):
+                return conn
+            self._discard(conn)
+
+    def _release_slot(self):
+        with self._available:
+            self._created -= 1
+            self._available.notify()
+
+    def _discard(self, conn):
+        self._release_slot()
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        try:
+            yield conn
+        except BaseException:
+            # A failed or abandoned (e.g. half-read stream) connection may be broken;
+            # don't hand it to the next caller
+            self._discard(conn)
+            raise
+        else:
+            with self._available:
+                self._idle.append((conn, time.monotonic()))
+                self._available.notify()
+
+    def close(self):
+        with self._available:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._discard(conn)
+
+
+class Database:
+    """
+    Parameterised query helpers over a ConnectionPool, with per-query timing.
+    SQL is written with %s placeholders; SQLite connections get them rewritten to ?.
+    """
+
+    def __init__(self, pool, backend="mysql"):
+        self.pool = pool
+        self.backend = backend
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+
+    def _sql(self, sql):
+        return sql.replace("%s", "?") if self.backend == "sqlite" else sql
+
+    def _cursor(self, conn, prepared):
+        if self.backend == "mysql" and prepared:
+            return conn.cursor(prepared=True)
+        return conn.cursor()
+
+    def _record(self, name, elapsed):
+        record(f"db.{name}", elapsed)
+        with self._stats_lock:
+            stat = self._stats.setdefault(name, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            stat["count"] += 1
+            stat["total_ms"] += elapsed * 1000
+            stat["max_ms"] = max(stat["max_ms"], elapsed * 1000)
+
+    def fetch_all(self, sql, params=(), name=None, prepared=False):
+        start = time.perf_counter()
+        with self.pool.connection() as conn:
+            cursor = self._cursor(conn, prepared)
+            try:
+                cursor.execute(self._sql(sql), tuple(params))
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+        self._record(name or sql[:60], time.perf_counter() - start)
+        return rows
+
+    def stream(self, sql, params=(), chunk_size=50000, name=None):
+        """
+        Yield lists of at most chunk_size rows. MySQL cursors are unbuffered
+        (server-side), so only one chunk is held in memory at a time.
+        """
+        start = time.perf_counter()
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(self._sql(sql), tuple(params))
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    yield rows
+            finally:
+                cursor.close()
+        self._record(name or sql[:60], time.perf_counter() - start)
+
+    def fetch_one(self, sql, params=(), name=None, prepared=False):
+        rows = self.fetch_all(sql, params, name=name, prepared=prepared)
+        return rows[0] if rows else None
+
+    def query(self, name, params=()):
+        """Run one of the named hot QUERIES; parameterised ones use MySQL's prepared-statement protocol."""
+        return self.fetch_all(QUERIES[name], params, name=name, prepared=bool(params))
+
+    def execute(self, sql, params=(), name=None):
+        start = time.perf_counter()
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(self._sql(sql), tuple(params))
+                conn.commit()
+                rowcount = cursor.rowcount
+            finally:
+                cursor.close()
+        self._record(name or sql[:60], time.perf_counter() - start)
+        return rowcount
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                name: dict(stat, avg_ms=stat["total_ms"] / stat["count"] if stat["count"] else 0.0)
+                for name, stat in self._stats.items()
+            }
+
+
+def mysql_database(size=8, **overrides):
+    if mysql is None:
+        raise ImportError("mysql-connector-python is required for the MySQL backend")
+    # Autocommit so pooled connections never read from a stale transaction snapshot
+    config = dict(DB_CONFIG, autocommit=True, **overrides)
+    # ping(reconnect=True) transparently re-opens a connection the server has dropped
+    pool = ConnectionPool(lambda: mysql.connector.connect(**config), size=size,
+                          ping=lambda conn: conn.ping(reconnect=True, attempts=1, delay=0))
+    return Database(pool, backend="mysql")
+
+
+def sqlite_database(path, size=8):
+    """SQLite stand-in; use "file:<name>?mode=memory&cache=shared" for an in-process database."""
+    def connect():
+        return sqlite3.connect(path, check_same_thread=False, uri=path.startswith("file:"))
+    return Database(ConnectionPool(connect, size=size), backend="sqlite")
+
+
+_database = None
+_database_lock = threading.Lock()
+
+
+def get_database():
+    """Process-wide Database chosen by DB_BACKEND (mysql | sqlite, with SQLITE_PATH)."""
+    global _database
+    if _database is None:
+        with _database_lock:
+            if _database is None:
+                size = int(os.environ.get("DB_POOL_SIZE", "8"))
+                if os.environ.get("DB_BACKEND", "mysql") == "sqlite":
+                    _database = sqlite_database(os.environ.get("SQLITE_PATH", "ecommerce_recommendation.db"), size=size)
+                else:
+                    _database = mysql_database(size=size)
+    return _database
+
+
+def set_database(database):
+    """Swap the process-wide Database (e.g. for a SQLite stand-in in tests or benchmarks)."""
+    global _database
+    with _database_lock:
+        _database = database
@@ -0,0 +1,197 @@
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from scripts.topk import top_k, top_k_rows
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _split_nodes(keys, vectors):
+    """Split Node2Vec keys ("user_<id>", "product_<id>") into integer-id blocks."""
+    users, products = [], []
+    for row, key in enumerate(keys):
+        kind, _, raw = str(key).partition("_")
+        if not raw.lstrip("-").isdigit():
+            continue
+        if kind == "user":
+            users.append((int(raw), row))
+        elif kind == "product":
+            products.append((int(raw), row))
+    users.sort()
+    products.sort()
+    user_ids = np.array([u for u, _ in users], dtype=np.int64)
+    product_ids = np.array([p for p, _ in products], dtype=np.int64)
+    user_vectors = vectors[[r for _, r in users]] if users else np.zeros((0, vectors.shape[1]))
+    product_vectors = vectors[[r for _, r in products]] if products else np.zeros((0, vectors.shape[1]))
+    return user_ids, user_vectors, product_ids, product_vectors
+
+
+def _lookup(sorted_ids, ids):
+    ids = np.asarray(ids, dtype=np.int64)
+    if len(sorted_ids) == 0:
+        return np.full(len(ids), -1, dtype=np.int64)
+    pos = np.minimum(np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1)
+    return np.where(sorted_ids[pos] == ids, pos, -1)
+
+
+class IVFIndex:
+    """
+    Inverted-file ANN index over unit vectors: spherical k-means coarse
+    quantizer, rows grouped by list, n_probe lists scanned per query.
+    """
+
+    def __init__(self, vectors, n_lists=None, n_probe=8, iters=10, sample_size=100000, seed=0):
+        n = len(vectors)
+        self.n_lists = max(1, min(n, n_lists or int(np.sqrt(max(n, 1)))))
+        self.n_probe = max(1, min(n_probe, self.n_lists))
+        rng = np.random.default_rng(seed)
+        sample = vectors[rng.choice(n, size=min(n, sample_size), replace=False)] if n else vectors
+        centroids = sample[rng.choice(len(sample), size=self.n_lists, replace=False)] if n else \
+            np.zeros((1, vectors.shape[1]), dtype=np.float32)
+        for _ in range(iters if n else 0):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            empty = np.bincount(assign, minlength=self.n_lists) == 0
+            sums[empty] = centroids[empty]
+            centroids = _normalize(sums)
+        self.centroids = centroids
+
+        assign = self._assign(vectors) if n else np.zeros(0, dtype=np.int64)
+        self.order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=self.n_lists)
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+        self.vectors = vectors[self.order]
+
+    def _assign(self, vectors, chunk_size=65536):
+        out = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), chunk_size):
+            out[start:start + chunk_size] = np.argmax(vectors[start:start + chunk_size] @ self.centroids.T, axis=1)
+        return out
+
+    def search(self, query, k, n_probe=None):
+        """Approximate top-k rows (into the original vector order) for one unit query."""
+        n_probe = n_probe or self.n_probe
+        lists = top_k(self.centroids @ query, n_probe)
+        rows = np.concatenate([np.arange(self.offsets[l], self.offsets[l + 1]) for l in lists])
+        if len(rows) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        scores = self.vectors[rows] @ query
+        best = top_k(scores, k)
+        return self.order[rows[best]], scores[best]
+
+
+class EmbeddingIndex:
+    """
+    Pre-normalized user/product embedding blocks from the Node2Vec KeyedVectors,
+    keyed by integer id. Dot products equal KeyedVectors.similarity (cosine).
+    """
+
+    def __init__(self, user_ids, user_vectors, product_ids, product_vectors, ann=None):
+        self.user_ids = user_ids
+        self.user_vectors = _normalize(user_vectors)
+        self.product_ids = product_ids
+        self.product_vectors = _normalize(product_vectors)
+        self.ann = None
+        if ann is not None and ann is not False:
+            self.ann = IVFIndex(self.product_vectors, **(ann if isinstance(ann, dict) else {}))
+        self._aligned = (None, None)
+
+    @classmethod
+    def from_keyed_vectors(cls, kv, ann=None):
+        user_ids, user_vectors, product_ids, product_vectors = _split_nodes(kv.index_to_key, kv.vectors)
+        return cls(user_ids, user_vectors, product_ids, product_vectors, ann=ann)
+
+    def user_rows(self, user_ids):
+        return _lookup(self.user_ids, user_ids)
+
+    def has_user(self, user_id):
+        return self.user_rows([user_id])[0] >= 0
+
+    def _align(self, product_ids):
+        # Catalog arrays are immutable, so the aligned matrix is cached by identity
+        key, aligned = self._aligned
+        if key is not None and key is product_ids:
+            return aligned
+        rows = _lookup(self.product_ids, product_ids)
+        matrix = np.zeros((len(rows), self.product_vectors.shape[1]), dtype=np.float32)
+        matrix[rows >= 0] = self.product_vectors[rows[rows >= 0]]
+        self._aligned = (product_ids, matrix)
+        return matrix
+
+    def scores_batch(self, user_ids, product_ids):
+        """Cosine scores (len(user_ids), len(product_ids)); unknown users/products score 0."""
+        matrix = self._align(product_ids)
+        rows = self.user_rows(user_ids)
+        users = np.zeros((len(rows), self.user_vectors.shape[1]), dtype=np.float32)
+        users[rows >= 0] = self.user_vectors[rows[rows >= 0]]
+        return users @ matrix.T
+
+    def scores(self, user_id, product_ids):
+        """Cosine scores aligned to product_ids, or None when the user has no embedding."""
+        if not self.has_user(user_id):
+            return None
+        return self.scores_batch([user_id], product_ids)[0]
+
+    def top_k(self, user_id, k=5, exact=False):
+        """Top-k (product_id, score) over the index's own products."""
+        row = self.user_rows([user_id])[0]
+        if row < 0:
+            return []
+        query = self.user_vectors[row]
+        if self.ann is not None and not exact:
+            rows, scores = self.ann.search(query, k)
+        else:
+            scores = self.product_vectors @ query
+            rows = top_k(scores, k)
+            scores = scores[rows]
+        return [(int(self.product_ids[r]), float(s)) for r, s in zip(rows, scores)]
+
+    def top_k_batch(self, user_ids, k=5):
+        """Exact top-k product rows for many users with one matrix product."""
+        rows = self.user_rows(user_ids)
+        users = np.zeros((len(rows), self.user_vectors.shape[1]), dtype=np.float32)
+        users[rows >= 0] = self.user_vectors[rows[rows >= 0]]
+        scores = users @ self.product_vectors.T
+        best = top_k_rows(scores, k)
+        return self.product_ids[best], np.take_along_axis(scores, best, axis=1)
+
+    def recall(self, user_ids, k=10, n_probe=None):
+        """Mean recall@k of the ANN index against exact search for the given users."""
+        if self.ann is None:
+            return 1.0
+        exact_ids, _ = self.top_k_batch(user_ids, k)
+        hits, total = 0, 0
+        for row, exact in zip(self.user_rows(user_ids), exact_ids):
+            if row < 0:
+                continue
+            approx, _ = self.ann.search(self.user_vectors[row], k, n_probe=n_probe)
+            hits += len(set(self.product_ids[approx].tolist()) & set(exact.tolist()))
+            total += len(exact)
+        return hits / total if total else 1.0
+
+
+if __name__ == "__main__":
+    from gensim.models import KeyedVectors
+
+    model_dir = os.path.join(os.path.dirname(__file__), "..", "models")
+    kv = KeyedVectors.load(os.path.join(model_dir, "graph_model.kv"))
+    print("📦 Building graph embedding index...")
+    start = time.perf_counter()
+    index = EmbeddingIndex.from_keyed_vectors(kv, ann={})
+    print(f"✅ Index built in {time.perf_counter() - start:.2f}s: "
+          f"{len(index.user_ids)} users, {len(index.product_ids)} products, {index.ann.n_lists} lists")
+
+    users = index.user_ids[:1000]
+    for n_probe in (1, 2, 4, 8, 16):
+        if n_probe > index.ann.n_lists:
+            break
+        print(f"📊 recall@10 n_probe={n_probe}: {index.recall(users, k=10, n_probe=n_probe):.3f}")
@@ -0,0 +1,159 @@
+import os
+import sys
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from scripts.db import get_database
+
+FEATURES_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "models", "engagement_features.npz"))
+CHUNK_ROWS = int(os.environ.get("FEATURES_CHUNK_ROWS", "100000"))
+
+ACTIONS = ["viewed", "clicked", "added_to_cart", "purchased"]
+EPOCH = ("1970-01-01 00:00:00", 0)
+
+# table -> (id column, timestamp column, value column); rows are read in
+# (timestamp, id) order past the table's watermark, ids breaking timestamp ties
+SOURCES = {
+    "social_media_data": ("social_id", "timestamp", "engagement_score"),
+    "browsing_history": ("history_id", "timestamp", "action"),
+    "transactions": ("transaction_id", "purchase_date", None),
+}
+
+
+class EngagementFeatures:
+    """
+    Running per-product engagement aggregates: engagement score sum/count,
+    event counts per ACTIONS type, the score range seen so far and a
+    (timestamp, id) watermark per source table. Stored as one uncompressed
+    .npz of aligned columns that the catalog loads without pandas.
+    """
+
+    def __init__(self, product_ids, engagement_sum, engagement_count, action_counts,
+                 score_min, score_max, watermarks):
+        self.product_ids = product_ids
+        self.engagement_sum = engagement_sum
+        self.engagement_count = engagement_count
+        self.action_counts = action_counts
+        self.score_min = score_min
+        self.score_max = score_max
+        self.watermarks = watermarks
+
+    @classmethod
+    def empty(cls):
+        return cls(np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0, dtype=np.int64),
+                   np.zeros((0, len(ACTIONS)), dtype=np.int64), np.inf, -np.inf,
+                   {table: EPOCH for table in SOURCES})
+
+    @classmethod
+    def load(cls, path=FEATURES_PATH):
+        if not os.path.exists(path):
+            return cls.empty()
+        with np.load(path) as data:
+            watermarks = {
+                str(table): (str(ts), int(row_id))
+                for table, ts, row_id in zip(data["watermark_tables"], data["watermark_times"],
+                                             data["watermark_ids"])
+            }
+            return cls(data["product_ids"], data["engagement_sum"], data["engagement_count"],
+                       data["action_counts"], float(data["score_min"]), float(data["score_max"]),
+                       dict({table: EPOCH for table in SOURCES}, **watermarks))
+
+    def save(self, path=FEATURES_PATH):
+        tables = list(self.watermarks)
+        tmp_path = path[:-len(".npz")] + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            product_ids=self.product_ids, engagement_sum=self.engagement_sum,
+            engagement_count=self.engagement_count, action_counts=self.action_counts,
+            score_min=self.score_min, score_max=self.score_max,
+            engagement_score=self.engagement_score, dominant_action=self.dominant_action,
+            watermark_tables=np.array(tables), watermark_times=np.array([self.watermarks[t][0] for t in tables]),
+            watermark_ids=np.array([self.watermarks[t][1] for t in tables], dtype=np.int64)
+        )
+        os.replace(tmp_path, path)  # the catalog never reads a half-written file
+
+    def _rows(self, pids):
+        """Row of each product_id, adding rows for products not seen before."""
+        pids = np.asarray(pids, dtype=np.int64)
+        new = np.setdiff1d(pids, self.product_ids)
+        if len(new):
+            merged = np.union1d(self.product_ids, new)
+            old_rows = np.searchsorted(merged, self.product_ids)
+            engagement_sum = np.zeros(len(merged))
+            engagement_count = np.zeros(len(merged), dtype=np.int64)
+            action_counts = np.zeros((len(merged), len(ACTIONS)), dtype=np.int64)
+            engagement_sum[old_rows] = self.engagement_sum
+            engagement_count[old_rows] = self.engagement_count
+            action_counts[old_rows] = self.action_counts
+            self.product_ids, self.engagement_sum = merged, engagement_sum
+            self.engagement_count, self.action_counts = engagement_count, action_counts
+        return np.searchsorted(self.product_ids, pids)
+
+    def add_engagement(self, pids, scores):
+        scores = np.asarray(scores, dtype=np.float64)
+        rows = self._rows(pids)
+        np.add.at(self.engagement_sum, rows, scores)
+        np.add.at(self.engagement_count, rows, 1)
+        if len(scores):
+            self.score_min = min(self.score_min, float(scores.min()))
+            self.score_max = max(self.score_max, float(scores.max()))
+
+    def add_actions(self, pids, actions):
+        action_index = {a: i for i, a in enumerate(ACTIONS)}
+        cols = np.array([action_index.get(str(a), -1) for a in actions], dtype=np.int64)
+        rows = self._rows(pids)
+        known = cols >= 0
+        np.add.at(self.action_counts, (rows[known], cols[known]), 1)
+
+    @property
+    def engagement_score(self):
+        """Mean engagement per product, min-max scaled to [0, 1] over every score seen (0 if none)."""
+        mean = np.divide(self.engagement_sum, self.engagement_count,
+                         out=np.zeros(len(self.product_ids)), where=self.engagement_count > 0)
+        if self.score_max > self.score_min:
+            scaled = (mean - self.score_min) / (self.score_max - self.score_min)
+            mean = np.where(self.engagement_count > 0, scaled, 0.0)
+        return mean
+
+    @property
+    def dominant_action(self):
+        """Most frequent action type per product ("" if none)."""
+        best = self.action_counts.argmax(axis=1) if len(self.product_ids) else np.zeros(0, dtype=np.int64)
+        names = np.array(ACTIONS)[best] if len(best) else np.zeros(0, dtype="<U1")
+        return np.where(self.action_counts.sum(axis=1) > 0, names, "")
+
+
+def _since_sql(table, until=False):
+    id_col, ts_col, value_col = SOURCES[table]
+    columns = ", ".join(c for c in (id_col, ts_col, "product_id", value_col) if c)
+    bound = f" AND {ts_col} <= %s" if until else ""
+    return (f"SELECT {columns} FROM {table} "
+            f"WHERE ({ts_col} > %s OR ({ts_col} = %s AND {id_col} > %s)){bound} ORDER BY {ts_col}, {id_col}")
+
+
+def update_features(db=None, path=FEATURES_PATH, chunk_rows=CHUNK_ROWS, until=None):
+    """
+    Fold rows past each table's watermark (and up to `until`, if given) into
+    the stored aggregates; returns (features, new row counts).
+    """
+    db = db or get_database()
+    features = EngagementFeatures.load(path)
+    counts = {}
+    for table in SOURCES:
+        ts, row_id = features.watermarks[table]
+        params = (ts, ts, row_id) if until is None else (ts, ts, row_id, str(until))
+        counts[table] = 0
+        for rows in db.stream(_since_sql(table, until is not None), params, chunk_size=chunk_rows,
+                              name=f"features_{table}"):
+            ids, times, pids = [r[0] for r in rows], [r[1] for r in rows], [r[2] for r in rows]
+            if table == "social_media_data":
+                scored = [(pid, float(r[3])) for pid, r in zip(pids, rows) if r[3] is not None]
+                features.add_engagement([p for p, _ in scored], [s for _, s in scored])
+            elif table == "browsing_history":
+                features.add_actions(pids, [r[3] for r in rows])
+            else:
+                features.add_actions(pids, ["purchased"] * len(rows))
+            features.watermarks[table] = (str(times[-1]), int(ids[-1]))
+            counts[table] += len(rows)
+    features.save(path)
+    return features, counts
@@ -0,0 +1,141 @@
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+
+from scripts.metrics import CACHE_REQUESTS, span
+
+
+class LRUCache:
+    """Thread-safe bounded mapping that evicts the least recently used entry."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class ExplanationService:
+    """
+    Computes SHAP explanations on a background worker pool, off the
+    recommendation path. Results are cached under
+    (model_type, model_version, user_id, product_id); a token groups the
+    items of one recommendation response so clients can poll for them.
+    """
+
+    def __init__(self, explain_fn, version_fn, max_workers=2, cache_size=10000, max_tokens=10000):
+        self.explain_fn = explain_fn
+        self.version_fn = version_fn
+        self.cache = LRUCache(cache_size)
+        self.tokens = LRUCache(max_tokens)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="shap")
+
+    def key(self, model_type, user_id, product_id):
+        return (model_type, self.version_fn(model_type), int(user_id), int(product_id))
+
+    def _run(self, key):
+        model_type, _, user_id, product_id = key
+        try:
+            with span(f"shap_{model_type}"):
+                shap_value, breakdown = self.explain_fn(model_type, user_id, product_id)
+            result = {"status": "ready", "shap_value": shap_value, "shap_breakdown": breakdown}
+        except Exception as e:
+            print(f"❌ SHAP {model_type} Error: {e}")
+            result = {"status": "error", "shap_value": 0, "shap_breakdown": {}}
+        self.cache.put(key, result)
+        with self._lock:
+            self._pending.pop(key, None)
+        return result
+
+    def store(self, model_type, user_id, product_id, shap_value, breakdown):
+        """Cache an explanation computed elsewhere (e.g. exact attributions)."""
+        self.cache.put(self.key(model_type, user_id, product_id),
+                       {"status": "ready", "shap_value": shap_value, "shap_breakdown": breakdown})
+
+    def lookup(self, model_type, user_id, product_id):
+        result = self.cache.get(self.key(model_type, user_id, product_id))
+        CACHE_REQUESTS.inc(cache="explanations", result="miss" if result is None else "hit")
+        return result
+
+    def _ensure(self, key):
+        """Queue key unless it is cached or already queued; returns the cached result if any."""
+        with self._lock:
+            result = self.cache.get(key)
+            if result is None and key not in self._pending:
+                self._pending[key] = self._executor.submit(self._run, key)
+        return result
+
+    def submit(self, items):
+        """Queue (model_type, user_id, product_id) items; returns a token for polling."""
+        keys = [self.key(model_type, user_id, product_id) for model_type, user_id, product_id in items]
+        for key in keys:
+            self._ensure(key)
+        token = uuid.uuid4().hex
+        self.tokens.put(token, keys)
+        return token
+
+    def _wait(self, keys, wait):
+        if wait <= 0:
+            return
+        with self._lock:
+            futures = [self._pending[k] for k in keys if k in self._pending]
+        if futures:
+            wait_futures(futures, timeout=wait)
+
+    def status(self, token, wait=0.0):
+        """Explanations for a token, optionally long-polling up to `wait` seconds for pending ones."""
+        keys = self.tokens.get(token)
+        if keys is None:
+            return {"token": token, "status": "unknown", "explanations": []}
+        self._wait(keys, wait)
+        return self._report(token, keys)
+
+    def status_many(self, tokens, wait=0.0):
+        """Bulk status; a single long-poll covers the pending items of every token."""
+        keyed = [(token, self.tokens.get(token)) for token in tokens]
+        self._wait([k for _, keys in keyed if keys for k in keys], wait)
+        return [
+            self._report(token, keys) if keys is not None
+            else {"token": token, "status": "unknown", "explanations": []}
+            for token, keys in keyed
+        ]
+
+    def _report(self, token, keys):
+        explanations = []
+        for key in keys:
+            model_type, _, user_id, product_id = key
+            # Entries evicted since submission are simply queued again
+            result = self._ensure(key) or {"status": "pending", "shap_value": 0, "shap_breakdown": {}}
+            explanations.append({"product_id": product_id, "model": model_type, **result})
+        done = all(e["status"] != "pending" for e in explanations)
+        return {"token": token, "status": "ready" if done else "pending", "explanations": explanations}
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
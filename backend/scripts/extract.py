@@ -0,0 +1,152 @@
+import json
+import os
+import sys
+import time
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from scripts.db import get_database, DatabaseError
+
+EXTRACT_DIR = os.environ.get(
+    "EXTRACT_DIR", os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data", "extract"))
+)
+CHUNK_ROWS = int(os.environ.get("EXTRACT_CHUNK_ROWS", "100000"))
+# Snapshots older than this are re-extracted by load_table; 0 disables the check
+MAX_AGE_HOURS = float(os.environ.get("EXTRACT_MAX_AGE_HOURS", "24"))
+
+# ✅ Columns the trainers use, with compact types (ids fit in int32, ratings in float32)
+TABLES = {
+    "users": pa.schema([("user_id", pa.int32())]),
+    "products": pa.schema([
+        ("product_id", pa.int32()), ("name", pa.string()), ("description", pa.string())
+    ]),
+    "reviews": pa.schema([
+        ("review_id", pa.int64()), ("user_id", pa.int32()), ("product_id", pa.int32()),
+        ("rating", pa.float32()), ("timestamp", pa.timestamp("s"))
+    ]),
+    "transactions": pa.schema([
+        ("user_id", pa.int32()), ("product_id", pa.int32()), ("purchase_date", pa.timestamp("s"))
+    ]),
+    "browsing_history": pa.schema([
+        ("user_id", pa.int32()), ("product_id", pa.int32()),
+        ("action", pa.dictionary(pa.int8(), pa.string())), ("timestamp", pa.timestamp("s"))
+    ]),
+    "social_media_data": pa.schema([
+        ("user_id", pa.int32()), ("product_id", pa.int32()), ("engagement_score", pa.float32()),
+        ("timestamp", pa.timestamp("s"))
+    ]),
+}
+
+
+def table_path(table, extract_dir=EXTRACT_DIR):
+    return os.path.join(extract_dir, f"{table}.parquet")
+
+
+def _manifest_path(extract_dir):
+    return os.path.join(extract_dir, "manifest.json")
+
+
+def read_manifest(extract_dir=EXTRACT_DIR):
+    try:
+        with open(_manifest_path(extract_dir)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"created_at": None, "tables": {}}
+
+
+def _write_manifest(manifest, extract_dir):
+    tmp_path = _manifest_path(extract_dir) + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, _manifest_path(extract_dir))
+
+
+def extracted_at(table, extract_dir=EXTRACT_DIR):
+    """Unix time the table's snapshot was taken (manifest entry, else the file's mtime), or None."""
+    entry = read_manifest(extract_dir)["tables"].get(table) or {}
+    if entry.get("created_at") is not None:
+        return entry["created_at"]
+    path = table_path(table, extract_dir)
+    return os.path.getmtime(path) if os.path.exists(path) else None
+
+
+def _column(values, field):
+    if pa.types.is_timestamp(field.type):
+        # MySQL returns datetimes, SQLite returns ISO strings
+        return pa.array(pd.to_datetime(pd.Series(values)), type=field.type)
+    if pa.types.is_dictionary(field.type):
+        return pa.array(values, type=field.type.value_type).dictionary_encode().cast(field.type)
+    return pa.array(values, type=field.type)
+
+
+def _batch(rows, schema):
+    columns = list(zip(*rows))
+    return pa.RecordBatch.from_arrays([_column(list(c), f) for c, f in zip(columns, schema)], schema=schema)
+
+
+def extract_table(db, table, extract_dir=EXTRACT_DIR, chunk_rows=CHUNK_ROWS):
+    """
+    Stream one table into <extract_dir>/<table>.parquet, one row group per
+    chunk, and record it in manifest.json; returns the row count.
+    """
+    schema = TABLES[table]
+    os.makedirs(extract_dir, exist_ok=True)
+    path = table_path(table, extract_dir)
+    tmp_path = path + ".tmp"
+    sql = f"SELECT {', '.join(schema.names)} FROM {table}"
+    created_at, start = time.time(), time.perf_counter()
+    count = 0
+    with pq.ParquetWriter(tmp_path, schema, compression="snappy") as writer:
+        for rows in db.stream(sql, chunk_size=chunk_rows, name=f"extract_{table}"):
+            writer.write_batch(_batch(rows, schema))
+            count += len(rows)
+    os.replace(tmp_path, path)  # readers never see a partial file
+
+    manifest = read_manifest(extract_dir)
+    manifest["tables"][table] = {"rows": count, "created_at": created_at,
+                                 "seconds": round(time.perf_counter() - start, 3)}
+    _write_manifest(manifest, extract_dir)
+    return count
+
+
+def extract_all(db=None, tables=None, extract_dir=EXTRACT_DIR, chunk_rows=CHUNK_ROWS):
+    db = db or get_database()
+    created_at = time.time()
+    for table in tables or TABLES:
+        count = extract_table(db, table, extract_dir, chunk_rows)
+        seconds = read_manifest(extract_dir)["tables"][table]["seconds"]
+        print(f"✅ Extracted {count} rows from '{table}' in {seconds}s")
+    manifest = read_manifest(extract_dir)
+    manifest["created_at"] = created_at
+    _write_manifest(manifest, extract_dir)
+    return manifest
+
+
+def load_table(table, columns=None, extract_dir=EXTRACT_DIR, max_age_hours=MAX_AGE_HOURS):
+    """
+    DataFrame of a table from the extract snapshot (memory-mapped Parquet),
+    extracting it first if the snapshot has no such table yet, was written
+    with an older column layout or is more than max_age_hours old.
+    """
+    path = table_path(table, extract_dir)
+    if not os.path.exists(path):
+        print(f"⚠️ No extract for '{table}' yet, extracting it now...")
+        extract_table(get_database(), table, extract_dir)
+    elif pq.read_schema(path).names != TABLES[table].names:
+        print(f"⚠️ Extract for '{table}' has an outdated schema, re-extracting it now...")
+        extract_table(get_database(), table, extract_dir)
+    elif max_age_hours and time.time() - extracted_at(table, extract_dir) > max_age_hours * 3600:
+        print(f"🔄 Extract for '{table}' is older than {max_age_hours:g}h, re-extracting it now...")
+        extract_table(get_database(), table, extract_dir)
+    return pq.read_table(path, columns=columns, memory_map=True).to_pandas()
+
+
+if __name__ == "__main__":
+    try:
+        print(f"🔵 Extracting {len(TABLES)} tables to {EXTRACT_DIR}...")
+        extract_all()
+        print("✅ Extract complete.")
+    except DatabaseError as err:
+        print(f"❌ Database Error: {err}")
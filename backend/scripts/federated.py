@@ -2,8 +2,15 @@ import os
 import flwr as fl
 import tensorflow as tf
 import numpy as np
-import mysql.connector
 import pickle
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from scripts.session_scorer import SessionScorer, TFLiteSessionScorer
+from scripts.db import get_database
+from scripts.update_codec import UpdateCodec
+
+SESSION_SCORER = os.environ.get("SESSION_SCORER", "keras")  # "keras" or "tflite"
 
 # ✅ Load product_id <-> index mapping from file
 def load_product_mapping():
@@ -13,15 +20,12 @@ def load_product_mapping():
     return mapping["product_to_index"], mapping["index_to_product"]
 
 # ✅ Fetch user-product-rating data and convert to index
-def get_user_data(product_to_index):
-    conn = mysql.connector.connect(
-        host="localhost", user="root", password="", database="ecommerce_recommendation"
-    )
-    cursor = conn.cursor()
-    cursor.execute("SELECT user_id, product_id, rating FROM interactions")
-    data = cursor.fetchall()
-    cursor.close()
-    conn.close()
+def get_user_data(product_to_index, partition=None):
+    """partition=(index, count) keeps only users with user_id % count == index."""
+    data = get_database().query("interactions")
+    if partition is not None:
+        index, count = partition
+        data = [row for row in data if int(row[0]) % count == index]
 
     if not data:
         print("⚠️ No user-product interaction data found.")
@@ -31,33 +35,30 @@ def get_user_data(product_to_index):
     products = [product_to_index.get(pid, 0) for pid in products]
     return np.array(users), np.array(products), np.array(ratings)
 
-# ✅ Fetch user's last 2 product interactions
-def get_recent_session(user_id, product_to_index):
-    conn = mysql.connector.connect(
-        host="localhost", user="root", password="", database="ecommerce_recommendation"
-    )
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT product_id FROM transactions
-        WHERE user_id = %s
-        ORDER BY purchase_date DESC
-        LIMIT 2
-    """, (user_id,))
-    results = cursor.fetchall()
-    cursor.close()
-    conn.close()
-
-    if len(results) < 2:
+# ✅ Fetch user's last `limit` product interactions
+def get_recent_session(user_id, product_to_index, limit=2):
+    results = get_database().query("user_history", (user_id, limit))
+
+    if not results:
         return None
 
     return [product_to_index.get(pid[0], 0) for pid in reversed(results)]  # Oldest → Newest
 
 class FederatedRecommender(fl.client.NumPyClient):
-    def __init__(self, model_path):
+    def __init__(self, model_path, partition=None):
         print("🔵 Loading model from:", model_path)
         self.model = tf.keras.models.load_model(model_path)
         print("✅ Model loaded.")
         self.product_to_index, self.index_to_product = load_product_mapping()
+        self.scorer = self._build_scorer(model_path)
+        self.codec = UpdateCodec.from_env()  # None: send full float32 weights
+        self.partition = partition  # (index, count) slice of the users this client trains on
+
+    def _build_scorer(self, model_path):
+        tflite_path = os.path.splitext(model_path)[0] + ".tflite"
+        if SESSION_SCORER == "tflite" and os.path.exists(tflite_path):
+            return TFLiteSessionScorer(tflite_path, self.index_to_product)
+        return SessionScorer(self.model, self.index_to_product)
 
     def get_parameters(self, config=None):
         return self.model.get_weights()
@@ -66,29 +67,39 @@ class FederatedRecommender(fl.client.NumPyClient):
         self.model.set_weights(parameters)
         print("🟢 Federated Learning Training Started...")
 
-        users, products, ratings = get_user_data(self.product_to_index)
+        users, products, ratings = get_user_data(self.product_to_index, self.partition)
         if len(users) == 0:
             print("⚠️ Skipping training: no data.")
             return self.get_parameters(), 0, {}
 
         # Dummy padded input for training
-        X_train = np.array([[p, p, p] for p in products])
+        X_train = np.array([[p] * self.scorer.seq_len for p in products])
         y_train = ratings
 
         self.model.fit(X_train, y_train, epochs=1, batch_size=32, verbose=1)
         print("✅ Federated Training Complete.")
-        return self.get_parameters(), len(X_train), {}
+        weights = self.get_parameters()
+        if self.codec is None:
+            return weights, len(X_train), {}
+
+        # 📦 Ship a compressed delta against the global weights this round started from
+        update = self.codec.encode(weights, parameters)
+        raw_bytes = sum(w.nbytes for w in weights)
+        sent_bytes = sum(a.nbytes for a in update)
+        print(f"📦 Update: {sent_bytes / 1e6:.2f} MB sent vs {raw_bytes / 1e6:.2f} MB raw "
+              f"({raw_bytes / max(sent_bytes, 1):.1f}x, vocab {self.scorer.vocab_size})")
+        return update, len(X_train), {"compressed": 1, "raw_bytes": raw_bytes}
 
     def evaluate(self, parameters, config):
         self.model.set_weights(parameters)
         print("🧪 Evaluating Federated Model...")
 
-        _, products, ratings = get_user_data(self.product_to_index)
+        _, products, ratings = get_user_data(self.product_to_index, self.partition)
         if len(products) == 0:
             print("⚠️ Skipping evaluation.")
             return 0.0, 0, {}
 
-        X_test = np.array([[p, p, p] for p in products])
+        X_test = np.array([[p] * self.scorer.seq_len for p in products])
         y_test = ratings
         loss, _ = self.model.evaluate(X_test, y_test, verbose=0)
         print("✅ Evaluation Done. Loss:", loss)
@@ -96,32 +107,27 @@ class FederatedRecommender(fl.client.NumPyClient):
 
     def predict(self, user_id, top_k=5):
         print(f"🔮 Predicting top {top_k} products for user {user_id}...")
-        recent_session = get_recent_session(user_id, self.product_to_index)
-        product_ids = list(self.product_to_index.keys())
+        recent_session = get_recent_session(user_id, self.product_to_index, limit=self.scorer.seq_len)
 
-        if not recent_session or len(recent_session) < 2:
+        if not recent_session:
             print("⚠️ Not enough session data, using dummy input.")
-            return product_ids[:top_k]
-
-        input_sequences = []
-        valid_products = []
-
-        for pid in product_ids:
-            if pid in self.product_to_index:
-                candidate_idx = self.product_to_index[pid]
-                input_seq = recent_session[-2:] + [candidate_idx]
-                if len(input_seq) == 3:
-                    input_sequences.append(input_seq)
-                    valid_products.append(pid)
-
-        if not input_sequences:
-            print("⚠️ No valid inputs generated, returning top random.")
-            return product_ids[:top_k]
-
-        X_input = np.array(input_sequences)
-        predictions = self.model.predict(X_input, verbose=0).flatten()
-        top_indices = np.argsort(predictions)[::-1][:top_k]
-        return [valid_products[i] for i in top_indices if i < len(valid_products)]
+            return list(self.product_to_index.keys())[:top_k]
+
+        # ✅ One forward pass on the real session prefix scores every candidate
+        return [pid for pid, _ in self.scorer.top_k(recent_session, k=top_k)]
+
+    def predict_sessions(self, sessions, top_k=5):
+        """
+        Batched predict: sessions are per-user product_id lists (oldest → newest)
+        or None; all real sessions share one forward pass.
+        """
+        fallback = list(self.product_to_index.keys())[:top_k]
+        indexed = [[self.product_to_index.get(pid, 0) for pid in s] if s else None for s in sessions]
+        rows = [i for i, s in enumerate(indexed) if s]
+        results = [fallback] * len(sessions)
+        for row, top in zip(rows, self.scorer.top_k_batch([indexed[i] for i in rows], k=top_k)):
+            results[row] = [pid for pid, _ in top]
+        return results
 
 
 # ✅ Entry Point
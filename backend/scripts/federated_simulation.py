@@ -0,0 +1,148 @@
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import time
+import traceback
+import numpy as np
+from flwr.common import Code, FitRes, Status, ndarrays_to_parameters, parameters_to_ndarrays
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from scripts.server import CompressedFedAvg
+
+MODEL_PATH = os.path.join(os.path.dirname(__file__), "..", "models", "session_model.h5")
+# Longest wait for any single client result before the round is abandoned
+RESULT_TIMEOUT = float(os.environ.get("SIM_RESULT_TIMEOUT", "1800"))
+
+
+def make_client(model_path, partition):
+    from scripts.federated import FederatedRecommender
+    return FederatedRecommender(model_path, partition=partition)
+
+
+def _worker_main(client_ids, n_clients, model_path, client_factory, tasks, results):
+    """
+    Long-lived worker process owning a fixed set of clients, so per-client
+    state (e.g. the update codec's error-feedback residuals) survives rounds.
+    A failing client is reported as ("error", cid, traceback) and ends the worker.
+    """
+    clients, cid = {}, None
+    try:
+        for cid in client_ids:
+            clients[cid] = client_factory(model_path, (cid, n_clients))
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            kind, server_round, parameters = task
+            if kind == "init":
+                cid = client_ids[0]
+                results.put(("init", None, clients[cid].get_parameters()))
+                continue
+            for cid in client_ids:
+                start = time.perf_counter()
+                weights, num_examples, metrics = clients[cid].fit(parameters, {"server_round": server_round})
+                results.put(("fit", cid, (weights, num_examples, metrics, time.perf_counter() - start)))
+    except Exception:
+        results.put(("error", cid, traceback.format_exc()))
+
+
+def _next_result(results, processes, timeout=RESULT_TIMEOUT):
+    """Next worker result; raises if a client failed, a worker died or nothing arrived within timeout."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            kind, cid, payload = results.get(timeout=1)
+        except queue.Empty:
+            dead = [p for p in processes if not p.is_alive()]
+            if dead:
+                raise RuntimeError(f"Simulation worker exited unexpectedly (exit code {dead[0].exitcode})")
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"No client result within {timeout:g}s")
+            continue
+        if kind == "error":
+            raise RuntimeError(f"Client {cid} failed:\n{payload}")
+        return kind, cid, payload
+
+
+def simulate(n_clients=4, rounds=3, workers=None, model_path=MODEL_PATH, client_factory=make_client,
+             timeout=RESULT_TIMEOUT):
+    """
+    Run `rounds` of federated training with n_clients FederatedRecommender
+    clients, each on its own user partition, spread over worker processes and
+    aggregated in-process by CompressedFedAvg. Returns per-round stats; a
+    failed client, dead worker or result slower than timeout raises.
+    """
+    workers = max(1, min(workers or os.cpu_count() or 1, n_clients))
+    ctx = multiprocessing.get_context("spawn")  # TensorFlow does not survive fork
+    results = ctx.Queue()
+    queues, processes = [], []
+    for wid in range(workers):
+        tasks = ctx.Queue()
+        process = ctx.Process(target=_worker_main, daemon=True, args=(
+            list(range(wid, n_clients, workers)), n_clients, model_path, client_factory, tasks, results))
+        process.start()
+        queues.append(tasks)
+        processes.append(process)
+
+    strategy = CompressedFedAvg()
+    report = []
+    try:
+        queues[0].put(("init", 0, None))
+        _, _, parameters = _next_result(results, processes, timeout)
+        for server_round in range(1, rounds + 1):
+            start = time.perf_counter()
+            strategy.set_global(server_round, parameters)
+            for tasks in queues:
+                tasks.put(("fit", server_round, parameters))
+
+            fits, fit_seconds = [], []
+            for _ in range(n_clients):
+                _, cid, (weights, num_examples, metrics, seconds) = _next_result(results, processes, timeout)
+                fit_res = FitRes(Status(Code.OK, ""), ndarrays_to_parameters(weights), num_examples, metrics)
+                fits.append((cid, fit_res))
+                fit_seconds.append(seconds)
+
+            aggregated, metrics = strategy.aggregate_fit(server_round, fits, [])
+            parameters = parameters_to_ndarrays(aggregated)
+            wall = time.perf_counter() - start
+            examples = sum(res.num_examples for _, res in fits)
+            stats = {
+                "round": server_round,
+                "clients": n_clients,
+                "wall_seconds": wall,
+                "client_fit_seconds_mean": float(np.mean(fit_seconds)),
+                "client_fit_seconds_max": float(np.max(fit_seconds)),
+                "aggregation_seconds": metrics["aggregation_seconds"],
+                "received_bytes": metrics["received_bytes"],
+                "examples": examples,
+                "examples_per_second": examples / wall if wall > 0 else 0.0,
+            }
+            report.append(stats)
+            print(f"⏱️ Round {server_round}: {wall:.2f}s wall, client fit {stats['client_fit_seconds_mean']:.2f}s "
+                  f"mean / {stats['client_fit_seconds_max']:.2f}s max, aggregation "
+                  f"{stats['aggregation_seconds'] * 1000:.1f} ms, {stats['examples_per_second']:.0f} examples/s")
+    finally:
+        for tasks in queues:
+            tasks.put(None)
+        for process in processes:
+            process.join(timeout=30)
+            if process.is_alive():
+                process.terminate()  # still busy with a round we abandoned
+    return report
+
+
+if __name__ == "__main__":
+    n_clients = int(os.environ.get("SIM_CLIENTS", "4"))
+    rounds = int(os.environ.get("SIM_ROUNDS", "3"))
+    workers = int(os.environ.get("SIM_WORKERS", "0")) or None
+    print(f"🚀 Simulating {rounds} federated rounds with {n_clients} clients...")
+    report = simulate(n_clients, rounds, workers)
+
+    report_path = os.environ.get("SIM_REPORT")
+    if report_path:
+        with open(report_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Round report saved to {report_path}")
+    print("✅ Simulation complete.")
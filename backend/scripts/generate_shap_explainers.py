@@ -9,27 +9,23 @@ from gensim.models import KeyedVectors
 
 # ✅ Add scripts/ to Python path
 sys.path.append(os.path.join(os.path.dirname(__file__)))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-from shap_wrapper import SurpriseWrapper, ContentWrapper, GraphWrapper, FederatedWrapper
+from shap_wrapper import ContentWrapper, GraphWrapper, FederatedWrapper
+from scripts.content_neighbors import ContentNeighbors, ensure_neighbors
 
 model_dir = os.path.join(os.path.dirname(__file__), "..", "models")
 
 print("📦 Loading models for SHAP explainability...")
 
-# ✅ Collaborative
-with open(os.path.join(model_dir, "collaborative_model.pkl"), "rb") as f:
-    collab_model = SurpriseWrapper(pickle.load(f))
-
-sample_input_collab = np.array([[1, 1], [2, 2], [3, 3]])
-explainer_collab = shap.KernelExplainer(collab_model.predict, sample_input_collab)
-with open(os.path.join(model_dir, "shap_explainer_collaborative.pkl"), "wb") as f:
-    dill.dump(explainer_collab, f)
-print("✅ SHAP explainer for collaborative saved.")
+# ✅ Collaborative: no KernelExplainer needed, the SVD estimate is additive and
+# SVDFactors.explain gives exact per-term / per-factor attributions.
+print("✅ Collaborative explanations are computed analytically from the SVD factors.")
 
 # ✅ Content-Based
-with open(os.path.join(model_dir, "content_model.pkl"), "rb") as f:
-    content_sim = pickle.load(f)
-content_model = ContentWrapper(content_sim, user_idx=1)
+content_neighbors = ContentNeighbors.load(ensure_neighbors(os.path.join(model_dir, "content_neighbors"),
+                                                            os.path.join(model_dir, "content_model.pkl")))
+content_model = ContentWrapper(content_neighbors, user_idx=int(content_neighbors.product_ids[0]))
 sample_products = list(range(10))
 explainer_content = shap.KernelExplainer(content_model.predict, np.array([sample_products]))
 with open(os.path.join(model_dir, "shap_explainer_content.pkl"), "wb") as f:
@@ -1,66 +1,62 @@
-import mysql.connector
-import pandas as pd
-import networkx as nx
-from node2vec import Node2Vec
+from gensim.models import Word2Vec
 import os
-
-try:
-    print("🔵 Connecting to MySQL...")
-    conn = mysql.connector.connect(
-        host="localhost",
-        user="root",
-        password="",
-        database="ecommerce_recommendation"
-    )
-    cursor = conn.cursor()
-    print("✅ Connected to MySQL!")
-
-    # 🟡 Fetch transactions
-    query = "SELECT user_id, product_id FROM transactions"
-    cursor.execute(query)
-    results = cursor.fetchall()
-
-    if not results:
-        print("❌ ERROR: No data found in 'transactions' table!")
-        exit()
-
-    print(f"✅ Loaded {len(results)} records from 'transactions' table.")
-    print("📊 Sample Rows:", results[:5])  # Show sample
-
-    # 🟡 Convert to DataFrame
-    df = pd.DataFrame(results, columns=["user_id", "product_id"])
-
-    # 🟡 Create bipartite-like graph
-    print("🟡 Creating User-Product Interaction Graph...")
-    G = nx.Graph()
-    G.add_edges_from([
-        ("user_" + str(row["user_id"]), "product_" + str(row["product_id"]))
-        for _, row in df.iterrows()
-    ])
-
-    if G.number_of_nodes() == 0:
-        raise Exception("Graph is empty. Cannot proceed with Node2Vec training.")
-
-    print(f"✅ Graph created with {G.number_of_nodes()} nodes and {G.number_of_edges()} edges.")
-
-    # 🟡 Train Node2Vec model
-    print("🟡 Training Node2Vec Embeddings...")
-    node2vec = Node2Vec(G, dimensions=64, walk_length=30, num_walks=200, workers=2, quiet=True)
-    model = node2vec.fit(window=10, min_count=1, batch_words=4)
-    print("✅ Node2Vec Training Complete!")
-
-    # 🟢 Save embeddings
-    model_dir = os.path.join(os.path.dirname(__file__), "..", "models")
-    os.makedirs(model_dir, exist_ok=True)
-    save_path = os.path.join(model_dir, "graph_model.kv")
-    model.wv.save(save_path)
-    print(f"✅ Model saved at {save_path}")
-
-except mysql.connector.Error as err:
-    print(f"❌ MySQL Error: {err}")
-except Exception as e:
-    print(f"❌ Python Error: {e}")
-finally:
-    if 'cursor' in locals(): cursor.close()
-    if 'conn' in locals(): conn.close()
-    print("🔴 MySQL Connection Closed.")
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from scripts.db import DatabaseError
+from scripts.extract import load_table
+from scripts.model_registry import record_training
+from scripts.random_walks import WalkCorpus, build_graph
+
+# node2vec walk settings; p/q bias the walk towards returning (p) or exploring (q)
+NUM_WALKS = int(os.environ.get("GRAPH_NUM_WALKS", "200"))
+WALK_LENGTH = int(os.environ.get("GRAPH_WALK_LENGTH", "30"))
+WALK_P = float(os.environ.get("GRAPH_WALK_P", "1"))
+WALK_Q = float(os.environ.get("GRAPH_WALK_Q", "1"))
+WALK_WORKERS = int(os.environ.get("GRAPH_WALK_WORKERS", "0")) or None
+# Where walk shards are spilled between Word2Vec passes (default: a temp directory, removed afterwards)
+WALK_CACHE_DIR = os.environ.get("GRAPH_WALK_CACHE_DIR") or None
+
+# Guarded: walk workers may be spawned processes that re-import this module
+if __name__ == "__main__":
+    try:
+        # 🟡 Load transactions from the extract snapshot
+        print("🔵 Loading transactions extract...")
+        df = load_table("transactions", columns=["user_id", "product_id", "purchase_date"])
+
+        if df.empty:
+            print("❌ ERROR: No data found in 'transactions' table!")
+            exit()
+
+        print(f"✅ Loaded {len(df)} records from 'transactions' table.")
+        print("📊 Sample Rows:", df[["user_id", "product_id"]].head().values.tolist())  # Show sample
+
+        # 🟡 Create bipartite user-product graph as integer CSR adjacency
+        print("🟡 Creating User-Product Interaction Graph...")
+        graph = build_graph(df["user_id"].to_numpy(), df["product_id"].to_numpy())
+
+        if graph.n_nodes == 0:
+            raise Exception("Graph is empty. Cannot proceed with Node2Vec training.")
+
+        print(f"✅ Graph created with {graph.n_nodes} nodes and {graph.n_edges} edges.")
+
+        # 🟡 Train Node2Vec model: walks are generated once in parallel shards, spilled to
+        # disk and replayed memory-mapped on every Word2Vec pass
+        print("🟡 Training Node2Vec Embeddings...")
+        with WalkCorpus(graph, num_walks=NUM_WALKS, walk_length=WALK_LENGTH, p=WALK_P, q=WALK_Q,
+                        workers=WALK_WORKERS, cache_dir=WALK_CACHE_DIR) as corpus:
+            model = Word2Vec(corpus, vector_size=64, window=10, min_count=1, sg=1, workers=2)
+        print("✅ Node2Vec Training Complete!")
+
+        # 🟢 Save embeddings
+        model_dir = os.path.join(os.path.dirname(__file__), "..", "models")
+        os.makedirs(model_dir, exist_ok=True)
+        save_path = os.path.join(model_dir, "graph_model.kv")
+        model.wv.save(save_path)
+        record_training(model_dir, "graph", df["purchase_date"].max())
+        print(f"✅ Model saved at {save_path}")
+
+    except DatabaseError as err:
+        print(f"❌ Database Error: {err}")
+    except Exception as e:
+        print(f"❌ Python Error: {e}")
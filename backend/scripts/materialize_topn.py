@@ -0,0 +1,163 @@
+import json
+import os
+import shutil
+import sys
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from scripts.db import get_database, set_database, DatabaseError
+
+MODEL_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "models"))
+TOPN_DIR = os.path.join(MODEL_DIR, "topn")
+FEATURES_PATH = os.path.join(MODEL_DIR, "engagement_features.npz")
+
+_worker_recommender = None
+
+
+class TopNStore:
+    """
+    Precomputed top-N (product_id, score) lists per user and source.
+    user_rows maps a user_id straight to its row, and each source keeps CSR
+    arrays (offsets, product_ids, scores) over those rows, so a lookup is
+    two array reads per source.
+    """
+
+    def __init__(self, user_rows, sources, meta):
+        self.user_rows = user_rows
+        self.sources = sources
+        self.meta = meta
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        def arr(name):
+            return np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode)
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        sources = {
+            source: (arr(f"{source}_offsets"), arr(f"{source}_products"), arr(f"{source}_scores"))
+            for source in meta["sources"]
+        }
+        return cls(arr("user_rows"), sources, meta)
+
+    def __len__(self):
+        return int(self.meta["users"])
+
+    def row_of(self, user_id):
+        user_id = int(user_id)
+        if user_id < 0 or user_id >= len(self.user_rows):
+            return -1
+        return int(self.user_rows[user_id])
+
+    def candidates(self, user_ids):
+        """({source: {user_id: [(product_id, score)]}}, user_ids not in the store)."""
+        per_source = {source: {} for source in self.sources}
+        missing = []
+        for u in user_ids:
+            row = self.row_of(u)
+            if row < 0:
+                missing.append(u)
+                continue
+            for source, (offsets, products, scores) in self.sources.items():
+                start, end = offsets[row], offsets[row + 1]
+                per_source[source][u] = list(zip(products[start:end].tolist(), scores[start:end].tolist()))
+        return per_source, missing
+
+
+def save_topn(path, user_ids, columns, meta):
+    """
+    Write a TopNStore directory. columns is {source: (counts, product_ids, scores)}
+    aligned with user_ids. Files go to a sibling directory that replaces `path`
+    only once complete, so a serving process never sees a half-written store.
+    """
+    user_ids = np.asarray(user_ids, dtype=np.int64)
+    tmp_path, old_path = path + ".tmp", path + ".old"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    user_rows = np.full(int(user_ids.max()) + 1 if len(user_ids) else 0, -1, dtype=np.int32)
+    user_rows[user_ids] = np.arange(len(user_ids), dtype=np.int32)
+    np.save(os.path.join(tmp_path, "user_rows.npy"), user_rows)
+    for source, (counts, products, scores) in columns.items():
+        offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        np.save(os.path.join(tmp_path, f"{source}_offsets.npy"), offsets)
+        np.save(os.path.join(tmp_path, f"{source}_products.npy"), np.asarray(products, dtype=np.int64))
+        np.save(os.path.join(tmp_path, f"{source}_scores.npy"), np.asarray(scores, dtype=np.float32))
+    with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+        json.dump(dict(meta, users=len(user_ids), sources=list(columns)), f, indent=2)
+
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.exists(path):
+        os.rename(path, old_path)
+    os.rename(tmp_path, path)
+    # Readers that still map the old files keep them until they reload
+    shutil.rmtree(old_path, ignore_errors=True)
+
+
+def _init_worker(model_dir, features_path, top_n):
+    global _worker_recommender
+    from scripts.catalog import CatalogStore
+    from scripts.model_registry import build_model_registry
+    from scripts.recommendation import Recommender
+
+    set_database(None)  # never share the parent's pooled connections across fork
+    db = get_database()
+    models = build_model_registry(model_dir)
+    _worker_recommender = Recommender(models, CatalogStore(db, features_path), db, None, top_n=top_n)
+
+
+def _score_chunk(user_ids):
+    """Live candidates for a chunk as {source: (counts, product_ids, scores)} aligned with user_ids."""
+    recommender = _worker_recommender
+    per_source, _ = recommender.live_candidates(user_ids, recommender.catalog.current())
+    columns = {}
+    for source, by_user in per_source.items():
+        lists = [by_user.get(u, []) for u in user_ids]
+        columns[source] = (
+            np.array([len(items) for items in lists], dtype=np.int64),
+            np.array([pid for items in lists for pid, _ in items], dtype=np.int64),
+            np.array([score for items in lists for _, score in items], dtype=np.float32)
+        )
+    return columns
+
+
+def materialize(user_ids, path=TOPN_DIR, model_dir=MODEL_DIR, features_path=FEATURES_PATH,
+                top_n=20, chunk_size=512, workers=None):
+    """Score every user with every available model across worker processes and write the store."""
+    user_ids = sorted({int(u) for u in user_ids})
+    chunks = [user_ids[s:s + chunk_size] for s in range(0, len(user_ids), chunk_size)]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(chunks) or 1))
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(model_dir, features_path, top_n)) as pool:
+        results = list(pool.map(_score_chunk, chunks))
+
+    # A source missing from a chunk (model failed in that worker) contributes empty lists
+    sources = sorted({source for chunk_columns in results for source in chunk_columns})
+    columns = {}
+    for source in sources:
+        parts = [
+            chunk_columns.get(source, (np.zeros(len(chunk), dtype=np.int64),
+                                       np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)))
+            for chunk, chunk_columns in zip(chunks, results)
+        ]
+        columns[source] = tuple(np.concatenate([p[i] for p in parts]) for i in range(3))
+    save_topn(path, user_ids, columns, {"top_n": top_n, "created_at": time.time()})
+    return columns
+
+
+if __name__ == "__main__":
+    try:
+        rows = get_database().fetch_all("SELECT user_id FROM users", name="all_users")
+    except DatabaseError as e:
+        print(f"❌ Database Error: {e}")
+        sys.exit(1)
+
+    top_n = int(os.environ.get("MATERIALIZE_TOP_N", "20"))
+    workers = int(os.environ.get("MATERIALIZE_WORKERS", "0")) or None
+    print(f"🔵 Materializing top-{top_n} recommendations for {len(rows)} users...")
+    start = time.perf_counter()
+    columns = materialize([r[0] for r in rows], top_n=top_n, workers=workers)
+    print(f"✅ Top-N store written to {TOPN_DIR} in {time.perf_counter() - start:.2f}s "
+          f"({', '.join(f'{s}: {len(c[1])} rows' for s, c in columns.items())})")
@@ -0,0 +1,165 @@
+import bisect
+import contextvars
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds, 0.5 ms .. 10 s
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Requests carrying this header (any value but "0") get a Server-Timing stage breakdown
+TRACE_HEADER = "X-Trace"
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(labels), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        lines.extend(f"{self.name}{_format_labels(key)} {value}" for key, value in items)
+        return lines
+
+
+class Histogram:
+    """Fixed-bucket histogram; per label set it keeps bucket counts, a sum and a count."""
+
+    def __init__(self, name, help_text, buckets=BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][slot] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, [list(state[0]), state[1], state[2]]) for key, state in self._values.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + ("+Inf",), counts):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, help_text):
+        metric = Counter(name, help_text)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, buckets=BUCKETS):
+        metric = Histogram(name, help_text, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+STAGE_SECONDS = REGISTRY.histogram("recommender_stage_seconds", "Time spent in each hot-path stage.")
+REQUEST_SECONDS = REGISTRY.histogram("http_request_seconds", "HTTP request latency by endpoint.")
+REQUESTS = REGISTRY.counter("http_requests_total", "HTTP requests by endpoint, method and status.")
+FALLBACKS = REGISTRY.counter("recommend_fallbacks_total", "Recommendations served without a model's "
+                                                          "live or precomputed result, by reason.")
+MODEL_ERRORS = REGISTRY.counter("model_errors_total", "Recommender branches that raised, by model.")
+CACHE_REQUESTS = REGISTRY.counter("cache_requests_total", "Cache lookups by cache and result (hit/miss).")
+CACHE_INVALIDATIONS = REGISTRY.counter("cache_invalidations_total",
+                                       "Users whose cached entries were invalidated, by cache.")
+
+_trace = contextvars.ContextVar("trace", default=None)
+
+
+def start_trace():
+    """Begin collecting (stage, seconds) for the current request; returns a token for end_trace."""
+    return _trace.set([])
+
+
+def end_trace(token):
+    stages = _trace.get()
+    _trace.reset(token)
+    return stages or []
+
+
+def record(stage, seconds):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    stages = _trace.get()
+    if stages is not None:
+        stages.append((stage, seconds))
+
+
+@contextmanager
+def span(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+def bind(fn):
+    """fn run in a copy of the current context, so spans on pool threads land in the caller's trace."""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+
+def observe_request(endpoint, method, status, seconds):
+    REQUESTS.inc(endpoint=endpoint, method=method, status=str(status))
+    REQUEST_SECONDS.observe(seconds, endpoint=endpoint)
+
+
+def server_timing(stages):
+    """Server-Timing header value; repeated stages (e.g. several queries) are summed."""
+    totals = {}
+    for stage, seconds in stages:
+        name = re.sub(r"[^A-Za-z0-9_.\-]", "_", stage)
+        totals[name] = totals.get(name, 0.0) + seconds
+    return ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in totals.items())
@@ -1,66 +1,281 @@
-import mysql.connector
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
-import pickle
-from surprise import SVD, Dataset, Reader
-from surprise.model_selection import cross_validate
-
-print("🔵 Connecting to MySQL...")
-
-try:
-    conn = mysql.connector.connect(
-        host="localhost",
-        user="root",
-        password="",
-        database="ecommerce_recommendation"
-    )
-    cursor = conn.cursor()
-    print("✅ MySQL Connection Successful!")
-
-    # 🟡 Step 1: Fetch Data
-    print("🔵 Fetching review data...")
-    cursor.execute("SELECT user_id, product_id, rating FROM reviews")
-    data = cursor.fetchall()
-    print("✅ Sample Data:", data[:5])
-
-    # 🟡 Step 2: Convert to Pandas DataFrame
-    print("🔵 Converting data to DataFrame...")
-    df = pd.DataFrame(data, columns=["user_id", "product_id", "rating"])
-    print(f"✅ DataFrame Created with {df.shape[0]} rows")
-    print(df.head())
-
-    # 🟡 Step 3: Convert Data Types
-    print("🔵 Checking Data Types...")
-    print(df.dtypes)
-
-    df["user_id"] = df["user_id"].astype(int)
-    df["product_id"] = df["product_id"].astype(int)
-    df["rating"] = df["rating"].astype(float)
-    print("✅ Data Types After Conversion:", df.dtypes)
-
-    # 🟡 Step 4: Prepare Data for Surprise
-    print("🔵 Preparing dataset for Surprise library...")
-    reader = Reader(rating_scale=(1, 5))
-    dataset = Dataset.load_from_df(df[["user_id", "product_id", "rating"]], reader)
-
-    # 🟡 Step 5: Load Model
-    print("🔵 Loading Collaborative Filtering Model...")
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from scripts.db import DatabaseError, get_database, set_database
+from scripts.extract import load_table
+from scripts.model_registry import training_records
+from scripts.recommendation import Recommender, SOURCES
+from scripts.reranker import HybridRanker
+
+MODEL_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "models"))
+FEATURES_PATH = os.path.join(MODEL_DIR, "engagement_features.npz")
+EVAL_K = int(os.environ.get("EVAL_K", "10"))
+EVAL_TEST_FRACTION = float(os.environ.get("EVAL_TEST_FRACTION", "0.2"))
+EVAL_MIN_RATING = float(os.environ.get("EVAL_MIN_RATING", "4"))
+EVAL_MAX_USERS = int(os.environ.get("EVAL_MAX_USERS", "0"))
+# Retrain the collaborative SVD and engagement features on the training window (1) or use model_dir as-is (0)
+EVAL_RETRAIN = os.environ.get("EVAL_RETRAIN", "1") == "1"
+HISTORY_LIMIT = 20
+METRICS = ["precision", "recall", "ndcg", "map"]
+
+# Artifacts of the models trained on user interactions; content neighbours only use product text
+INTERACTION_ARTIFACTS = {
+    "collaborative": ["collaborative_factors.npz", "collaborative_model.pkl"],
+    "graph": ["graph_model.kv"],
+    "federated": ["session_model.h5"],
+}
+
+
+def time_split(test_fraction=EVAL_TEST_FRACTION, min_rating=EVAL_MIN_RATING):
+    """
+    Split transactions and reviews at the timestamp that leaves the last
+    test_fraction of events for testing. Returns (cutoff, train purchases,
+    test interactions): purchases and reviews rated >= min_rating after
+    the cutoff are the relevant items.
+    """
+    purchases = load_table("transactions", columns=["user_id", "product_id", "purchase_date"])
+    purchases = purchases.rename(columns={"purchase_date": "timestamp"})
+    reviews = load_table("reviews", columns=["user_id", "product_id", "rating", "timestamp"])
+
+    cutoff = pd.concat([purchases["timestamp"], reviews["timestamp"]]).quantile(1 - test_fraction)
+
+    train = purchases[purchases["timestamp"] <= cutoff]
+    liked = reviews[(reviews["timestamp"] > cutoff) & (reviews["rating"] >= min_rating)]
+    test = pd.concat([purchases[purchases["timestamp"] > cutoff], liked[purchases.columns]])
+    test = test.drop_duplicates(["user_id", "product_id"])
+    return cutoff, train, test
+
+
+def training_boundaries(model_dir=MODEL_DIR):
+    """
+    {model: newest event its artifact was trained on, or None if unrecorded}
+    for the interaction-trained models present in model_dir.
+    """
+    records = training_records(model_dir)
+    boundaries = {}
+    for name, artifacts in INTERACTION_ARTIFACTS.items():
+        if any(os.path.exists(os.path.join(model_dir, a)) for a in artifacts):
+            data_through = records.get(name, {}).get("data_through")
+            boundaries[name] = pd.Timestamp(data_through) if data_through else None
+    return boundaries
+
+
+def train_held_out(eval_dir, cutoff):
+    """
+    Write an SVD trained only on reviews up to the cutoff, and the catalog
+    engagement features of events up to the cutoff, to eval_dir. Returns
+    (retrained model names, features path).
+    """
+    from surprise import SVD, Dataset, Reader
+    from scripts.engagement_features import update_features
+    from scripts.svd_factors import SVDFactors
+
+    retrained = []
+    reviews = load_table("reviews", columns=["user_id", "product_id", "rating", "timestamp"])
+    reviews = reviews[reviews["timestamp"] <= cutoff]
+    if not reviews.empty:
+        print(f"🟡 Retraining the collaborative SVD on {len(reviews)} reviews up to the cutoff...")
+        dataset = Dataset.load_from_df(reviews[["user_id", "product_id", "rating"]], Reader(rating_scale=(1, 5)))
+        model = SVD(random_state=0)
+        model.fit(dataset.build_full_trainset())
+        SVDFactors.from_surprise(model).save(os.path.join(eval_dir, "collaborative_factors.npz"))
+        retrained.append("collaborative")
+
+    # Engagement scores and dominant actions feed the popularity source and the two-stage ranker
+    print("🟡 Rebuilding engagement features from events up to the cutoff...")
+    features_path = os.path.join(eval_dir, "engagement_features.npz")
+    update_features(get_database(), features_path, until=cutoff)
+    return retrained, features_path
+
+
+def ranking_metrics(recommended, rel_rows, rel_items, n_relevant, k):
+    """
+    Per-user precision@k, recall@k, NDCG@k and AP@k, vectorised over users.
+    recommended is an (n_users, k) product_id matrix padded with -1;
+    (rel_rows, rel_items) lists each user's relevant products by row.
+    """
+    n_users = recommended.shape[0]
+    rows = np.repeat(np.arange(n_users, dtype=np.int64), k)
+    rec_keys = (rows << 32) | (recommended.ravel().astype(np.int64) & 0xFFFFFFFF)
+    rel_keys = (np.asarray(rel_rows, dtype=np.int64) << 32) | np.asarray(rel_items, dtype=np.int64)
+    hits = (np.isin(rec_keys, rel_keys) & (recommended.ravel() >= 0)).reshape(n_users, k).astype(np.float64)
+
+    n_relevant = np.asarray(n_relevant, dtype=np.float64)
+    ranks = np.arange(1, k + 1, dtype=np.float64)
+    discounts = 1.0 / np.log2(ranks + 1)
+    ideal = np.concatenate([[0.0], np.cumsum(discounts)])[np.minimum(n_relevant, k).astype(np.int64)]
+    n_hits = hits.sum(axis=1)
+    return {
+        "precision": n_hits / k,
+        "recall": n_hits / n_relevant,
+        "ndcg": (hits * discounts).sum(axis=1) / ideal,
+        "map": (np.cumsum(hits, axis=1) / ranks * hits).sum(axis=1) / np.minimum(n_relevant, k),
+    }
+
+
+class HeldOutRecommender(Recommender):
+    """Recommender whose purchase histories come from the training window, not the live database."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.train_histories = {}
+
+    def _histories(self, user_ids, limit):
+        return {u: self.train_histories.get(u, [])[:limit] for u in user_ids}
+
+
+def _init_worker(model_dir, features_path, k, overrides):
+    global _worker_recommender, _worker_two_stage
+    from scripts.catalog import CatalogStore
+    from scripts.model_registry import build_model_registry
+
+    set_database(None)  # never share the parent's pooled connections across fork
+    db = get_database()
+    models = build_model_registry(model_dir, overrides=overrides)
+    catalog = CatalogStore(db, features_path)
+    _worker_recommender = HeldOutRecommender(models, catalog, db, None, top_n=k)
+    _worker_two_stage = HeldOutRecommender(models, catalog, db, None, top_n=k, ranker=HybridRanker())
+
+
+def _evaluate_chunk(user_ids, histories, rel_rows, rel_items, n_relevant):
+    """{ranker: (metric sums, recommended product_ids)} for one shard of users."""
+    recommender, two_stage = _worker_recommender, _worker_two_stage
+    recommender.train_histories = two_stage.train_histories = histories
+    k = recommender.top_n
+    snapshot = recommender.catalog.current()
+    per_source, _ = recommender.live_candidates(user_ids, snapshot)
+
+    ranked = {source: {u: [pid for pid, _ in items] for u, items in by_user.items()}
+              for source, by_user in per_source.items()}
+    ranked["merged"] = {u: [pid for pid, _ in recommender.merge(u, per_source, snapshot)] for u in user_ids}
+    retrieved, _ = two_stage.live_candidates(user_ids, snapshot)
+    hybrid = two_stage.ranker.rank(two_stage.models.get("collaborative"), user_ids, retrieved, snapshot, k)
+    ranked["two_stage"] = {u: [pid for pid, _ in items] for u, items in hybrid.items()}
+
+    results = {}
+    for name, by_user in ranked.items():
+        recommended = np.full((len(user_ids), k), -1, dtype=np.int64)
+        for row, u in enumerate(user_ids):
+            pids = by_user.get(u, [])[:k]
+            recommended[row, :len(pids)] = pids
+        scores = ranking_metrics(recommended, rel_rows, rel_items, n_relevant, k)
+        results[name] = ({m: float(v.sum()) for m, v in scores.items()}, np.unique(recommended[recommended >= 0]))
+    return results
+
+
+def _shards(train, test, chunk_size, max_users=0, seed=0):
+    """(user_ids, histories, rel_rows, rel_items, n_relevant) per chunk of test users."""
+    user_ids = np.unique(test["user_id"].values)
+    if max_users and len(user_ids) > max_users:
+        user_ids = np.sort(np.random.default_rng(seed).choice(user_ids, size=max_users, replace=False))
+
+    train = train[train["user_id"].isin(user_ids)].sort_values("timestamp", ascending=False)
+    train = train.groupby("user_id").head(HISTORY_LIMIT)
+    histories = train.groupby("user_id")["product_id"].agg(list).to_dict()
+    relevant = test[test["user_id"].isin(user_ids)].groupby("user_id")["product_id"].agg(list).to_dict()
+
+    for start in range(0, len(user_ids), chunk_size):
+        chunk = [int(u) for u in user_ids[start:start + chunk_size]]
+        lists = [relevant[u] for u in chunk]
+        yield (
+            chunk,
+            {u: [int(p) for p in histories.get(u, [])] for u in chunk},
+            np.repeat(np.arange(len(chunk)), [len(items) for items in lists]),
+            np.array([p for items in lists for p in items], dtype=np.int64),
+            np.array([len(items) for items in lists], dtype=np.int64),
+        )
+
+
+def evaluate(k=EVAL_K, model_dir=MODEL_DIR, features_path=FEATURES_PATH, test_fraction=EVAL_TEST_FRACTION,
+             max_users=EVAL_MAX_USERS, chunk_size=512, workers=None, retrain=EVAL_RETRAIN):
+    """
+    Ranking quality of each recommender, of the merged recommend() output and
+    of the two-stage retrieve-and-rerank pipeline on a time-based split.
+    With retrain, the collaborative SVD and the catalog engagement features
+    are rebuilt from the training window; the other artifacts in model_dir
+    are scored as-is, and any whose recorded training data (training_data.json)
+    ends after the cutoff, or is unrecorded, is flagged as leaky.
+    """
+    cutoff, train, test = time_split(test_fraction)
+    print(f"✅ Split at {cutoff}: {len(train)} training purchases, {len(test)} test interactions")
+    shards = list(_shards(train, test, chunk_size, max_users))
+    n_users = sum(len(s[0]) for s in shards)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(shards) or 1))
+
+    with tempfile.TemporaryDirectory(prefix="eval_models_") as eval_dir:
+        retrained = []
+        if retrain:
+            retrained, features_path = train_held_out(eval_dir, cutoff)
+        boundaries = training_boundaries(model_dir)
+        leaky = sorted(name for name, through in boundaries.items()
+                       if name not in retrained and (through is None or through > cutoff))
+        if leaky:
+            print(f"⚠️ WARNING: {', '.join(leaky)} artifacts were trained on data past the {cutoff} cutoff "
+                  f"(or their training data is unrecorded), so they may have seen the test interactions and "
+                  f"their scores are optimistic. Retrain them on data up to the cutoff for an unbiased comparison.")
+
+        # Retrained models are read from eval_dir, everything else from model_dir
+        overrides = {name: eval_dir for name in retrained}
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(model_dir, features_path, k, overrides)) as pool:
+            results = list(pool.map(_evaluate_chunk, *zip(*shards))) if shards else []
+
+    catalog_size = len(load_table("products", columns=["product_id"]))
+    report = {"k": k, "cutoff": str(cutoff), "users": n_users, "retrained": retrained,
+              "features": "training window" if retrain else features_path,
+              "artifacts_data_through": {name: str(t) if t is not None else None for name, t in boundaries.items()},
+              "leaky": leaky, "rankers": {}}
+    for name in SOURCES + ["merged", "two_stage"]:
+        parts = [r[name] for r in results if name in r]
+        if not parts:
+            continue
+        # Users a model returned nothing for count as all-zero rows, so rankers stay comparable
+        metrics = {m: sum(p[0][m] for p in parts) / n_users for m in METRICS}
+        covered = np.unique(np.concatenate([p[1] for p in parts]))
+        metrics["coverage"] = len(covered) / catalog_size if catalog_size else 0.0
+        report["rankers"][name] = metrics
+    return report
+
+
+def rating_cross_validation(model_path=os.path.join(MODEL_DIR, "collaborative_model.pkl")):
+    """RMSE/MAE of the collaborative SVD under 5-fold cross-validation on reviews."""
+    import pickle
+    from surprise import Dataset, Reader
+    from surprise.model_selection import cross_validate
+
+    df = load_table("reviews", columns=["user_id", "product_id", "rating"])
+    dataset = Dataset.load_from_df(df[["user_id", "product_id", "rating"]], Reader(rating_scale=(1, 5)))
+    with open(model_path, "rb") as f:
+        collab_model = pickle.load(f)
+    return cross_validate(collab_model, dataset, cv=5)
+
+
+if __name__ == "__main__":
     try:
-        with open("backend/models/collaborative_model.pkl", "rb") as f:
-            collab_model = pickle.load(f)
-        print("✅ Model Loaded Successfully!")
-    except FileNotFoundError:
-        print("❌ ERROR: Model file not found! Ensure 'models/collaborative_model.pkl' exists.")
-        exit()
-
-    # 🟡 Step 6: Run Cross-Validation
-    print("🟡 Running Cross-Validation on Model...")
-    results = cross_validate(collab_model, dataset, cv=5)
-    print("✅ Model Evaluation Completed!", results)
-
-except mysql.connector.Error as err:
-    print(f"❌ MySQL Error: {err}")
-
-finally:
-    cursor.close()
-    conn.close()
-    print("🔴 MySQL Connection Closed.")
+        workers = int(os.environ.get("EVAL_WORKERS", "0")) or None
+        print(f"🔵 Evaluating ranking quality at k={EVAL_K}...")
+        start = time.perf_counter()
+        report = evaluate(workers=workers)
+        print(f"✅ Evaluated {report['users']} users in {time.perf_counter() - start:.1f}s")
+        print(f"📊 {'ranker':<14}" + "".join(f"{m:>11}" for m in METRICS + ["coverage"]))
+        for name, metrics in report["rankers"].items():
+            print(f"📊 {name:<14}" + "".join(f"{metrics[m]:>11.4f}" for m in METRICS + ["coverage"]))
+
+        report_path = os.environ.get("EVAL_REPORT")
+        if report_path:
+            with open(report_path, "w") as f:
+                json.dump(report, f, indent=2)
+            print(f"✅ Report saved to {report_path}")
+
+        if "--rmse" in sys.argv:
+            print("🟡 Running Cross-Validation on the collaborative model...")
+            print("✅ Rating Evaluation Completed!", rating_cross_validation())
+    except DatabaseError as err:
+        print(f"❌ Database Error: {err}")
@@ -0,0 +1,241 @@
+import json
+import os
+import threading
+import time
+
+# Per-model record of the newest event each artifact was trained on, written by the trainers
+TRAINING_RECORD = "training_data.json"
+
+
+def artifact_signature(path):
+    """(mtime_ns, size) of a file, or the newest/total over a directory's files."""
+    if os.path.isdir(path):
+        newest, total = 0, 0
+        for root, _, files in os.walk(path):
+            for name in files:
+                stat = os.stat(os.path.join(root, name))
+                newest, total = max(newest, stat.st_mtime_ns), total + stat.st_size
+        return (newest, total)
+    try:
+        stat = os.stat(path)
+        return (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        return None
+
+
+class ModelRegistry:
+    """
+    Lazily loads named models from artifacts in model_dir and hot-swaps them
+    when the artifacts change. Each model's (object, version) pair is replaced
+    as a unit, so in-flight requests keep the object they already fetched.
+    """
+
+    def __init__(self, model_dir, poll_interval=10):
+        self.model_dir = model_dir
+        self.poll_interval = poll_interval
+        self._loaders = {}
+        self._artifacts = {}
+        self._entries = {}
+        self._errors = {}
+        self._locks = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def register(self, name, artifacts, loader):
+        """loader(*artifact_paths) -> model; artifacts are paths relative to model_dir (absolute ones as-is)."""
+        self._loaders[name] = loader
+        self._artifacts[name] = [os.path.join(self.model_dir, a) for a in artifacts]
+        self._locks[name] = threading.Lock()
+
+    def names(self):
+        return list(self._loaders)
+
+    def signature(self, name):
+        return tuple(artifact_signature(p) for p in self._artifacts[name])
+
+    def version(self, name):
+        entry = self._entries.get(name)
+        if entry is not None:
+            return entry[1]
+        return self._format_version(self.signature(name))
+
+    @staticmethod
+    def _format_version(signature):
+        return "-".join(f"{s[0]}.{s[1]}" if s else "missing" for s in signature)
+
+    def _load(self, name, signature):
+        start = time.perf_counter()
+        model = self._loaders[name](*self._artifacts[name])
+        print(f"✅ Loaded model '{name}' in {time.perf_counter() - start:.2f}s")
+        return (model, self._format_version(signature), signature)
+
+    def get(self, name):
+        """The current model object, loading it on first use; None if it cannot be loaded."""
+        entry = self._entries.get(name)
+        if entry is not None:
+            return entry[0]
+        if name not in self._loaders:
+            return None
+        with self._locks[name]:
+            entry = self._entries.get(name)
+            if entry is not None:
+                return entry[0]
+            signature = self.signature(name)
+            failed = self._errors.get(name)
+            if failed is not None and failed[0] == signature:
+                return None  # don't retry until the artifacts change
+            try:
+                entry = self._load(name, signature)
+            except Exception as e:
+                print(f"❌ Model '{name}' Not Loaded: {e}")
+                self._errors[name] = (signature, str(e))
+                return None
+            self._errors.pop(name, None)
+            self._entries[name] = entry
+            return entry[0]
+
+    def peek(self, name):
+        """The current model object if it is already loaded, else None; never loads."""
+        entry = self._entries.get(name)
+        return entry[0] if entry is not None else None
+
+    def warm(self, names):
+        for name in names:
+            self.get(name)
+
+    def status(self):
+        return {
+            name: {
+                "loaded": name in self._entries,
+                "version": self.version(name),
+                "error": self._errors.get(name, (None, None))[1]
+            }
+            for name in self._loaders
+        }
+
+    def ready(self, required):
+        return all(name in self._entries for name in required)
+
+    def reload_changed(self, pending=None):
+        """
+        Reload loaded models whose artifacts changed. A change must be seen on
+        two consecutive polls before reloading, so half-written files are skipped.
+        """
+        pending = {} if pending is None else pending
+        for name in list(self._entries):
+            signature = self.signature(name)
+            if signature == self._entries[name][2]:
+                pending.pop(name, None)
+                continue
+            if pending.get(name) != signature:
+                pending[name] = signature
+                continue
+            try:
+                entry = self._load(name, signature)
+            except Exception as e:
+                print(f"⚠️ Reload of '{name}' failed, keeping previous version: {e}")
+                continue
+            pending.pop(name, None)
+            self._entries[name] = entry  # atomic swap
+            print(f"🔄 Model '{name}' swapped to version {entry[1]}")
+        return pending
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="model-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        pending = {}
+        while not self._stop.wait(self.poll_interval):
+            try:
+                pending = self.reload_changed(pending)
+            except Exception as e:
+                print(f"⚠️ Model watcher error: {e}")
+
+
+# ✅ Loaders keep their heavy imports (TensorFlow, gensim, dill, surprise) inside,
+# so a worker only pays for the frameworks of the models it actually uses.
+
+def _load_collaborative_factors(factors_path, pickle_path):
+    from scripts.svd_factors import SVDFactors
+    if os.path.exists(factors_path):
+        return SVDFactors.load(factors_path)
+    import pickle
+    with open(pickle_path, "rb") as f:
+        return SVDFactors.from_surprise(pickle.load(f))
+
+
+def _load_content_neighbors(path, model_path):
+    from scripts.content_neighbors import ContentNeighbors, ensure_neighbors
+    return ContentNeighbors.load(ensure_neighbors(path, model_path))
+
+
+def _load_graph_index(path):
+    from gensim.models import KeyedVectors
+    from scripts.embedding_index import EmbeddingIndex
+    use_ann = os.environ.get("GRAPH_ANN", "0") == "1"
+    return EmbeddingIndex.from_keyed_vectors(KeyedVectors.load(path), ann={} if use_ann else None)
+
+
+def _load_federated(model_path, mapping_path):
+    from scripts.federated import FederatedRecommender
+    return FederatedRecommender(model_path)
+
+
+def _load_topn_store(path):
+    from scripts.materialize_topn import TopNStore
+    return TopNStore.load(path)
+
+
+def _load_explainer(path):
+    import dill
+    with open(path, "rb") as f:
+        return dill.load(f)
+
+
+def training_records(model_dir):
+    """{model: {"data_through": newest training event timestamp, "trained_at": unix time}}."""
+    try:
+        with open(os.path.join(model_dir, TRAINING_RECORD)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def record_training(model_dir, name, data_through):
+    """Note that model `name` in model_dir was just trained on events up to data_through."""
+    records = training_records(model_dir)
+    records[name] = {"data_through": str(data_through), "trained_at": time.time()}
+    path = os.path.join(model_dir, TRAINING_RECORD)
+    with open(path + ".tmp", "w") as f:
+        json.dump(records, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def build_model_registry(model_dir, poll_interval=10, overrides=None):
+    """
+    Registry of every serving model. overrides maps a model name to a
+    directory its artifacts are read from instead of model_dir (e.g. models
+    retrained for an offline evaluation).
+    """
+    registry = ModelRegistry(model_dir, poll_interval=poll_interval)
+    overrides = overrides or {}
+
+    def register(name, artifacts, loader):
+        base = overrides.get(name)
+        registry.register(name, [os.path.join(base, a) for a in artifacts] if base else artifacts, loader)
+
+    register("collaborative", ["collaborative_factors.npz", "collaborative_model.pkl"], _load_collaborative_factors)
+    register("content", ["content_neighbors", "content_model.pkl"], _load_content_neighbors)
+    register("graph", ["graph_model.kv"], _load_graph_index)
+    register("federated", ["session_model.h5", "product_mapping.pkl"], _load_federated)
+    register("topn", ["topn"], _load_topn_store)
+    # Collaborative attributions are computed analytically from the SVD factors
+    for model_type in ["content", "graph", "federated"]:
+        register(f"shap_{model_type}", [f"shap_explainer_{model_type}.pkl"], _load_explainer)
+    return registry
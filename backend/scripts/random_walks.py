@@ -0,0 +1,205 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+_worker_graph = None
+
+
+class CSRGraph:
+    """Undirected, unweighted graph as CSR arrays over integer node ids 0..n-1, with token names."""
+
+    def __init__(self, indptr, indices, names):
+        self.indptr = indptr
+        self.indices = indices
+        self.names = names
+        n = len(indptr) - 1
+        # Sorted (row * n + col) keys make "is (a, b) an edge" one vectorised searchsorted
+        self._edge_keys = np.repeat(np.arange(n, dtype=np.int64), np.diff(indptr)) * n + indices
+
+    @property
+    def n_nodes(self):
+        return len(self.indptr) - 1
+
+    @property
+    def n_edges(self):
+        return len(self.indices) // 2
+
+    def degrees(self):
+        return np.diff(self.indptr)
+
+    def has_edges(self, a, b):
+        keys = a.astype(np.int64) * self.n_nodes + b
+        pos = np.minimum(np.searchsorted(self._edge_keys, keys), max(len(self._edge_keys) - 1, 0))
+        return self._edge_keys[pos] == keys if len(self._edge_keys) else np.zeros(len(keys), dtype=bool)
+
+
+def build_graph(user_ids, product_ids):
+    """
+    Bipartite user-product CSRGraph straight from transaction columns.
+    Users take node ids 0..U-1 and products U..U+P-1; tokens are
+    "user_<id>" / "product_<id>" as the embedding index expects.
+    """
+    users, user_nodes = np.unique(np.asarray(user_ids, dtype=np.int64), return_inverse=True)
+    products, product_nodes = np.unique(np.asarray(product_ids, dtype=np.int64), return_inverse=True)
+    n = len(users) + len(products)
+    product_nodes = product_nodes + len(users)
+
+    # Duplicate purchases collapse to one edge, as in nx.Graph
+    edges = np.unique(np.column_stack([user_nodes, product_nodes]).astype(np.int64), axis=0)
+    src = np.concatenate([edges[:, 0], edges[:, 1]])
+    dst = np.concatenate([edges[:, 1], edges[:, 0]])
+    order = np.lexsort((dst, src))
+    src, dst = src[order], dst[order]
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(src, minlength=n))]).astype(np.int64)
+
+    names = np.array([f"user_{u}" for u in users.tolist()] + [f"product_{p}" for p in products.tolist()],
+                     dtype=object)
+    return CSRGraph(indptr, dst.astype(np.int64), names)
+
+
+def _uniform_neighbors(graph, nodes, rng):
+    starts = graph.indptr[nodes]
+    degrees = graph.indptr[nodes + 1] - starts
+    return graph.indices[starts + (rng.random(len(nodes)) * degrees).astype(np.int64)]
+
+
+def generate_walks(graph, start_nodes, walk_length, p=1.0, q=1.0, rng=None):
+    """
+    One node2vec walk per start node, all advanced together one step at a
+    time. The p/q bias is applied by rejection sampling: a uniformly drawn
+    neighbour is accepted with probability (1/p if it returns to the
+    previous node, 1 if it neighbours it, else 1/q) / max(1/p, 1, 1/q), and
+    rejected walkers draw again. Returns an int array (len(start_nodes), walk_length).
+    """
+    rng = rng or np.random.default_rng()
+    start_nodes = np.asarray(start_nodes, dtype=np.int64)
+    start_nodes = start_nodes[graph.degrees()[start_nodes] > 0]
+    walks = np.empty((len(start_nodes), walk_length), dtype=np.int64)
+    if len(start_nodes) == 0 or walk_length == 0:
+        return walks[:, :walk_length]
+    walks[:, 0] = start_nodes
+    if walk_length > 1:
+        walks[:, 1] = _uniform_neighbors(graph, start_nodes, rng)
+
+    weights = np.array([1.0 / p, 1.0, 1.0 / q])
+    weights /= weights.max()
+    uniform = weights.min() == 1.0
+    for step in range(2, walk_length):
+        prev, cur = walks[:, step - 2], walks[:, step - 1]
+        if uniform:
+            walks[:, step] = _uniform_neighbors(graph, cur, rng)
+            continue
+        pending = np.arange(len(cur))
+        while len(pending):
+            candidates = _uniform_neighbors(graph, cur[pending], rng)
+            back = candidates == prev[pending]
+            near = ~back & graph.has_edges(prev[pending], candidates)
+            accept_prob = np.where(back, weights[0], np.where(near, weights[1], weights[2]))
+            accepted = rng.random(len(pending)) < accept_prob
+            walks[pending[accepted], step] = candidates[accepted]
+            pending = pending[~accepted]
+    return walks
+
+
+def _init_worker(graph):
+    global _worker_graph
+    _worker_graph = graph
+
+
+def _walk_shard(start_nodes, walk_length, p, q, seed, graph=None):
+    graph = graph if graph is not None else _worker_graph
+    return generate_walks(graph, start_nodes, walk_length, p, q, np.random.default_rng(seed)).astype(np.int32)
+
+
+class WalkCorpus:
+    """
+    Restartable iterable of walks as token lists, for gensim Word2Vec.
+
+    Walk rounds visit all nodes in a fresh random order, split into shards
+    that worker processes walk in parallel. The first pass generates the
+    walks and writes each shard to an int32 .npy file in cache_dir (a temp
+    directory by default, removed by close()); later passes (Word2Vec's vocab
+    scan plus one per epoch) replay the memory-mapped shards, so only the
+    shards in flight are held in memory and every walk is generated once.
+    """
+
+    def __init__(self, graph, num_walks=200, walk_length=30, p=1.0, q=1.0,
+                 shard_size=10000, workers=None, seed=42, cache_dir=None):
+        self.graph = graph
+        self.num_walks = num_walks
+        self.walk_length = walk_length
+        self.p = p
+        self.q = q
+        self.shard_size = shard_size
+        self.workers = workers or os.cpu_count() or 1
+        self.seed = seed
+        self.cache_dir = cache_dir
+        self._own_cache_dir = cache_dir is None
+        self._cached = None  # shard file paths, once a full pass has written them
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Drop the cached shards (and the temp directory, if we created it)."""
+        if self._own_cache_dir and self.cache_dir is not None:
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+            self.cache_dir = None
+        self._cached = None
+
+    def shards(self):
+        """(start_nodes, seed) for every shard of every round, in corpus order."""
+        seeds = np.random.SeedSequence(self.seed)
+        for round_seed in seeds.spawn(self.num_walks):
+            order = np.random.default_rng(round_seed).permutation(self.graph.n_nodes)
+            shards = [order[s:s + self.shard_size] for s in range(0, len(order), self.shard_size)]
+            for shard, shard_seed in zip(shards, round_seed.spawn(len(shards))):
+                yield shard, shard_seed
+
+    def walks(self):
+        """Walk arrays per shard; parallel shards are produced a few at a time, in order."""
+        args = ((shard, self.walk_length, self.p, self.q, seed) for shard, seed in self.shards())
+        if self.workers <= 1:
+            for a in args:
+                yield _walk_shard(*a, graph=self.graph)
+            return
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                 initargs=(self.graph,)) as pool:
+            # Bounded look-ahead: at most 2 * workers shards queued or buffered
+            pending = []
+            for a in args:
+                pending.append(pool.submit(_walk_shard, *a))
+                if len(pending) >= 2 * self.workers:
+                    yield pending.pop(0).result()
+            for future in pending:
+                yield future.result()
+
+    def _replay_or_generate(self):
+        if self._cached is not None:
+            for path in self._cached:
+                yield np.load(path, mmap_mode="r")
+            return
+        if self.cache_dir is None:
+            self.cache_dir = tempfile.mkdtemp(prefix="walks_")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        paths = []
+        for i, walks in enumerate(self.walks()):
+            path = os.path.join(self.cache_dir, f"shard_{i:06d}.npy")
+            np.save(path, walks)
+            paths.append(path)
+            yield walks
+        self._cached = paths  # only a complete pass is replayed
+
+    def __iter__(self):
+        names = self.graph.names
+        for walks in self._replay_or_generate():
+            for walk in names[walks].tolist():
+                yield walk
+
+    def __len__(self):
+        return self.num_walks * int((self.graph.degrees() > 0).sum())
@@ -0,0 +1,398 @@
+import math
+import threading
+import time
+import numpy as np
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeout
+
+from scripts.metrics import FALLBACKS, MODEL_ERRORS, bind, span
+from scripts.reranker import DEFAULT_BUDGETS, POPULARITY, PopularityIndex
+from scripts.topk import top_k_rows
+
+# Sources in merge priority order; earlier sources win duplicate products
+SOURCES = ["collaborative", "content", "graph", "federated"]
+FEDERATED_SCORE = 0.9
+# Returned by a source whose model is not loadable; left out of the results without counting as a failure
+UNAVAILABLE = object()
+
+
+def user_histories(db, user_ids, limit):
+    """
+    Most recent purchased product_ids per user (newest first), one query per
+    batch. The per-user limit is applied in SQL (window function, MySQL 8+ /
+    SQLite 3.25+), so heavy purchasers do not ship their whole history.
+    """
+    histories = {int(u): [] for u in user_ids}
+    if not histories:
+        return histories
+    placeholders = ", ".join(["%s"] * len(histories))
+    rows = db.fetch_all(
+        "SELECT user_id, product_id FROM ("
+        "SELECT user_id, product_id, ROW_NUMBER() OVER "
+        "(PARTITION BY user_id ORDER BY purchase_date DESC, transaction_id DESC) AS position "
+        f"FROM transactions WHERE user_id IN ({placeholders})"
+        ") recent WHERE position <= %s ORDER BY user_id, position",
+        list(histories) + [int(limit)], name="user_histories"
+    )
+    for uid, pid in rows:
+        history = histories.get(int(uid))
+        if history is not None:
+            history.append(int(pid))
+    return histories
+
+
+def collaborative_candidates(factors, user_ids, snapshot, k):
+    scores = factors.score_users(user_ids, snapshot.product_ids)
+    best = top_k_rows(scores, k)
+    pids = snapshot.product_ids
+    return {
+        u: [(int(pids[i]), float(scores[row, i])) for i in best[row]]
+        for row, u in enumerate(user_ids)
+    }
+
+
+def content_candidates(neighbors, histories, snapshot, k):
+    results = {}
+    for u, history in histories.items():
+        candidates = neighbors.recommend(history, k=k * 4)
+        results[u] = [(pid, score) for pid, score in candidates if pid in snapshot][:k]
+    return results
+
+
+def graph_candidates(index, user_ids, snapshot, k):
+    """Users without a graph embedding get no graph candidates."""
+    known = [u for u in user_ids if index.has_user(u)]
+    if not known:
+        return {}
+    if index.ann is not None:
+        return {
+            u: [(pid, score) for pid, score in index.top_k(u, k=k * 4) if pid in snapshot][:k]
+            for u in known
+        }
+    scores = index.scores_batch(known, snapshot.product_ids)
+    best = top_k_rows(scores, k)
+    pids = snapshot.product_ids
+    return {
+        u: [(int(pids[i]), float(scores[row, i])) for i in best[row]]
+        for row, u in enumerate(known)
+    }
+
+
+def federated_candidates(federated, histories, k):
+    seq_len = federated.scorer.seq_len
+    user_ids = list(histories)
+    sessions = [list(reversed(histories[u][:seq_len])) or None for u in user_ids]
+    predictions = federated.predict_sessions(sessions, top_k=k)
+    return {u: [(pid, FEDERATED_SCORE) for pid in recs] for u, recs in zip(user_ids, predictions)}
+
+
+def serving_version(models, names=SOURCES + ["topn"]):
+    """One string for the artifact versions of every model that feeds recommend()."""
+    return "|".join(f"{name}={models.version(name)}" for name in names)
+
+
+def model_version(models, model_type):
+    name = "collaborative" if model_type == "collaborative" else f"shap_{model_type}"
+    return models.version(name) if name in models.names() else "none"
+
+
+def explain(models, model_type, user_id, pid):
+    """(shap_value, shap_breakdown) for one recommended item."""
+    if model_type == "collaborative":
+        factors = models.get("collaborative")
+        return factors.explanation_payloads([user_id], [pid])[0] if factors is not None else (0, {})
+    explainer = models.get(f"shap_{model_type}")
+    if explainer is None:
+        return 0, {}
+    shap_flat = np.array(explainer.shap_values(np.array([pid]))).flatten()
+    shap_value = float(shap_flat[0]) if len(shap_flat) else 0
+    return shap_value, {f"feature_{i}": float(v) for i, v in enumerate(shap_flat)}
+
+
+class Recommender:
+    """
+    Scores users against the current catalog snapshot with every available
+    model. All entry points go through score_batch, so one user and a
+    thousand users share the same vectorised code path. The models run
+    concurrently; single-user requests only wait for them up to their
+    deadlines, while batch streams wait for every model.
+
+    With a ranker the models only retrieve up to `budgets[source]` candidates
+    each (plus popular products) and the ranker re-scores that union, instead
+    of merging each model's own top_n.
+    """
+
+    def __init__(self, models, catalog, db, explanations, top_n=5, history_limit=20, materialized=False,
+                 deadlines=None, budget=None, workers=8, ranker=None, budgets=None, cache=None):
+        self.models = models
+        self.catalog = catalog
+        self.db = db
+        self.explanations = explanations
+        self.top_n = top_n
+        self.history_limit = history_limit
+        self.materialized = materialized
+        self.deadlines = deadlines or {}  # {source: seconds}
+        self.budget = budget  # seconds for all sources together
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="recommend")
+        self.ranker = ranker
+        self.budgets = dict(DEFAULT_BUDGETS, **(budgets or {}))
+        self.popularity = PopularityIndex()
+        self.cache = cache  # ResponseCache for recommend(), or None
+        self._federated_seq_len = 0  # known once the federated model has loaded
+        self._loading = set()  # models being loaded off the request path
+        self._loading_lock = threading.Lock()
+
+    def candidates(self, user_ids, snapshot, bounded=False):
+        """
+        ({source: {user_id: [(product_id, score), ...]}}, metadata). In
+        materialized mode users found in the precomputed top-N store are served
+        from it and only the rest are scored live.
+        """
+        store = self.models.get("topn") if self.materialized else None
+        if store is None:
+            return self.live_candidates(user_ids, snapshot, bounded)
+        per_source, missing = store.candidates(user_ids)
+        metadata = {"timed_out": [], "failed": []}
+        if missing:
+            FALLBACKS.inc(len(missing), reason="not_materialized", source="topn")
+            live, metadata = self.live_candidates(missing, snapshot, bounded)
+            for source, by_user in live.items():
+                per_source.setdefault(source, {}).update(by_user)
+        return per_source, metadata
+
+    def _histories(self, user_ids, limit):
+        try:
+            return user_histories(self.db, user_ids, limit)
+        except Exception as e:
+            print(f"❌ History Error: {e}")
+            return {}
+
+    @staticmethod
+    def _run_source(source, fn):
+        """fn()'s candidates; None if it raised, UNAVAILABLE if the source's model is not loadable."""
+        try:
+            with span(f"recommender_{source}"):
+                return fn()
+        except Exception as e:
+            print(f"❌ {source.capitalize()} Error: {e}")
+            MODEL_ERRORS.inc(model=source)
+            return None
+
+    def _timeout(self, source, start, bounded):
+        """Seconds left for source: its own deadline, capped by the request budget."""
+        if not bounded:
+            return None
+        limits = [d for d in (self.deadlines.get(source), self.budget) if d is not None]
+        if not limits:
+            return None
+        return max(0.0, start + min(limits) - time.monotonic())
+
+    def live_candidates(self, user_ids, snapshot, bounded=False):
+        """
+        ({source: {user_id: [(product_id, score), ...]}}, metadata) from every
+        available model, run concurrently on the shared executor. When bounded,
+        models that miss their deadline or the request budget are left out and
+        listed in metadata["timed_out"].
+        """
+        start = time.monotonic()
+        retrieval = self.ranker is not None
+
+        def k(source):
+            return self.budgets.get(source, self.top_n) if retrieval else self.top_n
+
+        # Content and federated both need purchase histories; whichever asks first fetches them
+        # for both, and only a longer limit than already fetched costs another query
+        fetches, fetches_lock = {}, threading.Lock()
+
+        def histories(limit):
+            with fetches_lock:
+                future = next((f for fetched, f in fetches.items() if fetched >= limit), None)
+                owner = future is None
+                if owner:
+                    future = fetches[limit] = Future()
+            if owner:
+                future.set_result(self._histories(user_ids, limit))
+            return future.result()
+
+        # Models are fetched inside each task, so a lazy (first-use) load counts against that
+        # source's deadline instead of blocking the request before any deadline starts
+        def collaborative():
+            factors = self.models.get("collaborative")
+            if factors is None:
+                return UNAVAILABLE
+            return collaborative_candidates(factors, user_ids, snapshot, k("collaborative"))
+
+        def content():
+            neighbors = self.models.get("content")
+            if neighbors is None:
+                return UNAVAILABLE
+            limit = max(self.history_limit, self._federated_seq_len)
+            return content_candidates(neighbors, histories(limit), snapshot, k("content"))
+
+        def graph():
+            index = self.models.get("graph")
+            if index is None:
+                return UNAVAILABLE
+            return graph_candidates(index, user_ids, snapshot, k("graph"))
+
+        def federated():
+            model = self.models.get("federated")
+            if model is None:
+                return UNAVAILABLE
+            self._federated_seq_len = model.scorer.seq_len
+            limit = max(self.history_limit, model.scorer.seq_len)
+            return federated_candidates(model, histories(limit), k("federated"))
+
+        # In two-stage mode the SVD factors score the retrieved candidates instead of the catalog
+        tasks = {"content": content, "graph": graph, "federated": federated}
+        if retrieval:
+            tasks[POPULARITY] = lambda: self.popularity.candidates(user_ids, snapshot, k(POPULARITY))
+        else:
+            tasks["collaborative"] = collaborative
+        futures = {source: self.executor.submit(bind(self._run_source), source, fn) for source, fn in tasks.items()}
+
+        per_source, metadata = {}, {"timed_out": [], "failed": []}
+        for source in SOURCES + [POPULARITY]:
+            future = futures.get(source)
+            if future is None:
+                continue
+            try:
+                result = future.result(timeout=self._timeout(source, start, bounded))
+            except FuturesTimeout:
+                future.cancel()  # still queued: drop it; already running: its result is discarded
+                metadata["timed_out"].append(source)
+                FALLBACKS.inc(reason="timeout", source=source)
+                continue
+            if result is None:
+                metadata["failed"].append(source)
+                FALLBACKS.inc(reason="error", source=source)
+            elif result is not UNAVAILABLE:
+                per_source[source] = result
+        return per_source, metadata
+
+    def merge(self, user_id, per_source, snapshot):
+        """First-come dedup in SOURCES priority order; returns [(product_id, source)]."""
+        selected, seen = [], set()
+        for source in SOURCES:
+            for pid, _ in per_source.get(source, {}).get(user_id, []):
+                if pid not in seen:
+                    seen.add(pid)
+                    if pid in snapshot:
+                        selected.append((pid, source))
+        return selected[:self.top_n]
+
+    def _fill_exact_explanations(self, selections):
+        """Exact SVD attributions cost about one prediction, so fill them in directly."""
+        factors = self.models.peek("collaborative")  # a load still running past its deadline isn't waited for
+        pairs = [(u, pid) for u, selected in selections for pid, source in selected if source == "collaborative"]
+        if not pairs or factors is None:
+            return
+        users, pids = zip(*pairs)
+        for (u, pid), (shap_value, breakdown) in zip(pairs, factors.explanation_payloads(users, pids)):
+            self.explanations.store("collaborative", u, pid, shap_value, breakdown)
+
+    def respond(self, user_id, selected, snapshot, metadata=None, explain=True):
+        """
+        Response dict for one selection. With explain=False no SHAP jobs are
+        queued: explanations already computed are included, the rest are
+        "skipped" and there is no explanation_token.
+        """
+        token = self.explanations.submit([(source, user_id, pid) for pid, source in selected]) if explain else None
+        final = []
+        for pid, source in selected:
+            item = snapshot.product(pid)
+            explanation = self.explanations.lookup(source, user_id, pid) or ({} if explain else {"status": "skipped"})
+            final.append({
+                "product_id": pid,
+                "name": item["name"],
+                "image": item["image"],
+                "engagement_score": float(item["engagement_score"]) if not math.isnan(item["engagement_score"]) else 0.0,
+                "browsing_action": str(item["browsing_action"]) if item["browsing_action"] else "unknown",
+                "shap_value": explanation.get("shap_value", 0),
+                "shap_breakdown": explanation.get("shap_breakdown", {}),
+                "explanation_status": explanation.get("status", "pending"),
+                "reviews": snapshot.reviews(pid)
+            })
+        return {"recommendations": final, "explanation_token": token,
+                "metadata": metadata or {"timed_out": [], "failed": []}}
+
+    def _load_in_background(self, name):
+        """Start loading a model on the executor, at most one load per model at a time."""
+        with self._loading_lock:
+            if name in self._loading:
+                return
+            self._loading.add(name)
+
+        def load():
+            try:
+                self.models.get(name)
+            finally:
+                with self._loading_lock:
+                    self._loading.discard(name)
+        self.executor.submit(load)
+
+    def _ranker_factors(self, metadata, bounded):
+        """
+        SVD factors for the two-stage ranker. When bounded, a model that is
+        not loaded yet is never waited for: it loads in the background and this
+        response is ranked without it (listed in metadata["timed_out"]).
+        """
+        if not bounded:
+            return self.models.get("collaborative")
+        factors = self.models.peek("collaborative")
+        if factors is None:
+            self._load_in_background("collaborative")
+            metadata["timed_out"].append("collaborative")
+            FALLBACKS.inc(reason="not_loaded", source="collaborative")
+        return factors
+
+    def select(self, user_ids, snapshot, bounded=False):
+        """([(user_id, [(product_id, source)])], metadata) from one batched pass over each model."""
+        per_source, metadata = self.candidates(user_ids, snapshot, bounded)
+        if self.ranker is not None:
+            factors = self._ranker_factors(metadata, bounded)
+            with span("rerank"):
+                ranked = self.ranker.rank(factors, user_ids, per_source, snapshot, self.top_n)
+            selections = [(u, ranked[u]) for u in user_ids]
+        else:
+            selections = [(u, self.merge(u, per_source, snapshot)) for u in user_ids]
+        self._fill_exact_explanations(selections)
+        return selections, metadata
+
+    def score_batch(self, user_ids, snapshot=None, bounded=False, explain=False):
+        """
+        Response dicts for user_ids, in order, from one batched pass over each
+        model. SHAP jobs are only queued with explain=True, so a large batch
+        does not flood the explanation workers.
+        """
+        if snapshot is None:
+            snapshot = self.catalog.current()
+        selections, metadata = self.select([int(u) for u in user_ids], snapshot, bounded)
+        return [dict(self.respond(u, selected, snapshot, metadata, explain), user_id=u) for u, selected in selections]
+
+    def recommend(self, user_id):
+        """
+        One user's response within the per-model deadlines and request budget.
+        With a response cache, complete selections are reused until the user's
+        next event, a model version change or the TTL.
+        """
+        user_id = int(user_id)
+        snapshot = self.catalog.current()
+        cached = self.cache.get(user_id) if self.cache is not None else None
+        if cached is not None:
+            selected, metadata = cached
+            return self.respond(user_id, [(pid, s) for pid, s in selected if pid in snapshot], snapshot, metadata)
+
+        token = self.cache.token(user_id) if self.cache is not None else None
+        selections, metadata = self.select([user_id], snapshot, bounded=True)
+        selected = selections[0][1]
+        if self.cache is not None and not metadata["timed_out"] and not metadata["failed"]:
+            # Degraded responses are not cached, nor ones invalidated while scoring
+            self.cache.put(user_id, selected, metadata, token)
+        return self.respond(user_id, selected, snapshot, metadata)
+
+    def stream(self, user_ids, chunk_size=256, explain=False):
+        """Yield per-user responses chunk by chunk; the catalog snapshot is fixed for the whole batch."""
+        snapshot = self.catalog.current()
+        for start in range(0, len(user_ids), chunk_size):
+            for response in self.score_batch(user_ids[start:start + chunk_size], snapshot, explain=explain):
+                yield response
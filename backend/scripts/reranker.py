@@ -0,0 +1,97 @@
+import threading
+import numpy as np
+
+from scripts.topk import top_k
+
+POPULARITY = "popularity"
+RETRIEVAL_SOURCES = ["graph", "content", "federated", POPULARITY]
+
+# Candidates each retrieval source contributes per user
+DEFAULT_BUDGETS = {"graph": 200, "content": 200, "federated": 100, POPULARITY: 100}
+
+# "collaborative" weighs the SVD estimate (scaled to [0, 1]), "engagement" the
+# catalog engagement score, and each retrieval source its reciprocal rank
+DEFAULT_WEIGHTS = {"collaborative": 1.0, "engagement": 0.3, "graph": 0.5, "content": 0.5,
+                   "federated": 0.5, POPULARITY: 0.1}
+
+
+class PopularityIndex:
+    """Catalog products ordered by engagement score, recomputed once per snapshot."""
+
+    def __init__(self):
+        self._cached = (None, None)
+        self._lock = threading.Lock()
+
+    def ranked(self, snapshot, k):
+        cached_snapshot, ranked = self._cached
+        if cached_snapshot is not snapshot or len(ranked) < min(k, len(snapshot)):
+            with self._lock:
+                best = top_k(snapshot.engagement_score, k)
+                ranked = [(int(snapshot.product_ids[i]), float(snapshot.engagement_score[i])) for i in best]
+                self._cached = (snapshot, ranked)
+        return ranked[:k]
+
+    def candidates(self, user_ids, snapshot, k):
+        ranked = self.ranked(snapshot, k)
+        return {u: ranked for u in user_ids}
+
+
+class HybridRanker:
+    """
+    Second stage of the two-stage pipeline: scores the union of every user's
+    retrieved candidates with one linear model (SVD estimate, engagement and
+    per-source reciprocal rank) and keeps the top k. Work grows with the
+    candidate budgets, not with the catalog.
+    """
+
+    def __init__(self, weights=None):
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+
+    def rank(self, factors, user_ids, per_source, snapshot, k):
+        """{user_id: [(product_id, source)]}; source is the strongest signal behind each item."""
+        sources = [s for s in RETRIEVAL_SOURCES if s in per_source] + \
+                  [s for s in per_source if s not in RETRIEVAL_SOURCES]
+        row_of = {u: row for row, u in enumerate(user_ids)}
+        rows, pids, cols, ranks = [], [], [], []
+        for col, source in enumerate(sources):
+            for u, items in per_source[source].items():
+                row = row_of.get(u)
+                if row is None:
+                    continue
+                rows.extend([row] * len(items))
+                pids.extend(pid for pid, _ in items)
+                cols.extend([col] * len(items))
+                ranks.extend(range(len(items)))
+        ranked = {u: [] for u in user_ids}
+        if not pids:
+            return ranked
+
+        # One entry per distinct (user, product), with each source's reciprocal rank as a feature
+        rows, pids = np.asarray(rows, dtype=np.int64), np.asarray(pids, dtype=np.int64)
+        keys, inverse = np.unique((rows << 32) | pids, return_inverse=True)
+        evidence = np.zeros((len(keys), len(sources)))
+        np.maximum.at(evidence, (inverse, np.asarray(cols)), 1.0 / (np.asarray(ranks) + 1.0))
+        rows, pids = keys >> 32, keys & 0xFFFFFFFF
+        idx = snapshot.indices_of(pids)
+        keep = idx >= 0
+        rows, pids, idx, evidence = rows[keep], pids[keep], idx[keep], evidence[keep]
+
+        contributions = evidence * np.array([self.weights.get(s, 0.0) for s in sources])
+        labels = np.array(sources + ["collaborative"], dtype=object)
+        if factors is not None:
+            lo, hi = factors.rating_scale
+            svd = (factors.score_pairs(np.array(user_ids)[rows], pids) - lo) / max(hi - lo, 1e-9)
+            contributions = np.column_stack([contributions, self.weights.get("collaborative", 0.0) * svd])
+        engagement = np.nan_to_num(snapshot.engagement_score[idx])
+        score = contributions.sum(axis=1) + self.weights.get("engagement", 0.0) * engagement
+        source = labels[contributions.argmax(axis=1)]
+
+        # Best first within each user, then the first k of every user
+        order = np.lexsort((-score, rows))
+        rows, pids, source = rows[order], pids[order], source[order]
+        starts = np.searchsorted(rows, np.arange(len(user_ids)))
+        position = np.arange(len(rows)) - starts[rows]
+        for row, pid, src in zip(rows[position < k].tolist(), pids[position < k].tolist(),
+                                 source[position < k].tolist()):
+            ranked[user_ids[row]].append((pid, src))
+        return ranked
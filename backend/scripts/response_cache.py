@@ -0,0 +1,225 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from scripts.metrics import CACHE_INVALIDATIONS, CACHE_REQUESTS
+
+# Tables whose new rows change a user's recommendations: table -> id column
+EVENT_TABLES = {"transactions": "transaction_id", "reviews": "review_id", "browsing_history": "history_id"}
+
+
+class LocalBackend:
+    """
+    In-process LRU of user_id -> (expires_at, version, entry), at most
+    max_size users. Invalidations bump a sequence number; a write whose token
+    predates the user's last invalidation is dropped.
+    """
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._invalidated = OrderedDict()  # user_id -> seq of its last invalidation
+        self._evicted_seq = 0  # newest seq forgotten from _invalidated; applies to every user
+
+    def token(self, user_id):
+        with self._lock:
+            return self._seq
+
+    def get(self, user_id, version):
+        with self._lock:
+            item = self._data.get(user_id)
+            if item is None:
+                return None
+            expires_at, cached_version, entry = item
+            if expires_at < time.monotonic() or cached_version != version:
+                del self._data[user_id]
+                return None
+            self._data.move_to_end(user_id)
+            return entry
+
+    def set(self, user_id, version, entry, ttl, token):
+        with self._lock:
+            if self._invalidated.get(user_id, self._evicted_seq) > token:
+                return False
+            self._data[user_id] = (time.monotonic() + ttl, version, entry)
+            self._data.move_to_end(user_id)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+            return True
+
+    def delete(self, user_ids):
+        with self._lock:
+            self._seq += 1
+            for u in user_ids:
+                self._invalidated[u] = self._seq
+                self._invalidated.move_to_end(u)
+            while len(self._invalidated) > self.max_size:
+                self._evicted_seq = max(self._evicted_seq, self._invalidated.popitem(last=False)[1])
+            return sum(self._data.pop(u, None) is not None for u in user_ids)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisBackend:
+    """
+    Shared across worker processes: one Redis hash per user, field = model
+    version, expiring after the TTL. Memory is bounded by the TTL and the
+    server's maxmemory policy. Invalidations increment a per-user generation
+    key, and writes are only committed while it still holds the token read
+    before scoring (WATCH/MULTI).
+    """
+
+    GENERATION_TTL = 3600
+
+    def __init__(self, url, prefix="recommendations:"):
+        import redis  # optional; only needed when RESPONSE_CACHE_URL is set
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._watch_error = redis.WatchError
+
+    def _key(self, user_id):
+        return f"{self.prefix}{user_id}"
+
+    def _generation_key(self, user_id):
+        return f"{self.prefix}generation:{user_id}"
+
+    def token(self, user_id):
+        return int(self.client.get(self._generation_key(user_id)) or 0)
+
+    def get(self, user_id, version):
+        raw = self.client.hget(self._key(user_id), version)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, user_id, version, entry, ttl, token):
+        key, generation_key = self._key(user_id), self._generation_key(user_id)
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(generation_key)
+                if int(pipe.get(generation_key) or 0) != token:
+                    return False
+                pipe.multi()
+                pipe.delete(key)  # drop entries for older model versions
+                pipe.hset(key, version, json.dumps(entry))
+                pipe.expire(key, max(1, int(ttl)))
+                pipe.execute()
+                return True
+            except self._watch_error:
+                return False  # invalidated while we were writing
+
+    def delete(self, user_ids):
+        if not user_ids:
+            return 0
+        pipe = self.client.pipeline()
+        for u in user_ids:
+            pipe.incr(self._generation_key(u))
+            pipe.expire(self._generation_key(u), self.GENERATION_TTL)
+        pipe.delete(*[self._key(u) for u in user_ids])
+        return pipe.execute()[-1]
+
+
+class ResponseCache:
+    """
+    Per-user cache of recommendation selections ([(product_id, source)] plus
+    metadata), keyed by user_id and the active model-artifact versions, so a
+    model hot-swap misses naturally. Responses are rebuilt from the selection
+    on a hit, which keeps explanation tokens and catalog fields current.
+    """
+
+    def __init__(self, backend, version_fn, ttl=300):
+        self.backend = backend
+        self.version_fn = version_fn
+        self.ttl = ttl
+
+    def get(self, user_id):
+        try:
+            entry = self.backend.get(int(user_id), self.version_fn())
+        except Exception as e:
+            print(f"⚠️ Response cache read failed: {e}")
+            entry = None
+        CACHE_REQUESTS.inc(cache="responses", result="miss" if entry is None else "hit")
+        if entry is None:
+            return None
+        return [(int(pid), source) for pid, source in entry["selected"]], entry["metadata"]
+
+    def token(self, user_id):
+        """Read before scoring and passed to put(), which skips the write if the user was invalidated since."""
+        try:
+            return self.backend.token(int(user_id))
+        except Exception as e:
+            print(f"⚠️ Response cache read failed: {e}")
+            return None
+
+    def put(self, user_id, selected, metadata, token):
+        if token is None:
+            return False
+        try:
+            return self.backend.set(int(user_id), self.version_fn(),
+                                    {"selected": [[int(pid), source] for pid, source in selected],
+                                     "metadata": metadata},
+                                    self.ttl, token)
+        except Exception as e:
+            print(f"⚠️ Response cache write failed: {e}")
+            return False
+
+    def invalidate(self, user_ids):
+        user_ids = sorted({int(u) for u in user_ids})
+        removed = self.backend.delete(user_ids) if user_ids else 0
+        CACHE_INVALIDATIONS.inc(len(user_ids), cache="responses")
+        return removed
+
+
+class EventWatcher:
+    """
+    Polls EVENT_TABLES for rows past an id watermark and invalidates the
+    cached responses of their users. Starts from the current maximum ids, so
+    only events that arrive while the server runs are considered.
+    """
+
+    def __init__(self, db, cache, poll_interval=5):
+        self.db = db
+        self.cache = cache
+        self.poll_interval = poll_interval
+        self.watermarks = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def poll(self):
+        users = set()
+        for table, id_col in EVENT_TABLES.items():
+            watermark = self.watermarks.get(table)
+            if watermark is None:
+                row = self.db.fetch_one(f"SELECT MAX({id_col}) FROM {table}", name=f"events_{table}_max")
+                self.watermarks[table] = int(row[0] or 0) if row else 0
+                continue
+            rows = self.db.fetch_all(f"SELECT {id_col}, user_id FROM {table} WHERE {id_col} > %s",
+                                     (watermark,), name=f"events_{table}")
+            if rows:
+                self.watermarks[table] = max(int(r[0]) for r in rows)
+                users.update(int(r[1]) for r in rows if r[1] is not None)
+        if users:
+            self.cache.invalidate(users)
+        return users
+
+    def start(self):
+        if self._thread is not None:
+            return
+        try:
+            self.poll()  # set the watermarks before serving
+        except Exception as e:
+            print(f"⚠️ Event poll failed, retrying every {self.poll_interval}s: {e}")
+        self._thread = threading.Thread(target=self._run, name="response-cache-events", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"⚠️ Event poll failed, cached responses may be stale until their TTL: {e}")
@@ -1,5 +1,71 @@
+import os
+import sys
+import time
 import flwr as fl
+from flwr.common import ndarrays_to_parameters, parameters_to_ndarrays
+from flwr.server.strategy.aggregate import aggregate
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from scripts.update_codec import decode
+
+FED_ROUNDS = int(os.environ.get("FED_ROUNDS", "1"))
+
+
+class CompressedFedAvg(fl.server.strategy.FedAvg):
+    """
+    FedAvg that also accepts UpdateCodec-compressed client updates (deltas
+    against the global weights sent that round) and logs bytes received and
+    aggregation time per round.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._global = {}
+        self.history = []
+
+    def set_global(self, server_round, weights):
+        """Record the weights sent out in server_round; compressed deltas are decoded against them."""
+        self._global[server_round] = weights
+
+    def configure_fit(self, server_round, parameters, client_manager):
+        self.set_global(server_round, parameters_to_ndarrays(parameters))
+        return super().configure_fit(server_round, parameters, client_manager)
+
+    def aggregate_fit(self, server_round, results, failures):
+        if not results or (failures and not self.accept_failures):
+            return None, {}
+        start = time.perf_counter()
+        global_weights = self._global.pop(server_round, None)
+        received_bytes = raw_bytes = 0
+        weighted = []
+        for _, fit_res in results:
+            received_bytes += sum(len(t) for t in fit_res.parameters.tensors)
+            arrays = parameters_to_ndarrays(fit_res.parameters)
+            if fit_res.metrics.get("compressed"):
+                weights = decode(arrays, global_weights)
+                raw_bytes += int(fit_res.metrics.get("raw_bytes", 0))
+            else:
+                weights = arrays
+                raw_bytes += sum(a.nbytes for a in arrays)
+            weighted.append((weights, fit_res.num_examples))
+        if not sum(n for _, n in weighted):
+            # aggregate() divides by the total example count
+            print(f"⚠️ Round {server_round}: no client reported training examples, averaging updates equally")
+            weighted = [(weights, 1) for weights, _ in weighted]
+        aggregated = aggregate(weighted)
+        elapsed = time.perf_counter() - start
+
+        metrics = {"received_bytes": received_bytes, "raw_bytes": raw_bytes, "aggregation_seconds": elapsed}
+        self.history.append(dict(metrics, round=server_round, clients=len(results)))
+        print(f"📊 Round {server_round}: {len(results)} clients, {received_bytes / 1e6:.2f} MB received "
+              f"({raw_bytes / 1e6:.2f} MB uncompressed), aggregated in {elapsed * 1000:.1f} ms")
+        return ndarrays_to_parameters(aggregated), metrics
+
 
 if __name__ == "__main__":
     print("🚀 Starting Flower Federated Learning Server...")
-    fl.server.start_server(server_address="localhost:8080")
+    fl.server.start_server(
+        server_address="localhost:8080",
+        config=fl.server.ServerConfig(num_rounds=FED_ROUNDS),
+        strategy=CompressedFedAvg()
+    )
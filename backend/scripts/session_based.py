@@ -1,34 +1,33 @@
 import os
-import mysql.connector
-import pandas as pd
 import tensorflow as tf
-import numpy as np
 import pickle
 from tensorflow.keras.models import Sequential
 from tensorflow.keras.layers import LSTM, Dense, Embedding
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from scripts.db import DatabaseError
+from scripts.extract import load_table
+from scripts.model_registry import record_training
+from scripts.session_windows import make_dataset, write_window_shards
+
+# Sequence length fed to the LSTM and the idle time that ends a session
+WINDOW = int(os.environ.get("SESSION_WINDOW", "3"))
+SESSION_GAP_MINUTES = float(os.environ.get("SESSION_GAP_MINUTES", "30"))
+WINDOWS_DIR = os.environ.get(
+    "SESSION_WINDOWS_DIR", os.path.join(os.path.dirname(__file__), "..", "data", "session_windows")
+)
 
 try:
-    print("🔵 Connecting to MySQL...")
-    conn = mysql.connector.connect(
-        host="localhost",
-        user="root",
-        password="",
-        database="ecommerce_recommendation"
-    )
-    cursor = conn.cursor()
-    print("✅ Connected!")
-
-    # 🟡 Fetch transactions sorted by time
-    query = "SELECT user_id, product_id, purchase_date FROM transactions ORDER BY purchase_date"
-    cursor.execute(query)
-    results = cursor.fetchall()
-
-    if not results:
+    # 🟡 Load transactions from the extract snapshot, sorted by time
+    print("🔵 Loading transactions extract...")
+    df = load_table("transactions", columns=["user_id", "product_id", "purchase_date"])
+
+    if df.empty:
         print("❌ ERROR: No data in 'transactions' table!")
         exit()
 
-    print(f"✅ Loaded {len(results)} transactions.")
-    df = pd.DataFrame(results, columns=["user_id", "product_id", "purchase_date"])
+    print(f"✅ Loaded {len(df)} transactions.")
 
     # 🟡 Encode product IDs for Embedding layer
     df['product_id'] = df['product_id'].astype("category")
@@ -39,23 +38,22 @@ try:
     product_to_index = {pid: idx for idx, pid in enumerate(df['product_id'].cat.categories)}
     index_to_product = {idx: pid for pid, idx in product_to_index.items()}
 
-    # 🟡 Prepare sequences
-    X, y = [], []
-    for i in range(len(df) - 3):
-        seq = df.iloc[i:i+3]['product_idx'].values
-        target = df.iloc[i+3]['product_idx']
-        X.append(seq)
-        y.append(target)
-
-    X = np.array(X)
-    y = np.array(y)
+    # 🟡 Prepare sequences: per-user sessions, windowed with stride tricks and
+    # written to shards that tf.data streams back during training
+    print(f"🟡 Building {WINDOW}-item windows (session gap {SESSION_GAP_MINUTES:g} min)...")
+    n_windows = write_window_shards(df[['user_id', 'product_idx', 'purchase_date']], WINDOWS_DIR,
+                                    WINDOW, SESSION_GAP_MINUTES * 60)
+    if n_windows == 0:
+        raise Exception(f"No session has more than {WINDOW} purchases; nothing to train on.")
+    print(f"✅ {n_windows} training windows written to {WINDOWS_DIR}")
+    dataset = make_dataset(WINDOWS_DIR, WINDOW, batch_size=32)
 
     vocab_size = df['product_idx'].nunique()
     print("🧠 Vocabulary Size:", vocab_size)
 
     # 🟡 Build the LSTM Model
     model = Sequential([
-        Embedding(input_dim=vocab_size, output_dim=50, input_length=3),
+        Embedding(input_dim=vocab_size, output_dim=50, input_length=WINDOW),
         LSTM(64, return_sequences=True),
         LSTM(32),
         Dense(vocab_size, activation="softmax")
@@ -63,7 +61,7 @@ try:
 
     model.compile(loss="sparse_categorical_crossentropy", optimizer="adam", metrics=["accuracy"])
     print("🟡 Training Session-Based LSTM...")
-    model.fit(X, y, epochs=10, batch_size=32)
+    model.fit(dataset, epochs=10)
 
     # 🟢 Save model and mapping
     model_dir = os.path.join(os.path.dirname(__file__), "..", "models")
@@ -79,14 +77,12 @@ try:
             "index_to_product": index_to_product
         }, f)
 
+    record_training(model_dir, "federated", df["purchase_date"].max())  # served as the federated model
+
     print(f"✅ Model saved to {model_path}")
     print(f"✅ Product mapping saved to {mapping_path}")
 
-except mysql.connector.Error as err:
-    print(f"❌ MySQL Error: {err}")
+except DatabaseError as err:
+    print(f"❌ Database Error: {err}")
 except Exception as e:
     print(f"❌ Python Error: {e}")
-finally:
-    if 'cursor' in locals(): cursor.close()
-    if 'conn' in locals(): conn.close()
-    print("🔴 MySQL Connection Closed.")
@@ -0,0 +1,119 @@
+import os
+import sys
+import threading
+import numpy as np
+import tensorflow as tf
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from scripts.topk import top_k, top_k_rows
+
+
+def _index_array(index_to_product, vocab_size):
+    """Dense vocab index -> product_id lookup (-1 for unmapped indices)."""
+    lookup = np.full(vocab_size, -1, dtype=np.int64)
+    for idx, pid in index_to_product.items():
+        if 0 <= int(idx) < vocab_size:
+            lookup[int(idx)] = int(pid)
+    return lookup
+
+
+class SessionScorer:
+    """
+    Scores every product for a session with one forward pass: the LSTM already
+    ends in a softmax over the vocabulary, so the output row is the score of
+    each candidate next item.
+    """
+
+    def __init__(self, model, index_to_product):
+        self.model = model
+        self.seq_len = model.input_shape[1] or 3
+        self.vocab_size = model.output_shape[-1]
+        self.index_to_product = _index_array(index_to_product, self.vocab_size)
+        # ✅ Fixed signature: one trace, reused for every batch size
+        self._forward = tf.function(
+            lambda x: self.model(x, training=False),
+            input_signature=[tf.TensorSpec(shape=[None, self.seq_len], dtype=tf.int32)]
+        )
+
+    def prepare(self, sessions):
+        """Trim each session to its last seq_len items, left-padding short ones with their oldest item."""
+        X = np.zeros((len(sessions), self.seq_len), dtype=np.int32)
+        for row, session in enumerate(sessions):
+            session = list(session)[-self.seq_len:]
+            X[row] = [session[0]] * (self.seq_len - len(session)) + session
+        return X
+
+    def predict_proba(self, X):
+        return self._forward(tf.constant(X, dtype=tf.int32)).numpy()
+
+    def scores(self, sessions):
+        """(len(sessions), vocab_size) next-item probabilities."""
+        return self.predict_proba(self.prepare(sessions))
+
+    def _to_products(self, indices, probs):
+        results = []
+        for i in indices:
+            pid = self.index_to_product[i]
+            if pid >= 0:
+                results.append((int(pid), float(probs[i])))
+        return results
+
+    def top_k(self, session, k=5):
+        """Top-k (product_id, probability) for one session."""
+        probs = self.scores([session])[0]
+        return self._to_products(top_k(probs, k), probs)
+
+    def top_k_batch(self, sessions, k=5):
+        """Top-k lists for many sessions from one batched forward pass."""
+        if not sessions:
+            return []
+        probs = self.scores(sessions)
+        best = top_k_rows(probs, k)
+        return [self._to_products(row, p) for row, p in zip(best, probs)]
+
+
+class TFLiteSessionScorer(SessionScorer):
+    """SessionScorer backed by a TFLite export of the session model, for CPU serving."""
+
+    def __init__(self, tflite_path, index_to_product):
+        self.model = None
+        self.interpreter = tf.lite.Interpreter(model_path=tflite_path)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self.seq_len = int(self._input["shape"][1])
+        self.vocab_size = int(self._output["shape"][-1])
+        self.index_to_product = _index_array(index_to_product, self.vocab_size)
+        self._batch = int(self._input["shape"][0])
+        self._lock = threading.Lock()  # an Interpreter must not be invoked from two threads at once
+
+    def predict_proba(self, X):
+        with self._lock:
+            if X.shape[0] != self._batch:
+                self.interpreter.resize_tensor_input(self._input["index"], [X.shape[0], self.seq_len])
+                self.interpreter.allocate_tensors()
+                self._batch = X.shape[0]
+            self.interpreter.set_tensor(self._input["index"], X.astype(self._input["dtype"]))
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self._output["index"]).copy()
+
+
+def export_tflite(model, path):
+    seq_len = model.input_shape[1] or 3
+    forward = tf.function(
+        lambda x: model(x, training=False),
+        input_signature=[tf.TensorSpec(shape=[1, seq_len], dtype=tf.int32)]
+    )
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([forward.get_concrete_function()], model)
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS, tf.lite.OpsSet.SELECT_TF_OPS]
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    with open(path, "wb") as f:
+        f.write(converter.convert())
+    return path
+
+
+if __name__ == "__main__":
+    model_dir = os.path.join(os.path.dirname(__file__), "..", "models")
+    model = tf.keras.models.load_model(os.path.join(model_dir, "session_model.h5"))
+    path = export_tflite(model, os.path.join(model_dir, "session_model.tflite"))
+    print(f"✅ TFLite session model exported to {path}")
@@ -0,0 +1,103 @@
+import glob
+import os
+import shutil
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def session_ids(user_ids, timestamps, gap_seconds):
+    """
+    Session number per event, for events sorted by (user, time): a new session
+    starts at every user change and after any pause longer than gap_seconds.
+    """
+    user_ids = np.asarray(user_ids)
+    seconds = np.asarray(timestamps, dtype="datetime64[s]").astype(np.int64)
+    if len(user_ids) == 0:
+        return np.zeros(0, dtype=np.int64)
+    starts = np.ones(len(user_ids), dtype=bool)
+    starts[1:] = (user_ids[1:] != user_ids[:-1]) | (np.diff(seconds) > gap_seconds)
+    return np.cumsum(starts) - 1
+
+
+def build_windows(items, sessions, window):
+    """
+    (X, y) next-item examples: every run of window + 1 consecutive events
+    inside one session, as strided views over items with no Python loop.
+    X is (n, window) and y is (n,); windows never cross a session boundary.
+    """
+    items = np.asarray(items, dtype=np.int32)
+    if len(items) <= window:
+        return np.zeros((0, window), dtype=np.int32), np.zeros(0, dtype=np.int32)
+    runs = sliding_window_view(items, window + 1)
+    same_session = sessions[:len(runs)] == sessions[window:]
+    runs = runs[same_session]
+    return np.ascontiguousarray(runs[:, :window]), np.ascontiguousarray(runs[:, window])
+
+
+def write_window_shards(df, out_dir, window, gap_seconds, rows_per_chunk=1_000_000, shard_rows=500_000):
+    """
+    Build windows from df (user_id, product_idx, purchase_date), one chunk of
+    whole users at a time, and append them to fixed-length binary shards
+    (window + 1 int32 per record: the inputs then the target) in out_dir.
+    Returns the number of windows written.
+    """
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.makedirs(out_dir)
+    df = df.sort_values(["user_id", "purchase_date"], kind="stable")
+    users = df["user_id"].to_numpy()
+    items = df["product_idx"].to_numpy(dtype=np.int32)
+    times = df["purchase_date"].to_numpy()
+
+    total, shard, shard_count = 0, None, 0
+    start = 0
+    while start < len(users):
+        end = min(start + rows_per_chunk, len(users))
+        # Extend the chunk to the end of its last user so no session is split
+        if end < len(users):
+            end = int(np.searchsorted(users, users[end - 1], side="right"))
+        sessions = session_ids(users[start:end], times[start:end], gap_seconds)
+        X, y = build_windows(items[start:end], sessions, window)
+        records = np.column_stack([X, y]).astype(np.int32)
+        pos = 0
+        while pos < len(records):
+            if shard is None or shard_count >= shard_rows:
+                if shard is not None:
+                    shard.close()
+                shard = open(os.path.join(out_dir, f"windows-{total:012d}.bin"), "wb")
+                shard_count = 0
+            part = records[pos:pos + shard_rows - shard_count]
+            part.tofile(shard)
+            shard_count += len(part)
+            total += len(part)
+            pos += len(part)
+        start = end
+    if shard is not None:
+        shard.close()
+    return total
+
+
+def make_dataset(shard_dir, window, batch_size=32, shuffle_buffer=100_000, seed=42):
+    """
+    tf.data pipeline over the window shards: files are read in parallel and
+    interleaved, records shuffled, batched, decoded in parallel and prefetched,
+    so training streams from disk instead of holding X/y in memory.
+    """
+    import tensorflow as tf
+
+    record_bytes = (window + 1) * 4
+    files = sorted(glob.glob(os.path.join(shard_dir, "windows-*.bin")))
+
+    def decode(records):
+        values = tf.io.decode_raw(records, tf.int32)
+        return values[:, :window], values[:, window]
+
+    return (
+        tf.data.Dataset.from_tensor_slices(files)
+        .shuffle(len(files), seed=seed, reshuffle_each_iteration=True)
+        .interleave(lambda path: tf.data.FixedLengthRecordDataset(path, record_bytes),
+                    cycle_length=min(len(files), 8) or 1, num_parallel_calls=tf.data.AUTOTUNE)
+        .shuffle(shuffle_buffer, seed=seed, reshuffle_each_iteration=True)
+        .batch(batch_size)
+        .map(decode, num_parallel_calls=tf.data.AUTOTUNE)
+        .prefetch(tf.data.AUTOTUNE)
+    )
@@ -24,7 +24,10 @@ class ContentWrapper:
         if isinstance(product_ids, np.ndarray):
             product_ids = product_ids.flatten()
 
-        if isinstance(self.sim_matrix, dict):
+        if hasattr(self.sim_matrix, "similarity"):
+            # ✅ ContentNeighbors: user_idx is the seed product_id
+            return self.sim_matrix.similarity(self.user_idx, product_ids)
+        elif isinstance(self.sim_matrix, dict):
             user_scores = self.sim_matrix.get(self.user_idx, {})
             return np.array([user_scores.get(int(pid), 0) for pid in product_ids])
         else:
@@ -35,16 +38,29 @@ class ContentWrapper:
 
 
 class GraphWrapper:
-    def __init__(self, graph_model, user_node):
+    def __init__(self, graph_model, user_node, index=None):
         self.graph_model = graph_model
         self.user_node = user_node
+        self.index = index
+
+    def __setstate__(self, state):
+        # Explainers pickled before the index existed only carry graph_model/user_node
+        self.__dict__.update(state)
+        self.__dict__.setdefault("index", None)
 
     def predict(self, product_ids):
-        return np.array([
-            self.graph_model.similarity(self.user_node, f"product_{pid}")
-            if f"product_{pid}" in self.graph_model else 0
-            for pid in product_ids
-        ])
+        if isinstance(product_ids, np.ndarray):
+            product_ids = product_ids.flatten()
+
+        # ✅ Batched cosine via the pre-normalized embedding index
+        if self.index is None:
+            from scripts.embedding_index import EmbeddingIndex
+            self.index = EmbeddingIndex.from_keyed_vectors(self.graph_model)
+        user_id = int(str(self.user_node).rpartition("_")[2])
+        scores = self.index.scores(user_id, np.asarray(product_ids, dtype=np.int64))
+        if scores is None:
+            raise KeyError(f"Key '{self.user_node}' not present")
+        return scores
 
 
 class FederatedWrapper:
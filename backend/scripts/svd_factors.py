@@ -0,0 +1,208 @@
+import numpy as np
+
+from scripts.topk import top_k
+
+
+class SVDFactors:
+    """
+    Dense NumPy export of a trained surprise.SVD model.
+
+    Scores a user against a whole item array with one mat-vec, reproducing
+    SVD.estimate + AlgoBase.predict (unknown-user/item fallback and clipping).
+    """
+
+    def __init__(self, pu, qi, bu, bi, global_mean, user_raw_ids, item_raw_ids,
+                 rating_scale=(1, 5), biased=True):
+        self.pu = np.ascontiguousarray(pu, dtype=np.float64)
+        self.qi = np.ascontiguousarray(qi, dtype=np.float64)
+        self.bu = np.asarray(bu, dtype=np.float64)
+        self.bi = np.asarray(bi, dtype=np.float64)
+        self.global_mean = float(global_mean)
+        self.user_raw_ids = np.asarray(user_raw_ids, dtype=np.int64)
+        self.item_raw_ids = np.asarray(item_raw_ids, dtype=np.int64)
+        self.rating_scale = (float(rating_scale[0]), float(rating_scale[1]))
+        self.biased = bool(biased)
+        self.user_index = {int(raw): inner for inner, raw in enumerate(self.user_raw_ids.tolist())}
+        self._item_order = np.argsort(self.item_raw_ids, kind="stable")
+        self._item_sorted = self.item_raw_ids[self._item_order]
+        self._aligned = (None, None)
+
+    @classmethod
+    def from_surprise(cls, model):
+        trainset = model.trainset
+        user_raw_ids = [int(trainset.to_raw_uid(u)) for u in range(trainset.n_users)]
+        item_raw_ids = [int(trainset.to_raw_iid(i)) for i in range(trainset.n_items)]
+        n_factors = model.pu.shape[1] if trainset.n_users else model.n_factors
+        bu = model.bu if model.biased else np.zeros(trainset.n_users)
+        bi = model.bi if model.biased else np.zeros(trainset.n_items)
+        return cls(model.pu.reshape(-1, n_factors), model.qi.reshape(-1, n_factors), bu, bi,
+                   trainset.global_mean, user_raw_ids, item_raw_ids,
+                   rating_scale=trainset.rating_scale, biased=model.biased)
+
+    def save(self, path):
+        np.savez(path, pu=self.pu, qi=self.qi, bu=self.bu, bi=self.bi,
+                 global_mean=self.global_mean, user_raw_ids=self.user_raw_ids,
+                 item_raw_ids=self.item_raw_ids, rating_scale=np.array(self.rating_scale),
+                 biased=self.biased)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["pu"], data["qi"], data["bu"], data["bi"], float(data["global_mean"]),
+                       data["user_raw_ids"], data["item_raw_ids"],
+                       rating_scale=tuple(data["rating_scale"].tolist()), biased=bool(data["biased"]))
+
+    def fold_in(self, user_ids, item_ids, ratings, epochs=20, lr=0.005, reg=0.02, init_std=0.1, seed=0):
+        """
+        New SVDFactors with the unseen users and items of the given ratings
+        added. Only the new rows are fitted, by SGD over these ratings with
+        every existing factor, bias and the global mean held fixed, so the cost
+        scales with the new ratings rather than the full history. Defaults
+        match surprise.SVD.
+        """
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        item_ids = np.asarray(item_ids, dtype=np.int64)
+        ratings = np.asarray(ratings, dtype=np.float64)
+        rng = np.random.default_rng(seed)
+        new_users = [u for u in dict.fromkeys(user_ids.tolist()) if u not in self.user_index]
+        new_items = list(dict.fromkeys(item_ids[self.item_inner_ids(item_ids) < 0].tolist()))
+        n_users, n_items, f = len(self.user_raw_ids), len(self.item_raw_ids), self.n_factors
+
+        folded = SVDFactors(
+            np.vstack([self.pu, rng.normal(0, init_std, (len(new_users), f))]),
+            np.vstack([self.qi, rng.normal(0, init_std, (len(new_items), f))]),
+            np.concatenate([self.bu, np.zeros(len(new_users))]),
+            np.concatenate([self.bi, np.zeros(len(new_items))]),
+            self.global_mean,
+            np.concatenate([self.user_raw_ids, np.asarray(new_users, dtype=np.int64)]),
+            np.concatenate([self.item_raw_ids, np.asarray(new_items, dtype=np.int64)]),
+            rating_scale=self.rating_scale, biased=self.biased
+        )
+        pu, qi, bu, bi = folded.pu, folded.qi, folded.bu, folded.bi
+        inner_users = folded.user_inner_ids(user_ids)
+        inner_items = folded.item_inner_ids(item_ids)
+        # Ratings between two existing rows would only move fixed parameters
+        trainable = (inner_users >= n_users) | (inner_items >= n_items)
+        triples = list(zip(inner_users[trainable].tolist(), inner_items[trainable].tolist(),
+                           ratings[trainable].tolist()))
+
+        for _ in range(epochs):
+            for u, i, r in triples:
+                new_user, new_item = u >= n_users, i >= n_items
+                dot = float(pu[u] @ qi[i])
+                err = r - (self.global_mean + bu[u] + bi[i] + dot if self.biased else dot)
+                if self.biased:
+                    if new_user:
+                        bu[u] += lr * (err - reg * bu[u])
+                    if new_item:
+                        bi[i] += lr * (err - reg * bi[i])
+                user_factors = pu[u].copy()
+                if new_user:
+                    pu[u] += lr * (err * qi[i] - reg * pu[u])
+                if new_item:
+                    qi[i] += lr * (err * user_factors - reg * qi[i])
+        return folded
+
+    @property
+    def n_factors(self):
+        return self.qi.shape[1]
+
+    def item_inner_ids(self, item_ids):
+        """Map raw item ids to inner ids; unknown items map to -1."""
+        item_ids = np.asarray(item_ids, dtype=np.int64)
+        if len(self._item_sorted) == 0:
+            return np.full(len(item_ids), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self._item_sorted, item_ids), len(self._item_sorted) - 1)
+        return np.where(self._item_sorted[pos] == item_ids, self._item_order[pos], -1)
+
+    def user_inner_ids(self, user_ids):
+        return np.array([self.user_index.get(int(u), -1) for u in user_ids], dtype=np.int64)
+
+    def _align(self, item_ids):
+        # Catalog arrays are immutable, so the alignment is cached by identity
+        key, aligned = self._aligned
+        if key is not None and key is item_ids:
+            return aligned
+        inner = self.item_inner_ids(item_ids)
+        known = inner >= 0
+        bi = np.where(known, self.bi[np.maximum(inner, 0)] if len(self.bi) else 0.0, 0.0)
+        qi = np.zeros((len(inner), self.n_factors), dtype=np.float64)
+        qi[known] = self.qi[inner[known]]
+        aligned = (known, bi, qi)
+        self._aligned = (item_ids, aligned)
+        return aligned
+
+    def score_users(self, user_ids, item_ids):
+        """Score matrix (len(user_ids), len(item_ids)) via one matrix product."""
+        known_items, bi, qi = self._align(item_ids)
+        inner_users = self.user_inner_ids(user_ids)
+        known_users = inner_users >= 0
+        pu = np.zeros((len(inner_users), self.n_factors), dtype=np.float64)
+        pu[known_users] = self.pu[inner_users[known_users]]
+        dot = pu @ qi.T
+
+        if self.biased:
+            bu = np.zeros(len(inner_users), dtype=np.float64)
+            bu[known_users] = self.bu[inner_users[known_users]]
+            est = self.global_mean + bu[:, None] + bi[None, :] + dot
+        else:
+            # Non-biased SVD raises PredictionImpossible -> default_prediction()
+            both = known_users[:, None] & known_items[None, :]
+            est = np.where(both, dot, self.global_mean)
+        return np.clip(est, self.rating_scale[0], self.rating_scale[1])
+
+    def score_pairs(self, user_ids, item_ids):
+        """Estimates for aligned (user, item) pairs, without a full score matrix."""
+        base, terms, _ = self.explain(user_ids, item_ids)
+        return np.clip(base + terms.sum(axis=1), self.rating_scale[0], self.rating_scale[1])
+
+    def score_user(self, user_id, item_ids):
+        return self.score_users([user_id], item_ids)[0]
+
+    def explain(self, user_ids, item_ids):
+        """
+        Exact additive attributions of the SVD estimate for (user, item) pairs.
+
+        Returns (base, terms, names): est = base + terms.sum(axis=1), with terms
+        the user bias, item bias and each latent factor's pu[f] * qi[f]. The
+        served score is est clipped to the rating scale.
+        """
+        inner_users = self.user_inner_ids(user_ids)
+        inner_items = self.item_inner_ids(item_ids)
+        known_users, known_items = inner_users >= 0, inner_items >= 0
+        n = len(inner_users)
+        pu = np.zeros((n, self.n_factors), dtype=np.float64)
+        qi = np.zeros((n, self.n_factors), dtype=np.float64)
+        pu[known_users] = self.pu[inner_users[known_users]]
+        qi[known_items] = self.qi[inner_items[known_items]]
+        interaction = pu * qi
+
+        if self.biased:
+            bu = np.where(known_users, self.bu[np.maximum(inner_users, 0)] if len(self.bu) else 0.0, 0.0)
+            bi = np.where(known_items, self.bi[np.maximum(inner_items, 0)] if len(self.bi) else 0.0, 0.0)
+            base = np.full(n, self.global_mean)
+        else:
+            both = known_users & known_items
+            bu = bi = np.zeros(n)
+            base = np.where(both, 0.0, self.global_mean)
+            interaction[~both] = 0.0
+
+        terms = np.column_stack([bu, bi, interaction])
+        names = ["user_bias", "item_bias"] + [f"factor_{f}" for f in range(self.n_factors)]
+        return base, terms, names
+
+    def explanation_payloads(self, user_ids, item_ids):
+        """(shap_value, shap_breakdown) per pair, in the shape recommend() emits."""
+        _, terms, names = self.explain(user_ids, item_ids)
+        totals = terms.sum(axis=1)
+        return [
+            (float(total), dict(zip(names, row)))
+            for total, row in zip(totals.tolist(), terms.tolist())
+        ]
+
+    def recommend(self, user_id, item_ids, k=5):
+        """Top-k (item_id, score) pairs for one user over item_ids."""
+        scores = self.score_user(user_id, item_ids)
+        best = top_k(scores, k)
+        item_ids = np.asarray(item_ids)
+        return [(int(item_ids[i]), float(scores[i])) for i in best]
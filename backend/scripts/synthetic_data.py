@@ -0,0 +1,154 @@
+import os
+import sqlite3
+import sys
+import time
+import numpy as np
+
+# Row counts per table at each named scale
+SCALES = {
+    "small": {"users": 1000, "products": 500, "reviews": 10000, "transactions": 20000,
+              "browsing_history": 50000, "social_media_data": 20000},
+    "medium": {"users": 20000, "products": 5000, "reviews": 200000, "transactions": 400000,
+               "browsing_history": 1000000, "social_media_data": 400000},
+    "large": {"users": 200000, "products": 50000, "reviews": 2000000, "transactions": 4000000,
+              "browsing_history": 10000000, "social_media_data": 4000000},
+}
+
+# database_setup.sql in SQLite syntax. reviews also carries `comment`, the column
+# the serving code reads, and `interactions` is the view federated.py trains on.
+SCHEMA = """
+CREATE TABLE users (
+    user_id INTEGER PRIMARY KEY, name TEXT, email TEXT UNIQUE, password TEXT,
+    age INTEGER, location TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE products (
+    product_id INTEGER PRIMARY KEY, name TEXT, category TEXT, description TEXT,
+    price REAL, rating REAL, stock INTEGER, image_url TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE reviews (
+    review_id INTEGER PRIMARY KEY, user_id INTEGER, product_id INTEGER, rating REAL,
+    review_text TEXT, comment TEXT, timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE transactions (
+    transaction_id INTEGER PRIMARY KEY, user_id INTEGER, product_id INTEGER,
+    quantity INTEGER DEFAULT 1, total_price REAL, purchase_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE browsing_history (
+    history_id INTEGER PRIMARY KEY, user_id INTEGER, product_id INTEGER,
+    action TEXT CHECK (action IN ('viewed', 'clicked', 'added_to_cart')),
+    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE social_media_data (
+    social_id INTEGER PRIMARY KEY, user_id INTEGER, product_id INTEGER,
+    engagement_score REAL, timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX idx_users_email ON users(email);
+CREATE INDEX idx_transactions_user ON transactions(user_id);
+CREATE INDEX idx_reviews_user ON reviews(user_id);
+CREATE INDEX idx_reviews_product ON reviews(product_id);
+CREATE VIEW interactions AS SELECT user_id, product_id, rating FROM reviews;
+"""
+
+CATEGORIES = ["Electronics", "Clothing", "Fashion", "Home", "Books", "Sports", "Beauty", "Toys"]
+LOCATIONS = ["New York", "Los Angeles", "Chicago", "Houston", "San Francisco", "Seattle", "Boston"]
+ACTIONS = ["viewed", "clicked", "added_to_cart"]
+COMMENTS = ["Great product!", "Works as described.", "Not worth the price.",
+            "Would buy again.", "Arrived late but fine.", "Excellent quality."]
+START = time.mktime((2023, 1, 1, 0, 0, 0, 0, 0, -1))
+SPAN_SECONDS = 365 * 24 * 3600
+BATCH_ROWS = 50000
+
+
+def _timestamps(rng, n):
+    seconds = np.sort(rng.integers(0, SPAN_SECONDS, n)) + START
+    return [time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(s)) for s in seconds.tolist()]
+
+
+def _product_sampler(rng, n_products):
+    """Zipf-like popularity, so a few products get most of the traffic."""
+    weights = 1.0 / np.arange(1, n_products + 1) ** 0.8
+    weights = weights[rng.permutation(n_products)]
+    probs = weights / weights.sum()
+    return lambda n: rng.choice(n_products, size=n, p=probs) + 1
+
+
+def _insert(conn, table, columns, rows):
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+    for start in range(0, len(rows), BATCH_ROWS):
+        conn.executemany(sql, rows[start:start + BATCH_ROWS])
+
+
+def _events(rng, counts, table, sample_products):
+    n = counts[table]
+    users = (rng.integers(0, counts["users"], n) + 1).tolist()
+    return n, users, sample_products(n).tolist(), _timestamps(rng, n)
+
+
+def generate(path, scale="small", seed=0, counts=None):
+    """
+    Build a SQLite database at path with the database_setup.sql tables filled
+    with random rows at the given scale (or explicit per-table counts).
+    Returns the row counts.
+    """
+    counts = dict(SCALES[scale], **(counts or {}))
+    rng = np.random.default_rng(seed)
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    sample_products = _product_sampler(rng, counts["products"])
+
+    n = counts["users"]
+    ages, locations = rng.integers(18, 70, n).tolist(), rng.integers(0, len(LOCATIONS), n).tolist()
+    _insert(conn, "users", ["name", "email", "password", "age", "location"], [
+        (f"User {i}", f"user{i}@example.com", "password", ages[i - 1], LOCATIONS[locations[i - 1]])
+        for i in range(1, n + 1)
+    ])
+
+    n = counts["products"]
+    categories, prices = rng.integers(0, len(CATEGORIES), n).tolist(), np.round(rng.uniform(5, 1500, n), 2).tolist()
+    ratings, stock = np.round(rng.uniform(1, 5, n), 1).tolist(), rng.integers(0, 500, n).tolist()
+    created = _timestamps(rng, n)
+    _insert(conn, "products", ["name", "category", "description", "price", "rating", "stock", "image_url",
+                               "created_at"], [
+        (f"Product {i}", CATEGORIES[categories[i - 1]],
+         f"{CATEGORIES[categories[i - 1]]} item number {i}", prices[i - 1], ratings[i - 1], stock[i - 1],
+         f"product_{i}.jpg", created[i - 1])
+        for i in range(1, n + 1)
+    ])
+
+    n, users, pids, times = _events(rng, counts, "reviews", sample_products)
+    ratings = rng.integers(1, 6, n).tolist()
+    comments = [COMMENTS[c] for c in rng.integers(0, len(COMMENTS), n).tolist()]
+    _insert(conn, "reviews", ["user_id", "product_id", "rating", "review_text", "comment", "timestamp"],
+            list(zip(users, pids, ratings, comments, comments, times)))
+
+    n, users, pids, times = _events(rng, counts, "transactions", sample_products)
+    quantities = rng.integers(1, 4, n).tolist()
+    prices = np.round(rng.uniform(5, 1500, n), 2).tolist()
+    _insert(conn, "transactions", ["user_id", "product_id", "quantity", "total_price", "purchase_date"],
+            list(zip(users, pids, quantities, prices, times)))
+
+    n, users, pids, times = _events(rng, counts, "browsing_history", sample_products)
+    actions = [ACTIONS[a] for a in rng.choice(len(ACTIONS), size=n, p=[0.7, 0.2, 0.1]).tolist()]
+    _insert(conn, "browsing_history", ["user_id", "product_id", "action", "timestamp"],
+            list(zip(users, pids, actions, times)))
+
+    n, users, pids, times = _events(rng, counts, "social_media_data", sample_products)
+    scores = np.round(rng.gamma(2.0, 20.0, n), 2).tolist()
+    _insert(conn, "social_media_data", ["user_id", "product_id", "engagement_score", "timestamp"],
+            list(zip(users, pids, scores, times)))
+
+    conn.commit()
+    conn.close()
+    return counts
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else os.environ.get("SQLITE_PATH", "ecommerce_recommendation.db")
+    scale = os.environ.get("SYNTHETIC_SCALE", "small")
+    print(f"🔵 Generating {scale} synthetic database at {path}...")
+    start = time.perf_counter()
+    counts = generate(path, scale, seed=int(os.environ.get("SYNTHETIC_SEED", "0")))
+    print(f"✅ Generated {sum(counts.values())} rows in {time.perf_counter() - start:.1f}s: {counts}")
@@ -0,0 +1,27 @@
+import numpy as np
+
+
+def top_k(scores, k):
+    """Indices of the k largest scores, best first, via argpartition."""
+    scores = np.asarray(scores)
+    n = scores.shape[-1]
+    if k <= 0 or n == 0:
+        return np.zeros(0, dtype=np.int64)
+    if k >= n:
+        return np.argsort(-scores, kind="stable")
+    part = np.argpartition(-scores, k - 1)[:k]
+    return part[np.argsort(-scores[part], kind="stable")]
+
+
+def top_k_rows(scores, k):
+    """Row-wise top_k for a 2-D score matrix."""
+    scores = np.asarray(scores)
+    n = scores.shape[1]
+    if k <= 0 or n == 0:
+        return np.zeros((scores.shape[0], 0), dtype=np.int64)
+    if k >= n:
+        return np.argsort(-scores, axis=1, kind="stable")
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1)
@@ -0,0 +1,100 @@
+import json
+import math
+import os
+import numpy as np
+
+QUANTIZE_DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+
+
+class UpdateCodec:
+    """
+    Encodes a client's weights as a compressed delta against the round's
+    global weights, as a flat list of NumPy arrays that Flower can ship:
+    [header, layer 0 arrays..., layer 1 arrays..., ...].
+
+    Per layer the delta is optionally sparsified to its top-k magnitudes and
+    quantized to float16 or int8 (symmetric, one scale per layer). Whatever
+    a round leaves out is carried into the next round's delta (error
+    feedback), so compression delays rather than drops updates.
+    """
+
+    def __init__(self, quantize="float32", top_k=0.0, error_feedback=True):
+        if quantize not in QUANTIZE_DTYPES:
+            raise ValueError(f"quantize must be one of {list(QUANTIZE_DTYPES)}, got {quantize!r}")
+        self.quantize = quantize
+        self.top_k = float(top_k)
+        self.error_feedback = error_feedback
+        self._residuals = None
+
+    @classmethod
+    def from_env(cls):
+        """None unless FED_COMPRESSION=delta; FED_QUANTIZE and FED_TOPK pick the lossy steps."""
+        if os.environ.get("FED_COMPRESSION", "none") != "delta":
+            return None
+        return cls(quantize=os.environ.get("FED_QUANTIZE", "float32"),
+                   top_k=float(os.environ.get("FED_TOPK", "0")))
+
+    def _quantize(self, values):
+        if self.quantize == "int8":
+            peak = float(np.abs(values).max()) if values.size else 0.0
+            scale = peak / 127.0 if peak > 0 else 1.0
+            return [np.clip(np.round(values / scale), -127, 127).astype(np.int8), np.array([scale], np.float32)]
+        return [values.astype(QUANTIZE_DTYPES[self.quantize])]
+
+    def _encode_layer(self, delta):
+        flat = delta.ravel().astype(np.float32)
+        sparse = 0 < self.top_k < 1
+        if sparse:
+            k = max(1, int(math.ceil(self.top_k * flat.size)))
+            indices = np.sort(np.argpartition(-np.abs(flat), k - 1)[:k]).astype(np.int32)
+            arrays = [indices] + self._quantize(flat[indices])
+        else:
+            arrays = self._quantize(flat)
+        meta = {"shape": list(delta.shape), "sparse": sparse, "dtype": self.quantize, "arrays": len(arrays)}
+        return meta, arrays
+
+    def encode(self, weights, global_weights):
+        """Encoded arrays for weights - global_weights (plus carried-over residuals)."""
+        deltas = [np.asarray(w, np.float32) - np.asarray(g, np.float32) for w, g in zip(weights, global_weights)]
+        residuals = self._residuals
+        if residuals is None or [r.shape for r in residuals] != [d.shape for d in deltas]:
+            residuals = [np.zeros_like(d) for d in deltas]  # first round, or the model was resized
+        if self.error_feedback:
+            deltas = [d + r for d, r in zip(deltas, residuals)]
+
+        layers, payload = [], []
+        for delta in deltas:
+            meta, arrays = self._encode_layer(delta)
+            layers.append(meta)
+            payload.extend(arrays)
+        if self.error_feedback:
+            sent = decode_deltas(payload, layers)
+            self._residuals = [d - s for d, s in zip(deltas, sent)]
+        header = np.frombuffer(json.dumps({"layers": layers}).encode(), dtype=np.uint8)
+        return [header] + payload
+
+
+def decode_deltas(payload, layers):
+    deltas, pos = [], 0
+    for meta in layers:
+        arrays = payload[pos:pos + meta["arrays"]]
+        pos += meta["arrays"]
+        if meta["sparse"]:
+            indices, arrays = arrays[0], arrays[1:]
+        values = arrays[0].astype(np.float32)
+        if meta["dtype"] == "int8":
+            values *= float(arrays[1][0])
+        size = int(np.prod(meta["shape"]))
+        if meta["sparse"]:
+            flat = np.zeros(size, dtype=np.float32)
+            flat[indices] = values
+        else:
+            flat = values
+        deltas.append(flat.reshape(meta["shape"]))
+    return deltas
+
+
+def decode(arrays, global_weights):
+    """Weights from UpdateCodec.encode output and the global weights it was encoded against."""
+    layers = json.loads(arrays[0].tobytes().decode())["layers"]
+    return [np.asarray(g, np.float32) + d for g, d in zip(global_weights, decode_deltas(arrays[1:], layers))]
@@ -0,0 +1,102 @@
+import functools
+import os
+import sys
+import threading
+
+# Add script path (dill-pickled explainers import shap_wrapper as a top-level module)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "scripts")))
+from scripts.catalog import CatalogStore
+from scripts.explanations import ExplanationService
+from scripts.model_registry import build_model_registry
+from scripts.db import get_database
+from scripts.recommendation import Recommender, explain, model_version, serving_version
+from scripts.reranker import HybridRanker
+from scripts.response_cache import EventWatcher, LocalBackend, RedisBackend, ResponseCache
+
+# ✅ Serving state shared by the Flask (app.py) and ASGI (asgi.py) entry points
+
+db = get_database()
+
+# ✅ Models load lazily on first use and hot-swap when artifacts in models/ change
+models = build_model_registry(
+    os.path.join(os.path.dirname(__file__), "models"),
+    poll_interval=int(os.environ.get("MODEL_POLL_SECONDS", "10"))
+)
+models.start()
+
+# Models that must be loaded before /api/ready reports ready; warmed in the background
+WARM_MODELS = [m for m in os.environ.get("WARM_MODELS", "").split(",") if m]
+if WARM_MODELS:
+    threading.Thread(target=models.warm, args=(WARM_MODELS,), name="model-warmup", daemon=True).start()
+
+catalog = CatalogStore(
+    db,
+    os.path.join(os.path.dirname(__file__), "models", "engagement_features.npz"),
+    refresh_interval=int(os.environ.get("CATALOG_REFRESH_SECONDS", "30"))
+)
+catalog.start()
+
+MAX_EXPLANATION_WAIT = 30.0
+explanations = ExplanationService(
+    functools.partial(explain, models), functools.partial(model_version, models),
+    max_workers=int(os.environ.get("SHAP_WORKERS", "2")),
+    cache_size=int(os.environ.get("SHAP_CACHE_SIZE", "10000"))
+)
+
+
+def _parse_mapping(value, cast=float):
+    """Parse a comma-separated name=value env string, e.g. "graph=300,content=100"."""
+    return {name: cast(v) for name, v in (item.split("=") for item in value.split(",") if item)}
+
+
+# "materialized" serves users from the offline top-N store (scripts/materialize_topn.py)
+# and scores only users missing from it live
+SERVING_MODE = os.environ.get("RECOMMEND_SERVING_MODE", "live")
+
+# ✅ Models run concurrently; a single-user request waits for each one at most its
+# deadline (e.g. MODEL_DEADLINES_MS="collaborative=50,federated=150") and for all
+# of them at most REQUEST_BUDGET_MS. Late models are listed in metadata.timed_out.
+MODEL_DEADLINES = {
+    name: ms / 1000.0 for name, ms in _parse_mapping(os.environ.get("MODEL_DEADLINES_MS", ""), int).items()
+}
+REQUEST_BUDGET_MS = int(os.environ.get("REQUEST_BUDGET_MS", "0"))
+
+# "two_stage": models retrieve up to CANDIDATE_BUDGETS candidates each and one
+# hybrid scorer (RERANK_WEIGHTS) re-ranks them; "merge": first-come dedup of each
+# model's own top-N
+RECOMMEND_PIPELINE = os.environ.get("RECOMMEND_PIPELINE", "merge")
+CANDIDATE_BUDGETS = _parse_mapping(os.environ.get("CANDIDATE_BUDGETS", ""), int)
+RERANK_WEIGHTS = _parse_mapping(os.environ.get("RERANK_WEIGHTS", ""))
+
+# ✅ Per-user response cache, keyed by the active model versions. RESPONSE_CACHE_URL
+# (redis://...) shares it across worker processes. New transactions, reviews and
+# browsing events invalidate a user: the tables are polled every
+# RESPONSE_CACHE_POLL_SECONDS, and POST /api/events invalidates immediately.
+# RESPONSE_CACHE_SIZE=0 turns the cache off; with polling off (0) the cache is
+# only enabled if RESPONSE_CACHE_PUSH_EVENTS=1 says something calls /api/events.
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", "10000"))
+RESPONSE_CACHE_URL = os.environ.get("RESPONSE_CACHE_URL", "")
+RESPONSE_CACHE_POLL_SECONDS = float(os.environ.get("RESPONSE_CACHE_POLL_SECONDS", "2"))
+RESPONSE_CACHE_PUSH_EVENTS = os.environ.get("RESPONSE_CACHE_PUSH_EVENTS", "0") == "1"
+response_cache = None
+if RESPONSE_CACHE_SIZE > 0 and (RESPONSE_CACHE_POLL_SECONDS > 0 or RESPONSE_CACHE_PUSH_EVENTS):
+    response_cache = ResponseCache(
+        RedisBackend(RESPONSE_CACHE_URL) if RESPONSE_CACHE_URL else LocalBackend(RESPONSE_CACHE_SIZE),
+        lambda: f"{RECOMMEND_PIPELINE}|{serving_version(models)}",
+        ttl=int(os.environ.get("RESPONSE_CACHE_TTL_SECONDS", "300"))
+    )
+    if RESPONSE_CACHE_POLL_SECONDS > 0:
+        EventWatcher(db, response_cache, poll_interval=RESPONSE_CACHE_POLL_SECONDS).start()
+
+recommender = Recommender(
+    models, catalog, db, explanations,
+    materialized=SERVING_MODE == "materialized",
+    deadlines=MODEL_DEADLINES,
+    budget=REQUEST_BUDGET_MS / 1000.0 if REQUEST_BUDGET_MS > 0 else None,
+    workers=int(os.environ.get("RECOMMEND_WORKERS", "8")),
+    ranker=HybridRanker(RERANK_WEIGHTS) if RECOMMEND_PIPELINE == "two_stage" else None,
+    budgets=CANDIDATE_BUDGETS,
+    cache=response_cache
+)
+
+MAX_BATCH_USERS = int(os.environ.get("MAX_BATCH_USERS", "10000"))